@@ -1,7 +1,4 @@
 from app import create_app
-from dotenv import load_dotenv
-
-load_dotenv()
 
 # Create the application instance
 app = create_app()
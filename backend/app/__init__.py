@@ -2,52 +2,127 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 import sys
 import os
+import math
+import atexit
+import importlib
+import logging
 
 # Add the backend directory to Python path to allow absolute imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.settings import Config
 
+logger = logging.getLogger(__name__)
+
+def register_blueprints(app):
+    """Import each blueprint module listed in app.blueprints and register it"""
+    from app.blueprints import BLUEPRINTS
+    for name in BLUEPRINTS:
+        module = importlib.import_module(f'app.blueprints.{name}')
+        app.register_blueprint(module.bp)
+
 def create_app(config_class=Config):
     """
     Application factory function
     Creates and configures the Flask application
     """
+    # JSON log lines through a background queue, before anything logs
+    from app.utils.log import configure_logging
+    configure_logging(config_class)
+    
     # Initialize Flask app
     app = Flask(__name__)
     
     # Load configuration
     app.config.from_object(config_class)
     
+    # Encode ObjectId/datetime/bytes natively (orjson when installed)
+    from app.utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+    
+    # Request ids, Server-Timing and the access log
+    from app.utils.timing import init_request_timing
+    init_request_timing(app)
+    
+    # Opt-in sampling profiler
+    from app.utils.profiler import init_profiler
+    init_profiler(app)
+    
+    # Opt-in per-request peak memory accounting
+    from app.utils.memory import init_memory_tracking
+    init_memory_tracking(app)
+    
+    # Request metrics (timed up to and including compression below)
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+    
+    # Compress JSON responses (registered first so it runs last)
+    from app.utils.compression import init_compression
+    init_compression(app)
+    
     # Enable CORS for all routes with explicit PATCH support
     CORS(app, 
          resources={r"/api/*": {
              "origins": "*",
              "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-             "allow_headers": ["Content-Type", "Authorization"],
+             "allow_headers": ["Content-Type", "Authorization", "X-Request-ID", "X-Profile"],
+             "expose_headers": ["X-Request-ID", "Server-Timing"],
              "supports_credentials": False
          }},
          send_wildcard=True,
          always_send=True)
     
     # Register blueprints
-    from app.blueprints import auth, users, patients, records, access, admin
+    register_blueprints(app)
+    
+    # Close this process's MongoDB client on interpreter shutdown
+    # (registered first so it runs after the audit writer has drained)
+    from pymongo.errors import ConnectionFailure
+    from app.models.database import Database
+    from app.utils.audit_writer import get_audit_writer, shutdown_audit_writer
+    from app.readiness import get_readiness, check_ready
+    atexit.register(Database.close_connection)
+    atexit.register(shutdown_audit_writer)
     
-    app.register_blueprint(auth.bp)
-    app.register_blueprint(users.bp)
-    app.register_blueprint(patients.bp)
-    app.register_blueprint(records.bp)
-    app.register_blueprint(access.bp)
-    app.register_blueprint(admin.bp)
+    # Tell clients when to retry while the database circuit is open
+    @app.after_request
+    def add_retry_after(response):
+        if response.status_code == 503 and not Database.breaker.allow_request():
+            response.headers['Retry-After'] = str(math.ceil(Database.breaker.retry_after()))
+        return response
     
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
     def health_check():
+        database = Database.breaker.snapshot()
         return jsonify({
-            'status': 'healthy',
-            'message': 'BharathMedicare API is running'
+            'status': 'healthy' if database['state'] == 'closed' else 'degraded',
+            'message': 'BharathMedicare API is running',
+            'database': database,
+            'audit': get_audit_writer().metrics(),
+            'startup': get_readiness()
         }), 200
     
+    # Liveness: the process is up and serving requests; no dependency checks
+    @app.route('/api/health/live', methods=['GET'])
+    def liveness_check():
+        response = jsonify({'status': 'alive', 'pid': os.getpid()})
+        response.headers['Cache-Control'] = 'no-store'
+        return response, 200
+    
+    # Readiness: startup finished and MongoDB, the encryption key and the
+    # audit queue are usable (probes cached for HEALTH_CACHE_TTL)
+    @app.route('/api/health/ready', methods=['GET'])
+    def readiness_check():
+        readiness = check_ready()
+        response = jsonify({
+            'status': 'ready' if readiness['ready'] else 'not_ready',
+            'pid': os.getpid(),
+            **readiness
+        })
+        response.headers['Cache-Control'] = 'no-store'
+        return response, 200 if readiness['ready'] else 503
+    
     # Root endpoint
     @app.route('/', methods=['GET'])
     def root():
@@ -73,6 +148,12 @@ def create_app(config_class=Config):
     def method_not_allowed(error):
         return jsonify({'error': 'Method not allowed for this endpoint'}), 405
     
+    # MongoDB unreachable outside a handler's own error handling
+    @app.errorhandler(ConnectionFailure)
+    def database_unavailable(error):
+        Database.record_error(error)
+        return jsonify({'error': 'Database connection error'}), 503
+    
     @app.errorhandler(500)
     def internal_error(error):
         return jsonify({'error': 'Internal server error'}), 500
@@ -85,8 +166,6 @@ def create_app(config_class=Config):
     def unauthorized(error):
         return jsonify({'error': 'Unauthorized access'}), 401
     
-    print("✓ Flask application created successfully")
-    print("✓ Blueprints registered")
-    print("✓ CORS enabled with PATCH support")
+    logger.info("✓ Flask application created", extra={'blueprints': list(app.blueprints)})
     
     return app
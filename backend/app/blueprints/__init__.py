@@ -1,3 +1,6 @@
-from . import auth, users, patients, records, access, admin
+# Blueprint modules, in registration order. They are imported by
+# create_app() (app.register_blueprints), not when this package loads;
+# create_app() still imports all of them, so its cold start is the same.
+BLUEPRINTS = ['auth', 'users', 'patients', 'records', 'access', 'admin']
 
-__all__ = ['auth', 'users', 'patients', 'records', 'access', 'admin']
+__all__ = ['BLUEPRINTS']
@@ -1,9 +1,16 @@
+import logging
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
-from app.models.database import get_access_permissions_collection, get_users_collection
+from pymongo.errors import DuplicateKeyError
+from app.models.database import get_access_permissions_collection, get_users_collection, record_db_error
 from app.models.schemas import AccessPermissionSchema
+from app.models.projections import get_projection
+from app.models.lookups import attach_user_summaries
 from app.utils.auth import require_auth
 from app.utils.audit import log_action
+from app.utils.conditional import conditional
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('access', __name__, url_prefix='/api/access')
 
@@ -11,7 +18,6 @@ bp = Blueprint('access', __name__, url_prefix='/api/access')
 @require_auth
 def grant_access():
     """Grant access to a doctor"""
-    print("=== Grant Access API Called ===")
     try:
         access_collection = get_access_permissions_collection()
         users_collection = get_users_collection()
@@ -20,15 +26,12 @@ def grant_access():
             return jsonify({'error': 'Database connection error'}), 503
         
         data = request.get_json()
-        print(f"Request data: {data}")
-        print(f"Request user: {request.user}")
         
         if not data.get('doctor_email'):
             return jsonify({'error': 'doctor_email required'}), 400
         
         patient_id = data.get('patient_id', request.user['user_id'])
         doctor_email = data['doctor_email'].strip().lower()
-        print(f"Patient ID: {patient_id}, Doctor Email: {doctor_email}")
         
         # Basic email validation
         if '@' not in doctor_email or '.' not in doctor_email:
@@ -43,7 +46,7 @@ def grant_access():
             'email': doctor_email,
             'role': 'doctor',
             'is_active': True
-        })
+        }, get_projection('user-card'))
         
         if not doctor:
             return jsonify({'error': 'Doctor not found or inactive'}), 404
@@ -54,7 +57,7 @@ def grant_access():
         existing = access_collection.find_one({
             'patient_id': ObjectId(patient_id),
             'doctor_id': ObjectId(doctor_id)
-        })
+        }, get_projection('id-only'))
         
         if existing:
             return jsonify({'error': 'Access already granted to this doctor'}), 409
@@ -66,7 +69,11 @@ def grant_access():
             permission_level=data.get('permission_level', 'read')
         )
         
-        result = access_collection.insert_one(permission)
+        # The unique (patient_id, doctor_id) index settles concurrent grants
+        try:
+            result = access_collection.insert_one(permission)
+        except DuplicateKeyError:
+            return jsonify({'error': 'Access already granted to this doctor'}), 409
         
         log_action(request.user['user_id'], 'grant_access', 'access_permission', str(result.inserted_id))
         
@@ -81,9 +88,8 @@ def grant_access():
         }), 201
     
     except Exception as e:
-        import traceback
-        print(f"Grant access error: {e}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Grant access error")
+        record_db_error(e)
         return jsonify({'error': f'Failed to grant access: {str(e)}'}), 500
 
 @bp.route('/revoke', methods=['POST'])
@@ -113,7 +119,7 @@ def revoke_access():
         doctor = users_collection.find_one({
             'email': doctor_email,
             'role': 'doctor'
-        })
+        }, get_projection('id-only'))
         
         if not doctor:
             return jsonify({'error': 'Doctor not found'}), 404
@@ -134,11 +140,13 @@ def revoke_access():
         return jsonify({'message': 'Access revoked successfully'}), 200
     
     except Exception as e:
-        print(f"Revoke access error: {e}")
+        logger.exception("Revoke access error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to revoke access'}), 500
 
 @bp.route('/my-permissions', methods=['GET'])
 @require_auth
+@conditional()
 def get_my_permissions():
     """Get permissions for current user"""
     try:
@@ -151,39 +159,20 @@ def get_my_permissions():
         user_id = request.user['user_id']
         role = request.user['role']
         
+        # Attach the other party's name and email with one batched lookup
         if role == 'patient':
-            permissions = list(access_collection.find({'patient_id': ObjectId(user_id)}))
-            
-            for perm in permissions:
-                perm['_id'] = str(perm['_id'])
-                perm['patient_id'] = str(perm['patient_id'])
-                perm['doctor_id'] = str(perm['doctor_id'])
-                
-                doctor = users_collection.find_one({'_id': ObjectId(perm['doctor_id'])})
-                if doctor:
-                    doctor.pop('password_hash', None)
-                    perm['doctor'] = {
-                        'id': str(doctor['_id']),
-                        'full_name': doctor['full_name'],
-                        'email': doctor['email']
-                    }
+            permissions = list(access_collection.find(
+                {'patient_id': ObjectId(user_id)},
+                get_projection('access-list')
+            ))
+            attach_user_summaries(permissions, 'doctor_id', 'doctor', users_collection)
         
         elif role == 'doctor':
-            permissions = list(access_collection.find({'doctor_id': ObjectId(user_id)}))
-            
-            for perm in permissions:
-                perm['_id'] = str(perm['_id'])
-                perm['patient_id'] = str(perm['patient_id'])
-                perm['doctor_id'] = str(perm['doctor_id'])
-                
-                patient = users_collection.find_one({'_id': ObjectId(perm['patient_id'])})
-                if patient:
-                    patient.pop('password_hash', None)
-                    perm['patient'] = {
-                        'id': str(patient['_id']),
-                        'full_name': patient['full_name'],
-                        'email': patient['email']
-                    }
+            permissions = list(access_collection.find(
+                {'doctor_id': ObjectId(user_id)},
+                get_projection('access-list')
+            ))
+            attach_user_summaries(permissions, 'patient_id', 'patient', users_collection)
         
         else:
             permissions = []
@@ -191,5 +180,6 @@ def get_my_permissions():
         return jsonify({'permissions': permissions, 'count': len(permissions)}), 200
     
     except Exception as e:
-        print(f"Get permissions error: {e}")
+        logger.exception("Get permissions error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch permissions'}), 500
@@ -1,9 +1,19 @@
+import logging
+import os
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
-from datetime import datetime, timedelta
-from app.models.database import get_users_collection, get_records_collection, get_audit_logs_collection
-from app.utils.auth import require_auth, require_role
+from datetime import datetime
+from app.models.database import get_users_collection, get_records_collection, get_audit_logs_collection, record_db_error
+from app.models.projections import get_projection
+from app.models.stats import get_stats as get_cached_stats, update_counters, user_counter_deltas
+from app.utils.auth import (
+    require_auth, require_role, invalidate_user_tokens, restore_user_tokens
+)
 from app.utils.audit import log_action
+from app.utils.memory import is_tracking, take_baseline, snapshot_diff
+from app.utils.pagination import get_page_params, paginate, page_response, InvalidPageRequest
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -19,62 +29,39 @@ def get_stats():
         if users_collection is None or records_collection is None:
             return jsonify({'error': 'Database connection error'}), 503
         
-        total_users = users_collection.count_documents({})
-        total_patients = users_collection.count_documents({'role': 'patient'})
-        total_doctors = users_collection.count_documents({'role': 'doctor', 'is_verified': True})
-        pending_doctors = users_collection.count_documents({'role': 'doctor', 'is_verified': False})
-        total_records = records_collection.count_documents({'is_deleted': False})
-        
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        
-        recent_uploads = records_collection.count_documents({
-            'uploaded_at': {'$gte': seven_days_ago},
-            'is_deleted': False
-        })
-        
-        recent_registrations = users_collection.count_documents({
-            'created_at': {'$gte': seven_days_ago}
-        })
-        
-        return jsonify({
-            'users': {
-                'total': total_users,
-                'patients': total_patients,
-                'doctors': total_doctors,
-                'pending_doctors': pending_doctors
-            },
-            'records': {
-                'active': total_records
-            },
-            'recent_activity': {
-                'uploads_last_7_days': recent_uploads,
-                'registrations_last_7_days': recent_registrations
-            }
-        }), 200
+        # One $facet aggregation per collection (or the materialized
+        # counters), cached for STATS_CACHE_TTL seconds
+        return jsonify(get_cached_stats()), 200
     
     except Exception as e:
-        print(f"Get stats error: {e}")
+        logger.exception("Get stats error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch statistics'}), 500
 
 @bp.route('/audit-logs', methods=['GET'])
 @require_auth
 @require_role(['admin'])
 def get_audit_logs():
-    """Get audit logs"""
+    """Get audit logs, newest first, one page at a time"""
     try:
         audit_collection = get_audit_logs_collection()
         if audit_collection is None:
             return jsonify({'error': 'Database connection error'}), 503
         
-        logs = list(audit_collection.find().sort('timestamp', -1).limit(100))
-        
-        for log in logs:
-            log['_id'] = str(log['_id'])
+        page = paginate(
+            audit_collection,
+            {},
+            [('timestamp', -1), ('_id', -1)],
+            **get_page_params(default_limit=100)
+        )
         
-        return jsonify({'logs': logs, 'count': len(logs)}), 200
+        return jsonify(page_response(page, 'logs')), 200
     
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Get audit logs error: {e}")
+        logger.exception("Get audit logs error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch audit logs'}), 500
 
 @bp.route('/users/<user_id>/toggle-status', methods=['PATCH'])
@@ -87,7 +74,10 @@ def toggle_user_status(user_id):
         if users_collection is None:
             return jsonify({'error': 'Database connection error'}), 503
         
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-status')
+        )
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -96,8 +86,16 @@ def toggle_user_status(user_id):
         
         users_collection.update_one(
             {'_id': ObjectId(user_id)},
-            {'$set': {'is_active': new_status}}
+            {'$set': {
+                'is_active': new_status,
+                'updated_at': datetime.utcnow()
+            }}
         )
+        update_counters(totals={'users_active': 1 if new_status else -1})
+        if new_status:
+            restore_user_tokens(user_id)
+        else:
+            invalidate_user_tokens(user_id)
         
         log_action(request.user['user_id'], 'toggle_user_status', 'user', user_id)
         
@@ -107,7 +105,8 @@ def toggle_user_status(user_id):
         }), 200
     
     except Exception as e:
-        print(f"Toggle user status error: {e}")
+        logger.exception("Toggle user status error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to toggle user status'}), 500
 
 @bp.route('/pending-doctors', methods=['GET'])
@@ -123,11 +122,7 @@ def get_pending_doctors():
         pending_doctors = list(users_collection.find({
             'role': 'doctor',
             'is_verified': False
-        }).sort('created_at', -1))
-        
-        for doctor in pending_doctors:
-            doctor.pop('password_hash', None)
-            doctor['_id'] = str(doctor['_id'])
+        }, get_projection('user-list')).sort('created_at', -1))
         
         return jsonify({
             'pending_doctors': pending_doctors,
@@ -135,7 +130,8 @@ def get_pending_doctors():
         }), 200
     
     except Exception as e:
-        print(f"Get pending doctors error: {e}")
+        logger.exception("Get pending doctors error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch pending doctors'}), 500
 
 @bp.route('/verify-doctor/<user_id>', methods=['PATCH'])
@@ -154,7 +150,10 @@ def verify_doctor(user_id):
         if action not in ['approve', 'reject']:
             return jsonify({'error': 'Invalid action. Must be approve or reject'}), 400
         
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-status')
+        )
         
         if not user:
             return jsonify({'error': 'Doctor not found'}), 404
@@ -168,19 +167,85 @@ def verify_doctor(user_id):
                 {'$set': {
                     'is_verified': True,
                     'verified_at': datetime.utcnow(),
-                    'verified_by': request.user['user_id']
+                    'verified_by': request.user['user_id'],
+                    'updated_at': datetime.utcnow()
                 }}
             )
+            if not user.get('is_verified'):
+                update_counters(totals={'pending_doctors': -1, 'doctors': 1})
             message = 'Doctor verified successfully'
             log_action(request.user['user_id'], 'doctor_approve', 'user', user_id)
         else:
             # For rejection, delete the registration
-            users_collection.delete_one({'_id': ObjectId(user_id)})
+            result = users_collection.delete_one({'_id': ObjectId(user_id)})
+            invalidate_user_tokens(user_id)
+            if result.deleted_count:
+                update_counters(
+                    totals=user_counter_deltas(user, sign=-1),
+                    day=user.get('created_at'),
+                    registrations=-1
+                )
             message = 'Doctor registration rejected and removed'
             log_action(request.user['user_id'], 'doctor_reject', 'user', user_id)
         
         return jsonify({'message': message}), 200
     
     except Exception as e:
-        print(f"Verify doctor error: {e}")
+        logger.exception("Verify doctor error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to verify doctor'}), 500
+
+@bp.route('/memory/snapshot', methods=['POST'])
+@require_auth
+@require_role(['admin'])
+def take_memory_snapshot():
+    """
+    Record a baseline allocation snapshot in this worker (MEMORY_TRACKING only)
+    The baseline is per process: run a single worker (GUNICORN_WORKERS=1)
+    or reach one worker directly, so /memory/diff lands on the same one.
+    """
+    try:
+        if not is_tracking():
+            return jsonify({'error': 'Memory tracking is not enabled'}), 409
+        
+        baseline = take_baseline()
+        log_action(request.user['user_id'], 'memory_snapshot', 'system')
+        
+        return jsonify({'message': 'Baseline snapshot taken', **baseline}), 200
+    
+    except Exception as e:
+        logger.exception("Memory snapshot error")
+        record_db_error(e)
+        return jsonify({'error': 'Failed to take memory snapshot'}), 500
+
+@bp.route('/memory/diff', methods=['GET'])
+@require_auth
+@require_role(['admin'])
+def get_memory_diff():
+    """Biggest allocation growth in this worker since its baseline snapshot (single worker only)"""
+    try:
+        if not is_tracking():
+            return jsonify({'error': 'Memory tracking is not enabled'}), 409
+        
+        key_type = request.args.get('group_by', 'lineno')
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            return jsonify({'error': 'group_by must be lineno, filename or traceback'}), 400
+        try:
+            limit = min(int(request.args.get('limit', 25)), 200)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        
+        diff = snapshot_diff(limit=limit, key_type=key_type)
+        if diff is None:
+            return jsonify({
+                'error': 'No baseline snapshot in this worker; POST /api/admin/memory/snapshot '
+                         'first, against the same worker (run a single worker)',
+                'pid': os.getpid()
+            }), 409
+        
+        return jsonify(diff), 200
+    
+    except Exception as e:
+        logger.exception("Memory diff error")
+        record_db_error(e)
+        return jsonify({'error': 'Failed to compute memory diff'}), 500
@@ -1,33 +1,33 @@
+import logging
 from flask import Blueprint, request, jsonify
-from app.models.database import get_users_collection
+from datetime import datetime
+from app.models.database import get_users_collection, record_db_error
 from app.models.schemas import UserSchema
+from app.models.projections import get_projection, PROFILE_COMPLETION_FIELDS
+from app.models.stats import update_counters, user_counter_deltas
 from app.utils.auth import create_token
-from app.utils.password import hash_password, verify_password, is_strong_password
+from app.utils.password import (
+    hash_password, verify_password, is_strong_password, needs_rehash, PasswordHasherBusy
+)
 from app.utils.audit import log_action
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+def server_busy_response():
+    """503 for when the password hashing pool is saturated"""
+    response = jsonify({'error': 'Server is busy. Please try again shortly.'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 def check_profile_completion(user):
     """Check if user profile is complete"""
     if user.get('role') != 'patient':
         return True  # Only check for patients
     
-    required_fields = [
-        'full_name',
-        'phone',
-        'gender',
-        'date_of_birth',
-        'address',
-        'blood_group',
-        'emergency_contact_name',
-        'emergency_contact',
-        'emergency_contact_relation',
-        'allergies',
-        'chronic_conditions'
-    ]
-    
     # Check if all required fields are filled and not empty
-    for field in required_fields:
+    for field in PROFILE_COMPLETION_FIELDS:
         value = user.get(field)
         # For lists, check if they exist (even if empty, that's valid)
         # For other fields, check if they're not None or empty string
@@ -69,7 +69,10 @@ def register():
                 return jsonify({'error': 'Invalid NMC UID format. Must be 7 digits'}), 400
             
             # Check if NMC UID already registered
-            existing_nmc = users_collection.find_one({'nmc_uid': data['nmc_uid']})
+            existing_nmc = users_collection.find_one(
+                {'nmc_uid': data['nmc_uid']},
+                get_projection('id-only')
+            )
             if existing_nmc:
                 return jsonify({'error': 'This NMC UID is already registered'}), 409
         
@@ -79,7 +82,10 @@ def register():
             return jsonify({'error': message}), 400
         
         # Check if user already exists
-        existing_user = users_collection.find_one({'email': data['email']})
+        existing_user = users_collection.find_one(
+            {'email': data['email']},
+            get_projection('id-only')
+        )
         if existing_user:
             return jsonify({'error': 'User with this email already exists'}), 409
         
@@ -106,6 +112,7 @@ def register():
         
         # Insert into database
         result = users_collection.insert_one(user_doc)
+        update_counters(totals=user_counter_deltas(user_doc), registrations=1)
         
         # Log the action
         log_action(str(result.inserted_id), 'register', 'user', str(result.inserted_id))
@@ -122,8 +129,11 @@ def register():
             'requires_approval': data['role'] == 'doctor'
         }), 201
     
+    except PasswordHasherBusy:
+        return server_busy_response()
     except Exception as e:
-        print(f"Registration error: {e}")
+        logger.exception("Registration error")
+        record_db_error(e)
         return jsonify({'error': 'Registration failed. Please try again.'}), 500
 
 @bp.route('/login', methods=['POST'])
@@ -142,7 +152,10 @@ def login():
             return jsonify({'error': 'Email and password required'}), 400
         
         # Find user
-        user = users_collection.find_one({'email': data['email']})
+        user = users_collection.find_one(
+            {'email': data['email']},
+            get_projection('user-auth')
+        )
         
         if not user:
             return jsonify({'error': 'Invalid email or password'}), 401
@@ -159,6 +172,16 @@ def login():
         if user['role'] == 'doctor' and not user.get('is_verified', False):
             return jsonify({'error': 'Your account is pending admin approval. Please wait for verification.'}), 403
         
+        # Upgrade the hash if the bcrypt cost has been raised since it was made
+        if needs_rehash(user['password_hash']):
+            try:
+                users_collection.update_one(
+                    {'_id': user['_id']},
+                    {'$set': {'password_hash': hash_password(data['password'])}}
+                )
+            except PasswordHasherBusy:
+                pass  # Try again on the next login
+        
         # NEW: Check and update profile completion status
         is_complete = check_profile_completion(user)
         
@@ -166,7 +189,10 @@ def login():
         if user.get('is_profile_complete') != is_complete:
             users_collection.update_one(
                 {'_id': user['_id']},
-                {'$set': {'is_profile_complete': is_complete}}
+                {'$set': {
+                    'is_profile_complete': is_complete,
+                    'updated_at': datetime.utcnow()
+                }}
             )
             user['is_profile_complete'] = is_complete
         
@@ -195,15 +221,18 @@ def login():
             }
         }), 200
     
+    except PasswordHasherBusy:
+        return server_busy_response()
     except Exception as e:
-        print(f"Login error: {e}")
+        logger.exception("Login error")
+        record_db_error(e)
         return jsonify({'error': 'Login failed. Please try again.'}), 500
 
 @bp.route('/verify', methods=['GET'])
 def verify_token():
     """Verify if token is valid"""
     try:
-        from app.utils.auth import decode_token
+        from app.utils.auth import authenticate_token
         
         # Get token from header
         auth_header = request.headers.get('Authorization')
@@ -216,7 +245,7 @@ def verify_token():
             return jsonify({'error': 'Invalid token format'}), 401
         
         # Decode token
-        payload = decode_token(token)
+        payload = authenticate_token(token)
         
         if 'error' in payload:
             return jsonify({'error': payload['error']}), 401
@@ -227,5 +256,6 @@ def verify_token():
         }), 200
     
     except Exception as e:
-        print(f"Token verification error: {e}")
+        logger.exception("Token verification error")
+        record_db_error(e)
         return jsonify({'error': 'Token verification failed'}), 500
\ No newline at end of file
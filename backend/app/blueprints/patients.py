@@ -1,13 +1,21 @@
+import logging
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
-from app.models.database import get_users_collection, get_records_collection
+from app.models.database import get_users_collection, get_records_collection, record_db_error
+from app.models.projections import get_projection
+from app.models.photos import with_photo_url
 from app.utils.auth import require_auth, require_role
+from app.utils.conditional import conditional, patient_version
+from app.utils.pagination import get_page_params, paginate, page_response, InvalidPageRequest
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('patients', __name__, url_prefix='/api/patients')
 
 @bp.route('/profile', methods=['GET'])
 @require_auth
 @require_role(['patient'])
+@conditional(version=lambda: patient_version(request.user['user_id']))
 def get_patient_profile():
     """Get patient's own profile with record count"""
     try:
@@ -20,7 +28,10 @@ def get_patient_profile():
         user_id = request.user['user_id']
         
         # Get user info
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-full')
+        )
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -30,40 +41,46 @@ def get_patient_profile():
             'is_deleted': False
         })
         
-        user.pop('password_hash', None)
-        user['_id'] = str(user['_id'])
+        with_photo_url(user)
         user['record_count'] = record_count
         
         return jsonify({'patient': user}), 200
     
     except Exception as e:
-        print(f"Get patient profile error: {e}")
+        logger.exception("Get patient profile error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch profile'}), 500
 
 @bp.route('/list', methods=['GET'])
 @require_auth
 @require_role(['admin', 'doctor'])
 def list_patients():
-    """List all patients (admin/doctor only)"""
+    """List all patients, newest first, one page at a time (admin/doctor only)"""
     try:
         users_collection = get_users_collection()
         if users_collection is None:
             return jsonify({'error': 'Database connection error'}), 503
         
-        patients = list(users_collection.find({'role': 'patient'}))
-        
-        for patient in patients:
-            patient.pop('password_hash', None)
-            patient['_id'] = str(patient['_id'])
+        page = paginate(
+            users_collection,
+            {'role': 'patient'},
+            [('_id', -1)],
+            projection=get_projection('user-list'),
+            **get_page_params()
+        )
         
-        return jsonify({'patients': patients, 'count': len(patients)}), 200
+        return jsonify(page_response(page, 'patients')), 200
     
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"List patients error: {e}")
+        logger.exception("List patients error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch patients'}), 500
 
 @bp.route('/health-card', methods=['GET'])
 @require_auth
+@conditional(version=lambda: patient_version(request.user['user_id']))
 def get_health_card():
     """Get patient digital health card data"""
     try:
@@ -76,7 +93,10 @@ def get_health_card():
         user_id = request.user['user_id']
         
         # Get user details
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-health-card')
+        )
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -108,5 +128,6 @@ def get_health_card():
         return jsonify({'health_card': health_card}), 200
     
     except Exception as e:
-        print(f"Get health card error: {e}")
+        logger.exception("Get health card error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to get health card'}), 500
@@ -1,14 +1,46 @@
-from flask import Blueprint, request, jsonify, send_file
+import logging
+from flask import Blueprint, request, jsonify, Response
 from bson import ObjectId
-from io import BytesIO
-from app.models.database import get_records_collection, get_users_collection
+from itertools import chain
+from app.models.database import get_records_collection, get_users_collection, record_db_error
 from app.models.schemas import RecordSchema
+from app.models.projections import get_projection
+from app.models.stats import update_counters
+from app.models.blob_store import get_blob_store, get_blob, open_blob_stream
 from app.utils.auth import require_auth
-from app.utils.encryption import encrypt_file_data, decrypt_file_data
+from app.utils.encryption import (
+    decrypt_file_data, encrypt_stream, decrypt_stream, primary_key_id, STREAM_METHOD
+)
 from app.utils.audit import log_action
+from app.utils.conditional import conditional, records_version, bump_records_revision
+from app.utils.pagination import get_page_params, paginate, page_response, InvalidPageRequest
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('records', __name__, url_prefix='/api/records')
 
+# Room for multipart boundaries and the other form fields
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+def read_upload(file, max_size, chunk_size, counter):
+    """Read an uploaded file chunk by chunk, enforcing max_size"""
+    while True:
+        chunk = file.stream.read(chunk_size)
+        if not chunk:
+            break
+        counter['size'] += len(chunk)
+        if counter['size'] > max_size:
+            raise UploadTooLarge()
+        yield chunk
+
+def upload_too_large(max_size):
+    """The 413 response for an upload over max_size, however it was caught"""
+    return jsonify({'error': f'File size must be less than {max_size // (1024 * 1024)}MB'}), 413
+
 @bp.route('/upload', methods=['POST'])
 @require_auth
 def upload_record():
@@ -19,6 +51,11 @@ def upload_record():
         if records_collection is None:
             return jsonify({'error': 'Database connection error'}), 503
         
+        # Reject oversized uploads before reading the body
+        max_size = Config.MAX_UPLOAD_SIZE
+        if request.content_length and request.content_length > max_size + UPLOAD_FORM_OVERHEAD:
+            return upload_too_large(max_size)
+        
         # Check if file is present
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -36,18 +73,19 @@ def upload_record():
         if request.user['role'] == 'patient' and patient_id != request.user['user_id']:
             return jsonify({'error': 'Cannot upload for other patients'}), 403
         
-        # Read file data
-        file_data = file.read()
-        
-        # Check file size (10MB limit)
-        if len(file_data) > 10 * 1024 * 1024:
-            return jsonify({'error': 'File size must be less than 10MB'}), 400
-        
-        # Encrypt the file
-        encryption_result = encrypt_file_data(file_data)
-        
-        if not encryption_result['success']:
-            return jsonify({'error': 'Encryption failed'}), 500
+        # Encrypt and store the file a chunk at a time (10MB limit)
+        chunk_size = Config.ENCRYPTION_CHUNK_SIZE
+        key_id = primary_key_id()
+        counter = {'size': 0}
+        blob_store = get_blob_store()
+        try:
+            blob_ref = blob_store.put_stream(encrypt_stream(
+                read_upload(file, max_size, chunk_size, counter),
+                chunk_size=chunk_size,
+                key_id=key_id
+            ))
+        except UploadTooLarge:
+            return upload_too_large(max_size)
         
         # Create record document
         record_doc = RecordSchema.create(
@@ -55,13 +93,24 @@ def upload_record():
             uploaded_by=request.user['user_id'],
             file_name=file.filename,
             file_type=file.content_type or 'application/octet-stream',
-            encrypted_data=encryption_result['encrypted_data'],
-            encryption_metadata={'method': encryption_result['encryption_method']},
-            description=description
+            blob_ref=blob_ref,
+            encryption_metadata={
+                'method': STREAM_METHOD,
+                'chunk_size': chunk_size,
+                'key_id': key_id
+            },
+            description=description,
+            file_size=counter['size']
         )
         
         # Insert into database
-        result = records_collection.insert_one(record_doc)
+        try:
+            result = records_collection.insert_one(record_doc)
+        except Exception:
+            blob_store.delete(blob_ref)
+            raise
+        update_counters(totals={'records_active': 1}, uploads=1)
+        bump_records_revision(record_doc['patient_id'])
         
         # Log the action
         log_action(request.user['user_id'], 'upload', 'record', str(result.inserted_id))
@@ -72,15 +121,15 @@ def upload_record():
         }), 201
     
     except Exception as e:
-        print(f"Upload error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Upload error")
+        record_db_error(e)
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
 @bp.route('/my-records', methods=['GET'])
 @require_auth
+@conditional(version=lambda: records_version(request.user['user_id']))
 def get_my_records():
-    """Get all records for the current user"""
+    """Get the current user's records, newest first, one page at a time"""
     try:
         # Get records collection
         records_collection = get_records_collection()
@@ -89,23 +138,21 @@ def get_my_records():
         
         user_id = request.user['user_id']
         
-        records = list(records_collection.find({
-            'patient_id': ObjectId(user_id),
-            'is_deleted': False
-        }).sort('uploaded_at', -1))
-        
-        # Format records
-        for record in records:
-            record['_id'] = str(record['_id'])
-            record['patient_id'] = str(record['patient_id'])
-            record['uploaded_by'] = str(record['uploaded_by'])
-            # Don't send encrypted data in list view
-            record.pop('encrypted_data', None)
+        page = paginate(
+            records_collection,
+            {'patient_id': ObjectId(user_id), 'is_deleted': False},
+            [('uploaded_at', -1), ('_id', -1)],
+            projection=get_projection('record-summary'),
+            **get_page_params()
+        )
         
-        return jsonify({'records': records, 'count': len(records)}), 200
+        return jsonify(page_response(page, 'records')), 200
     
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Get records error: {e}")
+        logger.exception("Get records error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch records'}), 500
 
 @bp.route('/<record_id>', methods=['GET'])
@@ -121,7 +168,7 @@ def get_record(record_id):
         record = records_collection.find_one({
             '_id': ObjectId(record_id),
             'is_deleted': False
-        })
+        }, get_projection('record-summary'))
         
         if not record:
             return jsonify({'error': 'Record not found'}), 404
@@ -130,19 +177,14 @@ def get_record(record_id):
         if request.user['role'] == 'patient' and str(record['patient_id']) != request.user['user_id']:
             return jsonify({'error': 'Access denied'}), 403
         
-        record['_id'] = str(record['_id'])
-        record['patient_id'] = str(record['patient_id'])
-        record['uploaded_by'] = str(record['uploaded_by'])
-        # Don't send encrypted data
-        record.pop('encrypted_data', None)
-        
         # Log the action
         log_action(request.user['user_id'], 'view', 'record', record_id)
         
         return jsonify({'record': record}), 200
     
     except Exception as e:
-        print(f"Get record error: {e}")
+        logger.exception("Get record error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch record'}), 500
 
 @bp.route('/<record_id>/download', methods=['GET'])
@@ -158,7 +200,7 @@ def download_record(record_id):
         record = records_collection.find_one({
             '_id': ObjectId(record_id),
             'is_deleted': False
-        })
+        }, get_projection('record-download'))
         
         if not record:
             return jsonify({'error': 'Record not found'}), 404
@@ -167,21 +209,40 @@ def download_record(record_id):
         if request.user['role'] == 'patient' and str(record['patient_id']) != request.user['user_id']:
             return jsonify({'error': 'Access denied'}), 403
         
-        # Decrypt file data
-        decrypted_data = decrypt_file_data(record['encrypted_data'])
+        # Decrypt file data chunk by chunk. Older Fernet records can only be
+        # decrypted whole (unmigrated ones still hold the data inline)
+        # Records from before key ids were stored have none; all keys are tried
+        metadata = record.get('encryption_metadata') or {}
+        key_id = metadata.get('key_id')
+        if metadata.get('method') == STREAM_METHOD:
+            chunks = decrypt_stream(
+                open_blob_stream(record['blob_ref'], Config.ENCRYPTION_CHUNK_SIZE), key_id
+            )
+        elif record.get('blob_ref'):
+            chunks = iter([decrypt_file_data(get_blob(record['blob_ref']), key_id)])
+        else:
+            chunks = iter([decrypt_file_data(record['encrypted_data'], key_id)])
+        
+        # Decrypt the first chunk now so bad keys or corrupt blobs still
+        # get an error response instead of a truncated download
+        first_chunk = next(chunks, b'')
         
         # Log the action
         log_action(request.user['user_id'], 'download', 'record', record_id)
         
-        return send_file(
-            BytesIO(decrypted_data),
-            download_name=record['file_name'],
-            as_attachment=True,
-            mimetype=record['file_type']
+        response = Response(
+            chain([first_chunk], chunks),
+            mimetype=record['file_type'],
+            direct_passthrough=True
         )
+        response.headers.set('Content-Disposition', 'attachment', filename=record['file_name'])
+        if record.get('file_size') is not None:
+            response.content_length = record['file_size']
+        return response
     
     except Exception as e:
-        print(f"Download error: {e}")
+        logger.exception("Download error")
+        record_db_error(e)
         return jsonify({'error': 'Download failed'}), 500
 
 @bp.route('/<record_id>', methods=['DELETE'])
@@ -194,7 +255,10 @@ def delete_record(record_id):
         if records_collection is None:
             return jsonify({'error': 'Database connection error'}), 503
         
-        record = records_collection.find_one({'_id': ObjectId(record_id)})
+        record = records_collection.find_one(
+            {'_id': ObjectId(record_id)},
+            get_projection('record-owner')
+        )
         
         if not record:
             return jsonify({'error': 'Record not found'}), 404
@@ -204,10 +268,17 @@ def delete_record(record_id):
             return jsonify({'error': 'Access denied'}), 403
         
         # Soft delete
-        records_collection.update_one(
-            {'_id': ObjectId(record_id)},
+        result = records_collection.update_one(
+            {'_id': ObjectId(record_id), 'is_deleted': False},
             {'$set': {'is_deleted': True}}
         )
+        if result.modified_count:
+            update_counters(
+                totals={'records_active': -1},
+                day=record.get('uploaded_at'),
+                uploads=-1
+            )
+            bump_records_revision(record['patient_id'])
         
         # Log the action
         log_action(request.user['user_id'], 'delete', 'record', record_id)
@@ -215,5 +286,6 @@ def delete_record(record_id):
         return jsonify({'message': 'Record deleted successfully'}), 200
     
     except Exception as e:
-        print(f"Delete error: {e}")
+        logger.exception("Delete error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to delete record'}), 500
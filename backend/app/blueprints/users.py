@@ -1,13 +1,23 @@
-from flask import Blueprint, request, jsonify
+import logging
+from flask import Blueprint, request, jsonify, Response
 from bson import ObjectId
 from datetime import datetime
-import base64
-from app.models.database import get_users_collection
+from app.models.database import get_users_collection, record_db_error
+from app.models.photos import (
+    save_photo, delete_photo, get_photo_variant, with_photo_url, InvalidPhoto
+)
+from app.models.projections import get_projection, PROFILE_COMPLETION_FIELDS
 from app.utils.auth import require_auth, require_role
 from app.utils.audit import log_action
+from app.utils.conditional import conditional, user_version
+from app.utils.pagination import get_page_params, paginate, page_response, InvalidPageRequest
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('users', __name__, url_prefix='/api/users')
 
+PHOTO_CACHE_MAX_AGE = 365 * 24 * 3600
+
 def check_profile_completion(user_data):
     """
     Check if patient profile is complete with all required fields.
@@ -16,21 +26,7 @@ def check_profile_completion(user_data):
     if user_data.get('role') != 'patient':
         return True  # Only validate for patients
     
-    required_fields = [
-        'full_name',
-        'phone',
-        'gender',
-        'date_of_birth',
-        'address',
-        'blood_group',
-        'emergency_contact_name',
-        'emergency_contact',
-        'emergency_contact_relation',
-        'allergies',
-        'chronic_conditions'
-    ]
-    
-    for field in required_fields:
+    for field in PROFILE_COMPLETION_FIELDS:
         value = user_data.get(field)
         
         # For list fields (allergies, chronic_conditions), they must exist (can be empty list)
@@ -46,6 +42,7 @@ def check_profile_completion(user_data):
 
 @bp.route('/me', methods=['GET'])
 @require_auth
+@conditional(version=lambda: user_version(request.user['user_id']))
 def get_current_user():
     """Get current user's profile"""
     try:
@@ -54,7 +51,10 @@ def get_current_user():
             return jsonify({'error': 'Database connection error'}), 503
         
         user_id = request.user['user_id']
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-full')
+        )
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -66,18 +66,20 @@ def get_current_user():
         if user.get('is_profile_complete') != is_complete:
             users_collection.update_one(
                 {'_id': ObjectId(user_id)},
-                {'$set': {'is_profile_complete': is_complete}}
+                {'$set': {
+                    'is_profile_complete': is_complete,
+                    'updated_at': datetime.utcnow()
+                }}
             )
             user['is_profile_complete'] = is_complete
         
-        # Remove sensitive data
-        user.pop('password_hash', None)
-        user['_id'] = str(user['_id'])
+        with_photo_url(user)
         
         return jsonify({'user': user}), 200
     
     except Exception as e:
-        print(f"Get user error: {e}")
+        logger.exception("Get user error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch user'}), 500
 
 @bp.route('/<user_id>', methods=['GET'])
@@ -89,42 +91,53 @@ def get_user(user_id):
         if users_collection is None:
             return jsonify({'error': 'Database connection error'}), 503
         
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-full')
+        )
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Remove sensitive data
-        user.pop('password_hash', None)
-        user['_id'] = str(user['_id'])
+        with_photo_url(user)
         
         return jsonify({'user': user}), 200
     
     except Exception as e:
-        print(f"Get user error: {e}")
+        logger.exception("Get user error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch user'}), 500
 
 @bp.route('/all', methods=['GET'])
 @require_auth
 @require_role(['admin'])
 def get_all_users():
-    """Get all users (admin only)"""
+    """Get all users, newest first, one page at a time, optionally of one role (admin only)"""
     try:
         users_collection = get_users_collection()
         if users_collection is None:
             return jsonify({'error': 'Database connection error'}), 503
         
-        users = list(users_collection.find())
-        
-        # Remove sensitive data
-        for user in users:
-            user.pop('password_hash', None)
-            user['_id'] = str(user['_id'])
+        # Filtered here rather than in the browser, which only has one page
+        role = request.args.get('role')
+        if role and role not in ('patient', 'doctor', 'admin'):
+            return jsonify({'error': 'role must be patient, doctor or admin'}), 400
+        
+        page = paginate(
+            users_collection,
+            {'role': role} if role else {},
+            [('_id', -1)],
+            projection=get_projection('user-list'),
+            **get_page_params()
+        )
         
-        return jsonify({'users': users, 'count': len(users)}), 200
+        return jsonify(page_response(page, 'users')), 200
     
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Get users error: {e}")
+        logger.exception("Get users error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to fetch users'}), 500
 
 @bp.route('/update-profile', methods=['POST'])
@@ -140,7 +153,10 @@ def update_profile():
         user_id = request.user['user_id']
         
         # Fetch current user data first
-        current_user = users_collection.find_one({'_id': ObjectId(user_id)})
+        current_user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-completion')
+        )
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -209,16 +225,15 @@ def update_profile():
             # Always set the completion status based on current state
             update_fields['is_profile_complete'] = is_complete
             
-            print(f"Profile completion check: {is_complete}")
-            print(f"Required fields status:")
-            required_fields = [
-                'full_name', 'phone', 'gender', 'date_of_birth', 'blood_group', 'address', 
-                'emergency_contact', 'emergency_contact_name', 'emergency_contact_relation',
-                'allergies', 'chronic_conditions'
-            ]
-            for field in required_fields:
-                value = combined_profile.get(field)
-                print(f"  {field}: {value} (type: {type(value)})")
+            if not is_complete:
+                # Field names only - the values are PHI
+                logger.debug("Profile incomplete", extra={
+                    'user_id': user_id,
+                    'missing_fields': [
+                        field for field in PROFILE_COMPLETION_FIELDS
+                        if combined_profile.get(field) in (None, '')
+                    ]
+                })
 
         # Update user
         result = users_collection.update_one(
@@ -230,9 +245,11 @@ def update_profile():
             return jsonify({'error': 'User not found'}), 404
         
         # Get updated user
-        updated_user = users_collection.find_one({'_id': ObjectId(user_id)})
-        updated_user.pop('password_hash', None)
-        updated_user['_id'] = str(updated_user['_id'])
+        updated_user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-full')
+        )
+        with_photo_url(updated_user)
         
         log_action(user_id, 'update_profile', 'user', user_id)
         
@@ -242,9 +259,8 @@ def update_profile():
         }), 200
     
     except Exception as e:
-        print(f"Update profile error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Update profile error")
+        record_db_error(e)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/upload-photo', methods=['POST'])
@@ -267,51 +283,47 @@ def upload_profile_photo():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Validate file type
-        allowed_extensions = {'jpg', 'jpeg', 'png'}
         file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
         
-        if file_ext not in allowed_extensions:
-            return jsonify({'error': 'Invalid file type. Only JPG, JPEG, PNG allowed'}), 400
+        # Store the photo and thumbnails out of line; the user document
+        # only keeps the current version
+        version = save_photo(user_id, file.read(), file_ext)
         
-        # Read file data
-        file_data = file.read()
-        
-        # Validate file size (max 2MB)
-        if len(file_data) > 2 * 1024 * 1024:
-            return jsonify({'error': 'File too large. Maximum size is 2MB'}), 400
-        
-        # Convert to base64 for storage
-        photo_base64 = base64.b64encode(file_data).decode('utf-8')
-        photo_data = f"data:image/{file_ext};base64,{photo_base64}"
-        
-        # Update user profile
         result = users_collection.update_one(
             {'_id': ObjectId(user_id)},
-            {'$set': {
-                'profile_photo': photo_data,
-                'updated_at': datetime.utcnow()
-            }}
+            {
+                '$set': {
+                    'photo_version': version,
+                    'updated_at': datetime.utcnow()
+                },
+                '$unset': {'profile_photo': ''}
+            }
         )
         
         if result.matched_count == 0:
+            delete_photo(user_id)
             return jsonify({'error': 'User not found'}), 404
         
         # Get updated user
-        updated_user = users_collection.find_one({'_id': ObjectId(user_id)})
-        updated_user.pop('password_hash', None)
-        updated_user['_id'] = str(updated_user['_id'])
+        updated_user = users_collection.find_one(
+            {'_id': ObjectId(user_id)},
+            get_projection('user-full')
+        )
+        with_photo_url(updated_user)
         
         log_action(user_id, 'upload_profile_photo', 'user', user_id)
         
         return jsonify({
             'message': 'Profile photo uploaded successfully',
-            'photo_url': photo_data,
+            'photo_url': updated_user['profile_photo'],
             'user': updated_user
         }), 200
     
+    except InvalidPhoto as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Upload profile photo error: {e}")
+        logger.exception("Upload profile photo error")
+        record_db_error(e)
         return jsonify({'error': 'Failed to upload photo'}), 500
 
 @bp.route('/delete-photo', methods=['POST'])
@@ -328,19 +340,54 @@ def delete_profile_photo():
         # Remove profile photo
         result = users_collection.update_one(
             {'_id': ObjectId(user_id)},
-            {'$set': {
-                'profile_photo': None,
-                'updated_at': datetime.utcnow()
-            }}
+            {
+                '$set': {
+                    'photo_version': None,
+                    'updated_at': datetime.utcnow()
+                },
+                '$unset': {'profile_photo': ''}
+            }
         )
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
         
+        delete_photo(user_id)
+        
         log_action(user_id, 'delete_profile_photo', 'user', user_id)
         
         return jsonify({'message': 'Profile photo deleted successfully'}), 200
     
     except Exception as e:
-        print(f"Delete profile photo error: {e}")
-        return jsonify({'error': 'Failed to delete photo'}), 500
\ No newline at end of file
+        logger.exception("Delete profile photo error")
+        record_db_error(e)
+        return jsonify({'error': 'Failed to delete photo'}), 500
+
+@bp.route('/<user_id>/photo', methods=['GET'])
+def get_user_photo(user_id):
+    """
+    Serve a profile photo as image bytes
+    No auth header: the unguessable version in ?v= (from the user's
+    profile_photo URL) grants access, so the URL works as an <img> src
+    """
+    try:
+        version = request.args.get('v')
+        if not version or not ObjectId.is_valid(user_id):
+            return jsonify({'error': 'Photo not found'}), 404
+        
+        photo = get_photo_variant(user_id, version, request.args.get('size'))
+        if photo is None:
+            return jsonify({'error': 'Photo not found'}), 404
+        
+        # A given URL always serves the same bytes; a new upload gets a new version
+        response = Response(photo['data'], mimetype=photo['content_type'])
+        response.set_etag(photo['etag'])
+        response.headers['Cache-Control'] = f'private, max-age={PHOTO_CACHE_MAX_AGE}, immutable'
+        return response.make_conditional(request)
+    
+    except ConnectionError:
+        return jsonify({'error': 'Database connection error'}), 503
+    except Exception as e:
+        logger.exception("Get photo error")
+        record_db_error(e)
+        return jsonify({'error': 'Failed to fetch photo'}), 500
@@ -7,6 +7,8 @@ from .database import (
     init_db
 )
 from .schemas import UserSchema, RecordSchema, AccessPermissionSchema, AuditLogSchema
+from .projections import get_projection, PROJECTIONS
+from .lookups import attach_user_summaries
 
 __all__ = [
     'Database',
@@ -18,5 +20,8 @@ __all__ = [
     'UserSchema',
     'RecordSchema',
     'AccessPermissionSchema',
-    'AuditLogSchema'
+    'AuditLogSchema',
+    'get_projection',
+    'PROJECTIONS',
+    'attach_user_summaries'
 ]
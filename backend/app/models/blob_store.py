@@ -0,0 +1,286 @@
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+import gridfs
+from bson import ObjectId
+from config.settings import Config
+from .database import Database, get_records_collection
+
+logger = logging.getLogger(__name__)
+
+class BlobStore:
+    """
+    Base class for record file storage
+
+    put() stores bytes and returns a blob reference dict that is saved on
+    the record document; get() and delete() take that reference back.
+    put_stream() and open_stream() do the same a chunk at a time.
+    """
+
+    name = None
+
+    def put(self, data):
+        raise NotImplementedError
+
+    def put_stream(self, chunks):
+        raise NotImplementedError
+
+    def get(self, ref):
+        raise NotImplementedError
+
+    def open_stream(self, ref, chunk_size=64 * 1024):
+        raise NotImplementedError
+
+    def delete(self, ref):
+        raise NotImplementedError
+
+class GridFSBlobStore(BlobStore):
+    """Chunked storage in a GridFS bucket next to the records collection"""
+
+    name = 'gridfs'
+
+    def __init__(self, bucket_name='record_blobs', chunk_size=255 * 1024):
+        self.bucket_name = bucket_name
+        self.chunk_size = chunk_size
+        self._bucket = None
+        self._bucket_db = None
+
+    def _get_bucket(self):
+        db = Database.get_db()
+        if db is None:
+            raise ConnectionError('Database not connected')
+        # Rebuild when Database hands out a new db (reconnect or fork)
+        if self._bucket is None or self._bucket_db is not db:
+            self._bucket = gridfs.GridFSBucket(
+                db,
+                bucket_name=self.bucket_name,
+                chunk_size_bytes=self.chunk_size
+            )
+            self._bucket_db = db
+        return self._bucket
+
+    def put(self, data):
+        file_id = self._get_bucket().upload_from_stream('record', data)
+        return {'backend': self.name, 'id': file_id, 'size': len(data)}
+
+    def put_stream(self, chunks):
+        grid_in = self._get_bucket().open_upload_stream('record')
+        size = 0
+        try:
+            for chunk in chunks:
+                grid_in.write(chunk)
+                size += len(chunk)
+        except Exception:
+            grid_in.abort()
+            raise
+        grid_in.close()
+        return {'backend': self.name, 'id': grid_in._id, 'size': size}
+
+    def get(self, ref):
+        return self._get_bucket().open_download_stream(ObjectId(ref['id'])).read()
+
+    def open_stream(self, ref, chunk_size=64 * 1024):
+        grid_out = self._get_bucket().open_download_stream(ObjectId(ref['id']))
+        return _iter_file(grid_out, chunk_size)
+
+    def delete(self, ref):
+        try:
+            self._get_bucket().delete(ObjectId(ref['id']))
+        except gridfs.errors.NoFile:
+            pass
+
+class LocalBlobStore(BlobStore):
+    """Content-addressed files on local disk, named by SHA-256"""
+
+    name = 'local'
+
+    def __init__(self, root='blob_storage'):
+        self.root = root
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so readers never see partial blobs
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return {'backend': self.name, 'id': digest, 'size': len(data)}
+
+    def put_stream(self, chunks):
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        # The name is only known once everything is written, so stage the
+        # blob in a temp file and rename it into place
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            path = self._path(digest.hexdigest())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {'backend': self.name, 'id': digest.hexdigest(), 'size': size}
+
+    def get(self, ref):
+        with open(self._path(ref['id']), 'rb') as f:
+            return f.read()
+
+    def open_stream(self, ref, chunk_size=64 * 1024):
+        return _iter_file(open(self._path(ref['id']), 'rb'), chunk_size)
+
+    def delete(self, ref):
+        try:
+            os.remove(self._path(ref['id']))
+        except FileNotFoundError:
+            pass
+
+def _iter_file(f, chunk_size):
+    """Yield a file object's contents chunk by chunk, then close it"""
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+_stores = {}
+
+def get_blob_store(backend=None):
+    """
+    Get a blob store by backend name
+    Defaults to Config.BLOB_STORE_BACKEND for new uploads
+    """
+    backend = backend or Config.BLOB_STORE_BACKEND
+    if backend not in _stores:
+        if backend == GridFSBlobStore.name:
+            _stores[backend] = GridFSBlobStore(chunk_size=Config.GRIDFS_CHUNK_SIZE)
+        elif backend == LocalBlobStore.name:
+            _stores[backend] = LocalBlobStore(root=Config.BLOB_STORE_PATH)
+        else:
+            raise ValueError(f"Unknown blob store backend: {backend}")
+    return _stores[backend]
+
+def get_blob(ref):
+    """Read a blob from whichever backend stored it"""
+    return get_blob_store(ref['backend']).get(ref)
+
+def open_blob_stream(ref, chunk_size=64 * 1024):
+    """Stream a blob from whichever backend stored it"""
+    return get_blob_store(ref['backend']).open_stream(ref, chunk_size)
+
+def get_pending_deletes_collection():
+    return Database.get_collection('pending_blob_deletes')
+
+def delete_blob_later(ref):
+    """
+    Queue a blob that a record no longer points at for deletion
+
+    A download that loaded the record before it changed may still be
+    streaming the old blob, so it is only removed by
+    purge_deleted_blobs() once BLOB_DELETE_GRACE seconds have passed.
+    """
+    pending_collection = get_pending_deletes_collection()
+    if pending_collection is None:
+        raise ConnectionError('Database not connected')
+    pending_collection.insert_one({'blob_ref': ref, 'queued_at': datetime.utcnow()})
+
+def purge_deleted_blobs(grace=None):
+    """Delete queued blobs older than the grace period; returns how many"""
+    pending_collection = get_pending_deletes_collection()
+    if pending_collection is None:
+        raise ConnectionError('Database not connected')
+
+    grace = Config.BLOB_DELETE_GRACE if grace is None else grace
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    purged = 0
+    for entry in pending_collection.find({'queued_at': {'$lt': cutoff}}):
+        get_blob_store(entry['blob_ref']['backend']).delete(entry['blob_ref'])
+        pending_collection.delete_one({'_id': entry['_id']})
+        purged += 1
+    if purged:
+        logger.info("✓ Deleted %d replaced blobs", purged)
+    return purged
+
+def migrate_inline_records(batch_size=100):
+    """
+    Move encrypted file data stored inline on record documents into the
+    configured blob store, leaving only the blob reference behind.
+    Safe to re-run: only records that still have encrypted_data are touched.
+    """
+    import base64
+
+    records_collection = get_records_collection()
+    if records_collection is None:
+        logger.error("✗ Migration aborted - database not connected")
+        return 0
+
+    store = get_blob_store()
+    migrated = 0
+
+    while True:
+        batch = list(records_collection.find(
+            {'encrypted_data': {'$exists': True}},
+            {'encrypted_data': 1, 'encryption_metadata': 1}
+        ).limit(batch_size))
+
+        if not batch:
+            break
+
+        for record in batch:
+            # Legacy records hold base64 of the Fernet token
+            token = base64.b64decode(record['encrypted_data'].encode('utf-8'))
+            blob_ref = store.put(token)
+
+            metadata = dict(record.get('encryption_metadata') or {})
+            metadata['encoding'] = 'raw'
+
+            result = records_collection.update_one(
+                {'_id': record['_id'], 'encrypted_data': {'$exists': True}},
+                {
+                    '$set': {'blob_ref': blob_ref, 'encryption_metadata': metadata},
+                    '$unset': {'encrypted_data': ''}
+                }
+            )
+            if result.modified_count:
+                migrated += 1
+            else:
+                store.delete(blob_ref)
+
+        logger.info("Migrated %d records...", migrated)
+
+    logger.info("✓ Migrated %d records to '%s' blob storage", migrated, store.name)
+    return migrated
+
+if __name__ == "__main__":
+    from app.utils.log import configure_logging
+    configure_logging()
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'migrate':
+        migrate_inline_records()
+    elif command == 'purge':
+        purge_deleted_blobs()
+    else:
+        print("Usage: python -m app.models.blob_store [migrate|purge]")
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an external dependency
+
+    closed    - calls go through; consecutive failures are counted
+    open      - calls fail fast; a background probe retries after reset_timeout
+    half_open - the probe is checking the dependency; calls still fail fast
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, probe, failure_threshold=3, reset_timeout=5.0):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._last_error = None
+        self._times_opened = 0
+        self._probe_thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow_request(self):
+        """True if callers may use the dependency"""
+        return self._state == self.CLOSED
+
+    def record_success(self):
+        """Reset the failure count after a successful call"""
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self, error=None):
+        """Count a failure; open the circuit once the threshold is reached"""
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error) if error else self._last_error
+            if self._state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self, error=None):
+        """Open the circuit immediately"""
+        with self._lock:
+            self._last_error = str(error) if error else self._last_error
+            if self._state == self.CLOSED:
+                self._open()
+
+    def retry_after(self):
+        """Seconds until the next reconnect attempt (0 when closed)"""
+        if self._state == self.CLOSED or self._opened_at is None:
+            return 0
+        remaining = self._opened_at + self.reset_timeout - time.monotonic()
+        return max(remaining, 1)
+
+    def snapshot(self):
+        """Breaker state for health endpoints"""
+        return {
+            'name': self.name,
+            'state': self._state,
+            'consecutive_failures': self._failures,
+            'times_opened': self._times_opened,
+            'retry_after': round(self.retry_after(), 1),
+            'last_error': self._last_error
+        }
+
+    def _open(self):
+        # Caller holds self._lock
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._times_opened += 1
+        logger.error("✗ Circuit '%s' opened: %s", self.name, self._last_error)
+        if self._probe_thread is None or not self._probe_thread.is_alive():
+            self._probe_thread = threading.Thread(
+                target=self._probe_loop,
+                name=f'{self.name}-breaker-probe',
+                daemon=True
+            )
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        """Retry the dependency in the background until it recovers"""
+        while True:
+            time.sleep(max(self.retry_after(), 0.1))
+            with self._lock:
+                self._state = self.HALF_OPEN
+            try:
+                self.probe()
+            except Exception as e:
+                with self._lock:
+                    self._last_error = str(e)
+                    self._state = self.OPEN
+                    self._opened_at = time.monotonic()
+                continue
+            with self._lock:
+                self._state = self.CLOSED
+                self._failures = 0
+                self._opened_at = None
+            logger.info("✓ Circuit '%s' closed", self.name)
+            return
@@ -1,74 +1,216 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from pymongo.errors import ConnectionFailure
+import logging
 import os
-from dotenv import load_dotenv
+import threading
+from config.settings import Config
+from .circuit_breaker import CircuitBreaker
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+def _probe_mongo():
+    """Ping MongoDB with a short-lived client and short timeouts"""
+    timeout = Config.DB_BREAKER_PROBE_TIMEOUT_MS
+    client = MongoClient(
+        Config.MONGO_URI,
+        serverSelectionTimeoutMS=timeout,
+        connectTimeoutMS=timeout
+    )
+    try:
+        client.admin.command('ping')
+    finally:
+        client.close()
+
+def _new_breaker():
+    return CircuitBreaker(
+        'mongodb',
+        probe=_probe_mongo,
+        failure_threshold=Config.DB_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=Config.DB_BREAKER_RESET_TIMEOUT
+    )
+
+class _TopologyBreakerListener(monitoring.TopologyListener):
+    """
+    Open the circuit when the topology loses its last writable server
+
+    Heartbeat failures of single members (e.g. one unreachable secondary)
+    do not matter while a primary or mongos is still selectable.
+    """
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        previous, new = event.previous_description, event.new_description
+        if previous.has_writable_server() and not new.has_writable_server():
+            Database.breaker.trip(f"no writable server in {new.topology_type_name} topology")
+
+    def closed(self, event):
+        pass
+
+class _CommandBreakerListener(monitoring.CommandListener):
+    """Reset the consecutive failure count whenever a command succeeds"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        Database.breaker.record_success()
+
+    def failed(self, event):
+        pass
 
 class Database:
-    """MongoDB Database Connection Manager"""
-    
+    """
+    MongoDB Database Connection Manager
+
+    One MongoClient is kept per worker process. The client is created lazily
+    on first use, so gunicorn workers never share a client (and its sockets
+    and monitor threads) inherited from the master across fork().
+    """
+
     _client = None
     _db = None
-    
+    _pid = None
+    _lock = threading.Lock()
+    breaker = _new_breaker()
+
+    @classmethod
+    def _client_options(cls):
+        """Connection pool options from Config"""
+        from app.utils.metrics import MongoCommandListener
+        return {
+            'maxPoolSize': Config.MONGO_MAX_POOL_SIZE,
+            'minPoolSize': Config.MONGO_MIN_POOL_SIZE,
+            'maxIdleTimeMS': Config.MONGO_MAX_IDLE_TIME_MS,
+            'waitQueueTimeoutMS': Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            'serverSelectionTimeoutMS': Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            'connectTimeoutMS': Config.MONGO_CONNECT_TIMEOUT_MS,
+            'event_listeners': [
+                _TopologyBreakerListener(), _CommandBreakerListener(), MongoCommandListener()
+            ]
+        }
+
+    @classmethod
+    def _check_pid(cls):
+        """Drop a client inherited from a parent process"""
+        if cls._pid is not None and cls._pid != os.getpid():
+            # Do not close() it: the sockets belong to the parent process
+            cls._client = None
+            cls._db = None
+            cls._pid = None
+            cls._lock = threading.Lock()
+            cls.breaker = _new_breaker()
+
+    @classmethod
+    def is_available(cls):
+        """False while the circuit is open: callers should fail fast"""
+        cls._check_pid()
+        return cls.breaker.allow_request()
+
     @classmethod
     def get_client(cls):
-        """Get MongoDB client instance (singleton pattern)"""
+        """Get MongoDB client instance (one per process)"""
+        if not cls.is_available():
+            return None
         if cls._client is None:
-            try:
-                mongo_uri = os.getenv('MONGO_URI')
-                print(f"Attempting MongoDB connection with URI: {mongo_uri}")
-                cls._client = MongoClient(
-                    mongo_uri,
-                    serverSelectionTimeoutMS=10000,
-                    connectTimeoutMS=10000
-                )
-                # Test the connection
-                cls._client.admin.command('ping')
-                print("✓ Successfully connected to MongoDB")
-            except Exception as e:
-                print(f"✗ Failed to connect to MongoDB: {e}")
-                cls._client = None
+            with cls._lock:
+                if cls._client is None:
+                    try:
+                        mongo_uri = Config.MONGO_URI
+                        logger.info("Attempting MongoDB connection (pid %d)", os.getpid())
+                        client = MongoClient(mongo_uri, **cls._client_options())
+                        # Test the connection
+                        client.admin.command('ping')
+                        cls._client = client
+                        cls._pid = os.getpid()
+                        cls.breaker.record_success()
+                        logger.info("✓ Successfully connected to MongoDB")
+                    except Exception as e:
+                        logger.error("✗ Failed to connect to MongoDB: %s", e)
+                        cls._client = None
+                        # A failed connect already cost a full server
+                        # selection timeout; don't let the next request repeat it
+                        cls.breaker.trip(e)
         return cls._client
-    
+
     @classmethod
     def get_db(cls):
         """Get database instance"""
+        cls._check_pid()
         if cls._db is None:
             client = cls.get_client()
             if client is not None:
-                cls._db = client.bharathmedicare
-                print("✓ Database instance created: bharathmedicare")
+                cls._db = client[Config.MONGO_DB_NAME]
+                logger.info("✓ Database instance created: %s", Config.MONGO_DB_NAME)
         return cls._db
-    
+
     @classmethod
     def get_collection(cls, collection_name):
-        """Get a collection by name"""
+        """Get a collection by name (None while the circuit is open)"""
+        if not cls.is_available():
+            return None
         db = cls.get_db()
         if db is not None:
             return db[collection_name]
-        print(f"✗ Failed to get collection '{collection_name}' - database is None")
+        logger.error("✗ Failed to get collection '%s' - database is None", collection_name)
         return None
-    
+
+    @classmethod
+    def warm_up(cls):
+        """
+        Create this process's client and open its first pooled connection.
+        Call after fork (e.g. gunicorn post_fork); pymongo then keeps the
+        pool topped up to minPoolSize in the background.
+        """
+        client = cls.get_client()
+        if client is None:
+            return False
+        try:
+            client.admin.command('ping')
+            return True
+        except ConnectionFailure as e:
+            logger.error("✗ MongoDB warm-up failed: %s", e)
+            cls.breaker.trip(e)
+            return False
+
+    @classmethod
+    def record_error(cls, error):
+        """
+        Count a failed database call made on the request path (e.g. a
+        server selection timeout) towards the failure threshold
+        """
+        cls._check_pid()
+        if isinstance(error, ConnectionFailure):
+            cls.breaker.record_failure(error)
+
     @classmethod
     def close_connection(cls):
         """Close database connection"""
+        cls._check_pid()
         if cls._client is not None:
             cls._client.close()
             cls._client = None
             cls._db = None
-            print("✓ MongoDB connection closed")
+            cls._pid = None
+            logger.info("✓ MongoDB connection closed")
+
+def record_db_error(error):
+    """
+    Count an error caught by a request handler towards the circuit's
+    failure threshold if it means MongoDB could not be reached
+    (ServerSelectionTimeoutError, AutoReconnect, NetworkTimeout, ...)
+    """
+    Database.record_error(error)
 
-# Initialize database connection on module load
 def init_db():
     """Initialize database connection"""
     db = Database.get_db()
     if db is not None:
-        print("✓ Database initialized successfully")
+        logger.info("✓ Database initialized successfully")
         return True
     else:
-        print("✗ Database initialization failed")
+        logger.error("✗ Database initialization failed")
         return False
 
 # Getter functions for collections
@@ -76,29 +218,26 @@ def get_users_collection():
     """Get users collection"""
     collection = Database.get_collection('users')
     if collection is None:
-        print("ERROR: users_collection is None!")
+        logger.warning("users collection unavailable")
     return collection
 
 def get_records_collection():
     """Get records collection"""
     collection = Database.get_collection('records')
     if collection is None:
-        print("ERROR: records_collection is None!")
+        logger.warning("records collection unavailable")
     return collection
 
 def get_audit_logs_collection():
     """Get audit logs collection"""
     collection = Database.get_collection('audit_logs')
     if collection is None:
-        print("ERROR: audit_logs_collection is None!")
+        logger.warning("audit_logs collection unavailable")
     return collection
 
 def get_access_permissions_collection():
     """Get access permissions collection"""
     collection = Database.get_collection('access_permissions')
     if collection is None:
-        print("ERROR: access_permissions_collection is None!")
+        logger.warning("access_permissions collection unavailable")
     return collection
-
-# Try to initialize on import
-init_db()
@@ -1,22 +1,195 @@
-from .database import users_collection, records_collection, access_permissions_collection
+import logging
+import sys
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+def _ensure_index(collection, keys, **options):
+    """
+    Create an index, replacing an existing index on the same keys whose
+    options differ (e.g. a plain index that now needs to be unique)
+    """
+    options.setdefault('background', True)
+    key_list = list(keys)
+    replaced = None
+    for name, info in collection.index_information().items():
+        if name != '_id_' and list(info['key']) == key_list:
+            wanted = {k: v for k, v in options.items() if k not in ('background', 'name')}
+            current = {k: info.get(k) for k in wanted}
+            if current == wanted:
+                return name
+            # MongoDB allows one index per key pattern, so the old index
+            # has to go first; it is put back if the new one can't be built
+            logger.info("Replacing index %s.%s", collection.name, name)
+            collection.drop_index(name)
+            replaced = (name, info)
+            break
+    try:
+        name = collection.create_index(key_list, **options)
+    except OperationFailure:
+        if replaced is not None:
+            old_name, info = replaced
+            old_options = {k: v for k, v in info.items() if k not in ('v', 'key', 'ns')}
+            collection.create_index(key_list, name=old_name, **old_options)
+            logger.error("✗ Restored index %s.%s: its replacement could not be built", collection.name, old_name)
+        raise
+    logger.info("Index %s.%s", collection.name, name)
+    return name
+
+def _remove_duplicate_grants(db):
+    """
+    Keep only the newest grant of each patient/doctor pair, so the pair
+    can be indexed as unique (grants were never deduplicated before)
+    """
+    duplicates = db.access_permissions.aggregate([
+        {'$group': {
+            '_id': {'patient_id': '$patient_id', 'doctor_id': '$doctor_id'},
+            'keep': {'$max': '$_id'},
+            'ids': {'$push': '$_id'}
+        }},
+        {'$match': {'ids.1': {'$exists': True}}}
+    ], allowDiskUse=True)
+    removed = 0
+    for group in duplicates:
+        extra = [grant_id for grant_id in group['ids'] if grant_id != group['keep']]
+        db.access_permissions.delete_many({'_id': {'$in': extra}})
+        removed += len(extra)
+        logger.warning(
+            "Removed duplicate grants of patient %s to doctor %s, kept %s",
+            group['_id'].get('patient_id'), group['_id'].get('doctor_id'), group['keep'],
+            extra={'removed_ids': [str(grant_id) for grant_id in extra]}
+        )
+    return removed
+
+def _drop_index(collection, name):
+    try:
+        collection.drop_index(name)
+        logger.info("Dropped index %s.%s", collection.name, name)
+    except OperationFailure:
+        pass
+
+def _001_baseline(db):
+    """Single-field indexes the app has always relied on"""
+    _ensure_index(db.users, [('email', ASCENDING)], unique=True)
+    _ensure_index(db.users, [('role', ASCENDING)])
+    _ensure_index(db.records, [('uploaded_by', ASCENDING)])
+
+def _002_query_shapes(db):
+    """Compound and partial indexes matching the endpoints' queries and sorts"""
+    # /records/my-records and record counts: filter on patient + is_deleted,
+    # newest first, _id as the pagination tie-breaker
+    _ensure_index(db.records, [
+        ('patient_id', ASCENDING),
+        ('is_deleted', ASCENDING),
+        ('uploaded_at', DESCENDING),
+        ('_id', DESCENDING)
+    ])
+    # Admin stats: active records, recent uploads
+    _ensure_index(
+        db.records,
+        [('uploaded_at', DESCENDING)],
+        name='uploaded_at_active',
+        partialFilterExpression={'is_deleted': False}
+    )
+
+    # Audit trail per user, and the admin audit log listing
+    _ensure_index(db.audit_logs, [('user_id', ASCENDING), ('timestamp', DESCENDING)])
+    _ensure_index(db.audit_logs, [('timestamp', DESCENDING), ('_id', DESCENDING)])
+
+    # NMC UIDs are unique among doctors. Patients store nmc_uid: None, which
+    # a sparse index would still index, so only index string values
+    _ensure_index(
+        db.users,
+        [('nmc_uid', ASCENDING)],
+        unique=True,
+        partialFilterExpression={'nmc_uid': {'$type': 'string'}}
+    )
+    # Pending/verified doctor lists and stats, recent registrations
+    _ensure_index(db.users, [
+        ('role', ASCENDING),
+        ('is_verified', ASCENDING),
+        ('created_at', DESCENDING)
+    ])
+    _ensure_index(db.users, [('created_at', DESCENDING)])
+    # /patients/list pagination
+    _ensure_index(db.users, [('role', ASCENDING), ('_id', DESCENDING)])
+
+    # One grant per patient/doctor pair; doctor-side permission lookups
+    _remove_duplicate_grants(db)
+    _ensure_index(
+        db.access_permissions,
+        [('patient_id', ASCENDING), ('doctor_id', ASCENDING)],
+        unique=True
+    )
+    _ensure_index(db.access_permissions, [('doctor_id', ASCENDING)])
+
+    # Superseded by the compound records index
+    _drop_index(db.records, 'patient_id_1')
+    _drop_index(db.records, 'uploaded_at_1')
+
+# (version, description, function) - append only; never edit an applied migration
+MIGRATIONS = [
+    (1, 'baseline single-field indexes', _001_baseline),
+    (2, 'compound and partial indexes for query shapes', _002_query_shapes)
+]
+
+def _get_db():
+    db = Database.get_db()
+    if db is None:
+        raise ConnectionError('Database not connected')
+    return db
+
+def get_applied_versions(db=None):
+    """Versions already recorded in the schema_migrations collection"""
+    db = db if db is not None else _get_db()
+    return {doc['_id'] for doc in db.schema_migrations.find({}, {'_id': 1})}
+
+def migrate(db=None):
+    """Apply pending index migrations in order"""
+    db = db if db is not None else _get_db()
+    applied = get_applied_versions(db)
+
+    count = 0
+    for version, description, apply in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Applying migration %d: %s", version, description)
+        apply(db)
+        db.schema_migrations.insert_one({
+            '_id': version,
+            'description': description,
+            'applied_at': datetime.utcnow()
+        })
+        count += 1
+
+    if count:
+        logger.info("✓ %d migration(s) applied", count)
+    else:
+        logger.info("✓ Indexes are up to date")
+    return count
+
+def status(db=None):
+    """Print which migrations have been applied"""
+    db = db if db is not None else _get_db()
+    applied = get_applied_versions(db)
+    for version, description, _ in MIGRATIONS:
+        mark = '✓' if version in applied else ' '
+        print(f"[{mark}] {version:03d} {description}")
 
 def create_indexes():
     """Create database indexes for better performance"""
-    
-    # Users collection indexes
-    users_collection.create_index("email", unique=True)
-    users_collection.create_index("role")
-    
-    # Records collection indexes
-    records_collection.create_index("patient_id")
-    records_collection.create_index("uploaded_by")
-    records_collection.create_index("uploaded_at")
-    
-    # Access permissions collection indexes
-    access_permissions_collection.create_index([("patient_id", 1), ("doctor_id", 1)])
-    access_permissions_collection.create_index("is_active")
-    
-    print("✓ Database indexes created successfully")
+    return migrate()
 
 if __name__ == "__main__":
-    create_indexes()
+    from app.utils.log import configure_logging
+    configure_logging()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    if command == 'migrate':
+        migrate()
+    elif command == 'status':
+        status()
+    else:
+        print("Usage: python -m app.models.indexes [migrate|status]")
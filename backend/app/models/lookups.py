@@ -0,0 +1,44 @@
+from bson import ObjectId
+from .database import get_users_collection
+from .projections import get_projection
+
+def _as_object_id(value):
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+def attach_user_summaries(docs, id_field, target_field, users_collection=None):
+    """
+    Attach a {id, full_name, email} summary of the user referenced by
+    doc[id_field] to each doc as doc[target_field].
+
+    All users are fetched with one $in query, so the cost is a single
+    round trip however many documents there are. Documents whose user no
+    longer exists are left without target_field.
+    """
+    ids = {_as_object_id(doc[id_field]) for doc in docs if doc.get(id_field)}
+    if not ids:
+        return docs
+
+    if users_collection is None:
+        users_collection = get_users_collection()
+        if users_collection is None:
+            raise ConnectionError('Database not connected')
+
+    users = {
+        user['_id']: user
+        for user in users_collection.find(
+            {'_id': {'$in': list(ids)}},
+            get_projection('user-card')
+        )
+    }
+
+    for doc in docs:
+        if not doc.get(id_field):
+            continue
+        user = users.get(_as_object_id(doc[id_field]))
+        if user:
+            doc[target_field] = {
+                'id': str(user['_id']),
+                'full_name': user.get('full_name'),
+                'email': user.get('email')
+            }
+    return docs
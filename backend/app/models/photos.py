@@ -0,0 +1,219 @@
+import hashlib
+import io
+import logging
+import secrets
+import sys
+from datetime import datetime
+from bson import Binary, ObjectId
+from flask import url_for
+from .database import Database, get_users_collection
+
+logger = logging.getLogger(__name__)
+
+# Pillow is optional; without it only the original image is stored and
+# every size request is served the original
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+MAX_PHOTO_SIZE = 2 * 1024 * 1024
+ORIGINAL = 'original'
+# Longest edge in pixels for each generated size
+THUMBNAIL_SIZES = {
+    'thumb': 96,
+    'medium': 320
+}
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png'
+}
+
+class InvalidPhoto(ValueError):
+    """Raised when an upload is not a usable image"""
+    pass
+
+def get_photos_collection():
+    return Database.get_collection('profile_photos')
+
+def _variant(data, content_type):
+    return {
+        'data': Binary(data),
+        'content_type': content_type,
+        'etag': hashlib.sha256(data).hexdigest(),
+        'size': len(data)
+    }
+
+def _make_thumbnails(data, content_type):
+    """Resize the photo to each THUMBNAIL_SIZES entry (needs Pillow)"""
+    if Image is None:
+        return {}
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception:
+        raise InvalidPhoto('File is not a valid image')
+
+    image_format = 'PNG' if content_type == 'image/png' else 'JPEG'
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    variants = {}
+    for name, edge in THUMBNAIL_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge))
+        out = io.BytesIO()
+        resized.save(out, format=image_format, optimize=True)
+        variants[name] = _variant(out.getvalue(), content_type)
+    return variants
+
+def save_photo(user_id, data, file_ext):
+    """
+    Store a user's profile photo and its thumbnails, replacing any previous one
+
+    Returns:
+        str: The new photo version, saved on the user document as photo_version
+    """
+    content_type = CONTENT_TYPES.get(file_ext)
+    if content_type is None:
+        raise InvalidPhoto('Invalid file type. Only JPG, JPEG, PNG allowed')
+    if len(data) > MAX_PHOTO_SIZE:
+        raise InvalidPhoto('File too large. Maximum size is 2MB')
+
+    photos_collection = get_photos_collection()
+    if photos_collection is None:
+        raise ConnectionError('Database not connected')
+
+    variants = {ORIGINAL: _variant(data, content_type)}
+    variants.update(_make_thumbnails(data, content_type))
+
+    # The version doubles as the capability in the photo URL, so it must
+    # not be guessable: <img> tags cannot send the Authorization header
+    version = secrets.token_urlsafe(16)
+    photos_collection.replace_one(
+        {'_id': ObjectId(user_id)},
+        {
+            'version': version,
+            'variants': variants,
+            'updated_at': datetime.utcnow()
+        },
+        upsert=True
+    )
+    return version
+
+def delete_photo(user_id):
+    """Remove a user's stored photo"""
+    photos_collection = get_photos_collection()
+    if photos_collection is not None:
+        photos_collection.delete_one({'_id': ObjectId(user_id)})
+
+def get_photo_variant(user_id, version, size=None):
+    """
+    Fetch one size of a user's photo
+
+    Returns:
+        dict: data, content_type, etag - or None if the user has no photo
+              or the version is not the current one
+    """
+    photos_collection = get_photos_collection()
+    if photos_collection is None:
+        raise ConnectionError('Database not connected')
+
+    size = size if size in THUMBNAIL_SIZES else ORIGINAL
+    fields = {f'variants.{size}': 1}
+    if size != ORIGINAL:
+        fields[f'variants.{ORIGINAL}'] = 1
+
+    photo = photos_collection.find_one({'_id': ObjectId(user_id), 'version': version}, fields)
+    if not photo:
+        return None
+    variants = photo.get('variants', {})
+    return variants.get(size) or variants.get(ORIGINAL)
+
+def photo_url(user_id, version, size=None):
+    """
+    Path of a user's photo, for an <img> src resolved against the API base
+
+    Relative on purpose: behind the TLS-terminating proxy Flask sees plain
+    http, and an absolute URL would carry the wrong scheme and host.
+    """
+    params = {'user_id': str(user_id), 'v': version}
+    if size:
+        params['size'] = size
+    return url_for('users.get_user_photo', **params)
+
+def with_photo_url(user):
+    """
+    Replace the stored photo_version on a user document with the
+    profile_photo URL the frontend expects
+    """
+    version = user.pop('photo_version', None)
+    if version:
+        user['profile_photo'] = photo_url(user['_id'], version)
+    return user
+
+def migrate_inline_photos(batch_size=50):
+    """
+    Move base64 data URL photos stored on user documents into the
+    profile_photos collection. Safe to re-run.
+
+    A payload that cannot be decoded or stored is not dropped: it is moved
+    to profile_photo_invalid on the user document and the user id logged,
+    so it can be inspected or restored by hand.
+    """
+    import base64
+    import binascii
+
+    users_collection = get_users_collection()
+    if users_collection is None:
+        logger.error("✗ Migration aborted - database not connected")
+        return 0
+
+    migrated = 0
+    skipped = []
+    while True:
+        batch = list(users_collection.find(
+            {'profile_photo': {'$regex': '^data:image/'}},
+            {'profile_photo': 1}
+        ).limit(batch_size))
+
+        if not batch:
+            break
+
+        for user in batch:
+            header, _, encoded = user['profile_photo'].partition(',')
+            file_ext = header[len('data:image/'):].split(';', 1)[0]
+            try:
+                version = save_photo(user['_id'], base64.b64decode(encoded), file_ext)
+            except (InvalidPhoto, binascii.Error) as e:
+                logger.warning("✗ Kept unreadable photo for user %s in profile_photo_invalid: %s",
+                               user['_id'], e)
+                users_collection.update_one(
+                    {'_id': user['_id']},
+                    {'$rename': {'profile_photo': 'profile_photo_invalid'}}
+                )
+                skipped.append(user['_id'])
+                continue
+            users_collection.update_one(
+                {'_id': user['_id']},
+                {'$set': {'photo_version': version}, '$unset': {'profile_photo': ''}}
+            )
+            migrated += 1
+
+        logger.info("Migrated %d photos...", migrated)
+
+    logger.info("✓ Migrated %d profile photos", migrated)
+    if skipped:
+        logger.warning("✗ %d photos could not be migrated, kept in profile_photo_invalid: %s",
+                       len(skipped), ', '.join(str(user_id) for user_id in skipped))
+    return migrated
+
+if __name__ == "__main__":
+    from app.utils.log import configure_logging
+    configure_logging()
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        migrate_inline_photos()
+    else:
+        print("Usage: python -m app.models.photos migrate")
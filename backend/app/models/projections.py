@@ -0,0 +1,68 @@
+"""
+Named query projections
+
+Every blueprint query passes one of these shapes so that fields an
+endpoint does not use (password hashes, profile photos, encrypted file
+data) never leave MongoDB.
+"""
+
+# Fields check_profile_completion() looks at for patients
+PROFILE_COMPLETION_FIELDS = [
+    'full_name',
+    'phone',
+    'gender',
+    'date_of_birth',
+    'address',
+    'blood_group',
+    'emergency_contact_name',
+    'emergency_contact',
+    'emergency_contact_relation',
+    'allergies',
+    'chronic_conditions'
+]
+
+def _include(*fields):
+    return {field: 1 for field in fields}
+
+PROJECTIONS = {
+    'id-only': _include('_id'),
+
+    # Users
+    'user-card': _include('full_name', 'email'),
+    'user-list': _include(
+        'email', 'full_name', 'role', 'phone', 'nmc_uid', 'is_active',
+        'is_verified', 'is_profile_complete', 'created_at'
+    ),
+    'user-auth': _include(
+        'email', 'password_hash', 'role', 'is_active', 'is_verified',
+        'is_profile_complete', *PROFILE_COMPLETION_FIELDS
+    ),
+    'user-completion': _include('role', 'is_profile_complete', *PROFILE_COMPLETION_FIELDS),
+    'user-health-card': _include(
+        'role', 'full_name', 'email', 'phone', 'blood_group', 'date_of_birth',
+        'address', 'emergency_contact', 'created_at'
+    ),
+    'user-status': _include('role', 'is_active', 'is_verified', 'created_at'),
+    'user-full': {'password_hash': 0, 'profile_photo_invalid': 0, 'records_revision': 0},
+
+    # Records
+    'record-summary': _include(
+        'patient_id', 'uploaded_by', 'file_name', 'file_type', 'file_size',
+        'description', 'uploaded_at'
+    ),
+    'record-owner': _include('patient_id', 'is_deleted', 'uploaded_at'),
+    'record-download': _include(
+        'patient_id', 'file_name', 'file_type', 'file_size', 'blob_ref',
+        'encryption_metadata', 'encrypted_data'
+    ),
+
+    # Access permissions
+    'access-list': _include('patient_id', 'doctor_id', 'permission_level', 'granted_at')
+}
+
+def get_projection(name):
+    """Get a named projection for find()/find_one()"""
+    try:
+        return PROJECTIONS[name]
+    except KeyError:
+        raise KeyError(f"Unknown projection: {name}")
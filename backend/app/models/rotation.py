@@ -0,0 +1,200 @@
+"""
+Record re-encryption onto the primary key
+
+After a new key is put first in ENCRYPTION_KEYS, records encrypted with
+older keys still decrypt (the key ring keeps every listed key), and this
+job moves them onto the primary key a few records at a time:
+
+    python -m app.models.rotation status
+    python -m app.models.rotation run [records_per_second]
+
+Each record is decrypted and re-encrypted as a stream into a new blob,
+then the record is pointed at it only if its blob_ref is unchanged, so
+the job can run alongside the API and be stopped and restarted at any
+point. The old blob is not deleted straight away, since a download may
+still be streaming it: it is queued and removed once BLOB_DELETE_GRACE
+seconds have passed, by a later batch or run of this job or by
+python -m app.models.blob_store purge. The rate limit
+(KEY_ROTATION_RATE) keeps its database, blob store and CPU load small.
+Once status shows nothing left on an old key, that key can be removed
+from ENCRYPTION_KEYS. Records still stored inline need
+python -m app.models.blob_store migrate first.
+"""
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from config.settings import Config
+from app.utils.encryption import (
+    get_key_ring, decrypt_file_data, encrypt_stream, decrypt_stream, STREAM_METHOD
+)
+from .blob_store import (
+    get_blob_store, get_blob, open_blob_stream, delete_blob_later, purge_deleted_blobs
+)
+from .database import Database, get_records_collection
+
+logger = logging.getLogger(__name__)
+
+def stale_records_query(primary_id):
+    """Records in the blob store not yet encrypted with the primary key"""
+    return {
+        'blob_ref': {'$exists': True},
+        'encryption_metadata.key_id': {'$ne': primary_id}
+    }
+
+def key_usage():
+    """Number of records per key id (None: written before key ids were stored)"""
+    records_collection = get_records_collection()
+    if records_collection is None:
+        raise ConnectionError('Database not connected')
+    return {
+        row['_id']: row['count'] for row in records_collection.aggregate([
+            {'$group': {'_id': '$encryption_metadata.key_id', 'count': {'$sum': 1}}}
+        ])
+    }
+
+def _plaintext_chunks(record, chunk_size):
+    metadata = record.get('encryption_metadata') or {}
+    key_id = metadata.get('key_id')
+    if metadata.get('method') == STREAM_METHOD:
+        return decrypt_stream(open_blob_stream(record['blob_ref'], chunk_size), key_id)
+    return iter([decrypt_file_data(get_blob(record['blob_ref']), key_id)])
+
+def reencrypt_record(records_collection, record, store=None):
+    """
+    Move one record onto the primary key
+    Returns False if the record changed underneath (nothing is modified)
+    """
+    store = store or get_blob_store()
+    chunk_size = Config.ENCRYPTION_CHUNK_SIZE
+    key_id = get_key_ring().primary_id
+
+    blob_ref = store.put_stream(encrypt_stream(
+        _plaintext_chunks(record, chunk_size), chunk_size=chunk_size, key_id=key_id
+    ))
+    result = records_collection.update_one(
+        {'_id': record['_id'], 'blob_ref': record['blob_ref']},
+        {'$set': {
+            'blob_ref': blob_ref,
+            'encryption_metadata': {
+                'method': STREAM_METHOD,
+                'chunk_size': chunk_size,
+                'key_id': key_id,
+                'rotated_at': datetime.utcnow()
+            }
+        }}
+    )
+    if not result.modified_count:
+        store.delete(blob_ref)
+        return False
+    try:
+        delete_blob_later(record['blob_ref'])
+    except Exception as e:
+        # The record is rotated; at worst the old blob is left behind
+        logger.warning("Old blob of record %s not queued for deletion: %s", record['_id'], e)
+    return True
+
+class KeyRotationJob:
+    """
+    Re-encrypt records onto the primary key at a limited rate
+
+    run() works through the stale records in batches and returns once
+    none are left or stop() is called. start() runs it on a daemon thread.
+    """
+
+    def __init__(self, rate=None, batch_size=None):
+        self.rate = rate or Config.KEY_ROTATION_RATE
+        self.batch_size = batch_size or Config.KEY_ROTATION_BATCH_SIZE
+        self._stop = threading.Event()
+        self._thread = None
+        self.counters = {'rotated': 0, 'skipped': 0, 'failed': 0}
+
+    def stop(self):
+        self._stop.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='key-rotation', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _purge(self):
+        # Blobs replaced by earlier batches or runs, once past the grace period
+        try:
+            purge_deleted_blobs()
+        except Exception as e:
+            logger.warning("Purging replaced blobs failed: %s", e)
+
+    def _wait_for_database(self):
+        while not Database.is_available() and not self._stop.is_set():
+            self._stop.wait(max(Database.breaker.retry_after(), 1.0))
+
+    def run(self):
+        primary_id = get_key_ring().primary_id
+        interval = 1.0 / self.rate if self.rate > 0 else 0
+        failed_ids = []
+        logger.info("Re-encrypting records onto key '%s' at %.1f records/s", primary_id, self.rate)
+
+        while not self._stop.is_set():
+            self._wait_for_database()
+            records_collection = get_records_collection()
+            if records_collection is None:
+                self._stop.wait(1.0)
+                continue
+            self._purge()
+            query = stale_records_query(primary_id)
+            if failed_ids:
+                query['_id'] = {'$nin': failed_ids}
+            batch = list(records_collection.find(
+                query, {'blob_ref': 1, 'encryption_metadata': 1}
+            ).limit(self.batch_size))
+            if not batch:
+                break
+
+            for record in batch:
+                if self._stop.is_set():
+                    break
+                started = time.monotonic()
+                try:
+                    if reencrypt_record(records_collection, record):
+                        self.counters['rotated'] += 1
+                    else:
+                        self.counters['skipped'] += 1
+                except Exception as e:
+                    # Left on its old key; reported and not retried this run
+                    logger.error("✗ Re-encryption failed for record %s: %s", record['_id'], e)
+                    self.counters['failed'] += 1
+                    failed_ids.append(record['_id'])
+                self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+            logger.info("Re-encryption progress", extra=dict(self.counters))
+
+        logger.info("✓ Re-encryption finished", extra=dict(self.counters))
+        return dict(self.counters)
+
+def status():
+    """Print the number of records on each key"""
+    key_ring = get_key_ring()
+    for key_id, count in sorted(key_usage().items(), key=lambda item: str(item[0])):
+        if key_id == key_ring.primary_id:
+            label = 'primary'
+        elif key_id is None or key_id in key_ring.key_ids:
+            label = 'to rotate'
+        else:
+            label = 'unknown key'
+        print(f"{str(key_id):>20} {count:>8}  {label}")
+
+if __name__ == "__main__":
+    from app.utils.log import configure_logging
+    configure_logging()
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'status':
+        status()
+    elif command == 'run':
+        job = KeyRotationJob(rate=float(sys.argv[2]) if len(sys.argv) > 2 else None)
+        try:
+            job.run()
+        except KeyboardInterrupt:
+            job.stop()
+    else:
+        print("Usage: python -m app.models.rotation [status|run [records_per_second]]")
@@ -19,7 +19,7 @@ class UserSchema:
             'full_name': full_name,
             'phone': phone,
             'nmc_uid': nmc_uid,
-            'profile_photo': None,
+            'photo_version': None,
             'gender': None,
             'date_of_birth': None,
             'blood_group': None,
@@ -57,15 +57,19 @@ class RecordSchema:
     """Medical record document schema"""
     
     @staticmethod
-    def create(patient_id, uploaded_by, file_name, file_type, encrypted_data, 
-               encryption_metadata, description=''):
-        """Create a new record document"""
+    def create(patient_id, uploaded_by, file_name, file_type, blob_ref, 
+               encryption_metadata, description='', file_size=None):
+        """
+        Create a new record document
+        The encrypted file lives in the blob store; blob_ref points to it
+        """
         return {
             'patient_id': ObjectId(patient_id),
             'uploaded_by': ObjectId(uploaded_by),
             'file_name': file_name,
             'file_type': file_type,
-            'encrypted_data': encrypted_data,
+            'file_size': file_size,
+            'blob_ref': blob_ref,
             'encryption_metadata': encryption_metadata,
             'description': description,
             'uploaded_at': datetime.utcnow(),
@@ -0,0 +1,218 @@
+import logging
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from config.settings import Config
+from .database import Database, get_users_collection, get_records_collection
+
+logger = logging.getLogger(__name__)
+
+RECENT_DAYS = 7
+TOTALS_ID = 'totals'
+
+_cache = {'value': None, 'expires_at': 0}
+_cache_lock = threading.Lock()
+
+def _get_counters_collection():
+    return Database.get_collection('stats_counters')
+
+def _day_id(when):
+    return f"daily:{when.strftime('%Y-%m-%d')}"
+
+def _facet_count(result, name):
+    rows = result.get(name) or []
+    return rows[0]['n'] if rows else 0
+
+def _count_stage(match=None):
+    stages = [{'$match': match}] if match else []
+    return stages + [{'$count': 'n'}]
+
+def compute_stats():
+    """Compute statistics with one $facet aggregation per collection"""
+    users_collection = get_users_collection()
+    records_collection = get_records_collection()
+    if users_collection is None or records_collection is None:
+        raise ConnectionError('Database not connected')
+
+    since = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+
+    users = next(users_collection.aggregate([{'$facet': {
+        'total': _count_stage(),
+        'active': _count_stage({'is_active': {'$ne': False}}),
+        'patients': _count_stage({'role': 'patient'}),
+        'doctors': _count_stage({'role': 'doctor', 'is_verified': True}),
+        'pending_doctors': _count_stage({'role': 'doctor', 'is_verified': False}),
+        'recent': _count_stage({'created_at': {'$gte': since}})
+    }}]), {})
+
+    records = next(records_collection.aggregate([
+        {'$match': {'is_deleted': False}},
+        {'$facet': {
+            'active': _count_stage(),
+            'recent': _count_stage({'uploaded_at': {'$gte': since}})
+        }}
+    ]), {})
+
+    return {
+        'users': {
+            'total': _facet_count(users, 'total'),
+            'active': _facet_count(users, 'active'),
+            'patients': _facet_count(users, 'patients'),
+            'doctors': _facet_count(users, 'doctors'),
+            'pending_doctors': _facet_count(users, 'pending_doctors')
+        },
+        'records': {
+            'active': _facet_count(records, 'active')
+        },
+        'recent_activity': {
+            'uploads_last_7_days': _facet_count(records, 'recent'),
+            'registrations_last_7_days': _facet_count(users, 'recent')
+        }
+    }
+
+def _read_counters():
+    """
+    Read stats from the materialized counters: the totals document plus
+    one document per day for the recent window (today and the 6 days before)
+    """
+    counters_collection = _get_counters_collection()
+    if counters_collection is None:
+        raise ConnectionError('Database not connected')
+
+    totals = counters_collection.find_one({'_id': TOTALS_ID})
+    if totals is None:
+        return rebuild_counters()
+
+    today = datetime.utcnow()
+    day_ids = [_day_id(today - timedelta(days=i)) for i in range(RECENT_DAYS)]
+    uploads = registrations = 0
+    for day in counters_collection.find({'_id': {'$in': day_ids}}):
+        uploads += day.get('uploads', 0)
+        registrations += day.get('registrations', 0)
+
+    return {
+        'users': {
+            'total': totals.get('users_total', 0),
+            'active': totals.get('users_active', 0),
+            'patients': totals.get('patients', 0),
+            'doctors': totals.get('doctors', 0),
+            'pending_doctors': totals.get('pending_doctors', 0)
+        },
+        'records': {
+            'active': totals.get('records_active', 0)
+        },
+        'recent_activity': {
+            'uploads_last_7_days': uploads,
+            'registrations_last_7_days': registrations
+        }
+    }
+
+def get_stats():
+    """
+    Get system statistics, cached for STATS_CACHE_TTL seconds
+    Reads materialized counters when STATS_COUNTERS_ENABLED is set
+    """
+    now = time.monotonic()
+    if _cache['value'] is not None and now < _cache['expires_at']:
+        return _cache['value']
+
+    with _cache_lock:
+        if _cache['value'] is not None and time.monotonic() < _cache['expires_at']:
+            return _cache['value']
+        value = _read_counters() if Config.STATS_COUNTERS_ENABLED else compute_stats()
+        _cache['value'] = value
+        _cache['expires_at'] = time.monotonic() + Config.STATS_CACHE_TTL
+        return value
+
+def update_counters(totals=None, day=None, **daily):
+    """
+    Apply incremental changes to the materialized counters
+
+    Args:
+        totals: dict - Deltas for the totals document, e.g. {'patients': 1}
+        day: datetime - Which day's bucket the daily deltas belong to
+        daily: Deltas for that day, e.g. uploads=1
+    """
+    if not Config.STATS_COUNTERS_ENABLED:
+        return
+    try:
+        counters_collection = _get_counters_collection()
+        if counters_collection is None:
+            return
+        if totals:
+            counters_collection.update_one(
+                {'_id': TOTALS_ID}, {'$inc': totals}, upsert=True
+            )
+        if daily:
+            day = day or datetime.utcnow()
+            counters_collection.update_one(
+                {'_id': _day_id(day)}, {'$inc': daily}, upsert=True
+            )
+    except Exception as e:
+        # Counters can be rebuilt; never fail the request over them
+        logger.warning("Stats counter update error: %s", e)
+
+def user_counter_deltas(user, sign=1):
+    """Totals deltas for adding (sign=1) or removing (sign=-1) a user"""
+    deltas = {'users_total': sign}
+    if user.get('is_active', True):
+        deltas['users_active'] = sign
+    if user.get('role') == 'patient':
+        deltas['patients'] = sign
+    elif user.get('role') == 'doctor':
+        deltas['doctors' if user.get('is_verified') else 'pending_doctors'] = sign
+    return deltas
+
+def rebuild_counters():
+    """Recompute the counters documents from the users and records collections"""
+    counters_collection = _get_counters_collection()
+    users_collection = get_users_collection()
+    records_collection = get_records_collection()
+    if counters_collection is None or users_collection is None or records_collection is None:
+        raise ConnectionError('Database not connected')
+
+    stats = compute_stats()
+    counters_collection.replace_one({'_id': TOTALS_ID}, {
+        'users_total': stats['users']['total'],
+        'users_active': stats['users']['active'],
+        'patients': stats['users']['patients'],
+        'doctors': stats['users']['doctors'],
+        'pending_doctors': stats['users']['pending_doctors'],
+        'records_active': stats['records']['active'],
+        'rebuilt_at': datetime.utcnow()
+    }, upsert=True)
+
+    # Daily buckets for the recent window
+    start = (datetime.utcnow() - timedelta(days=RECENT_DAYS)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    buckets = {}
+    for collection, date_field, name, match in (
+        (records_collection, 'uploaded_at', 'uploads', {'is_deleted': False}),
+        (users_collection, 'created_at', 'registrations', {})
+    ):
+        group_key = {'$dateToString': {'format': '%Y-%m-%d', 'date': f'${date_field}'}}
+        for row in collection.aggregate([
+            {'$match': {**match, date_field: {'$gte': start}}},
+            {'$group': {'_id': group_key, 'n': {'$sum': 1}}}
+        ]):
+            buckets.setdefault(f"daily:{row['_id']}", {})[name] = row['n']
+
+    for day_id, values in buckets.items():
+        counters_collection.replace_one(
+            {'_id': day_id},
+            {'uploads': values.get('uploads', 0), 'registrations': values.get('registrations', 0)},
+            upsert=True
+        )
+
+    logger.info("✓ Stats counters rebuilt")
+    return _read_counters()
+
+if __name__ == "__main__":
+    from app.utils.log import configure_logging
+    configure_logging()
+    if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+        rebuild_counters()
+    else:
+        print("Usage: python -m app.models.stats rebuild")
@@ -0,0 +1,199 @@
+"""
+Startup readiness phase and readiness probes
+
+Importing the app and calling create_app() does no network I/O. The
+slow first-use work (connecting to MongoDB, calibrating bcrypt where
+the gunicorn master has not already, checking the encryption key)
+happens here instead, after the process has started - in gunicorn's
+post_fork or before the dev server runs - and its outcome is kept for
+health checks.
+
+Once that phase has finished, check_ready() answers /api/health/ready
+from PROBES. Their results are cached for HEALTH_CACHE_TTL seconds and
+only one thread probes at a time, so load balancers polling every
+worker don't add a database round trip per health check.
+"""
+import logging
+import threading
+import time
+import pymongo
+from pymongo.errors import ConnectionFailure
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    'ready': False,
+    'started_at': None,
+    'finished_at': None,
+    'checks': {}
+}
+_lock = threading.Lock()
+_thread = None
+
+def _check_mongodb():
+    from app.models.database import Database
+    if not Database.warm_up():
+        raise ConnectionError('MongoDB not reachable')
+
+def _check_bcrypt():
+    from app.utils.password import get_bcrypt_rounds
+    return {'rounds': get_bcrypt_rounds()}
+
+def _check_encryption():
+    from app.utils.encryption import get_key_ring
+    key_ring = get_key_ring()
+    return {'primary_key_id': key_ring.primary_id, 'keys': len(key_ring.key_ids)}
+
+# (name, check) - a check raises on failure and may return details
+CHECKS = [
+    ('encryption', _check_encryption),
+    ('mongodb', _check_mongodb),
+    ('bcrypt', _check_bcrypt)
+]
+
+def prepare():
+    """Run every startup check once and record the results"""
+    with _lock:
+        _state['started_at'] = time.time()
+
+    results = {}
+    for name, check in CHECKS:
+        start = time.perf_counter()
+        try:
+            details = check() or {}
+            results[name] = {'ok': True, **details}
+        except Exception as e:
+            logger.error("✗ Startup check '%s' failed: %s", name, e)
+            results[name] = {'ok': False, 'error': str(e)}
+        results[name]['ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    with _lock:
+        _state['checks'] = results
+        _state['ready'] = all(result['ok'] for result in results.values())
+        _state['finished_at'] = time.time()
+
+    if _state['ready']:
+        logger.info("✓ Startup checks passed", extra={'checks': results})
+    return get_readiness()
+
+def start_readiness(background=True):
+    """
+    Start the readiness phase
+    In the background by default, so the process can accept traffic
+    (e.g. liveness probes) while MongoDB and bcrypt warm up
+    """
+    global _thread
+    if not background:
+        return prepare()
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return None
+        _thread = threading.Thread(target=prepare, name='readiness', daemon=True)
+        _thread.start()
+    return None
+
+def get_readiness():
+    """Snapshot of the readiness phase's outcome"""
+    with _lock:
+        return {
+            'ready': _state['ready'],
+            'started_at': _state['started_at'],
+            'finished_at': _state['finished_at'],
+            'checks': {name: dict(result) for name, result in _state['checks'].items()}
+        }
+
+def _probe_mongodb():
+    from app.models.database import Database
+    if not Database.is_available():
+        raise ConnectionError(f"circuit open: {Database.breaker.snapshot()['last_error']}")
+    client = Database.get_client()
+    if client is None:
+        raise ConnectionError('MongoDB not reachable')
+    start = time.perf_counter()
+    try:
+        with pymongo.timeout(Config.HEALTH_PROBE_TIMEOUT_MS / 1000):
+            client.admin.command('ping')
+    except ConnectionFailure as e:
+        Database.breaker.record_failure(e)
+        raise
+    return {'ping_ms': round((time.perf_counter() - start) * 1000, 1)}
+
+def _probe_audit_queue():
+    from app.utils.audit_writer import get_audit_writer
+    stats = get_audit_writer().metrics()
+    depth, capacity = stats['queue_depth'], stats['queue_capacity']
+    limit = int(capacity * Config.HEALTH_AUDIT_QUEUE_MAX)
+    if depth > limit:
+        raise RuntimeError(f'audit queue at {depth}/{capacity} (limit {limit})')
+    return {'depth': depth, 'capacity': capacity}
+
+# (name, probe) - like CHECKS, a probe raises on failure and may return details
+PROBES = [
+    ('mongodb', _probe_mongodb),
+    ('encryption', _check_encryption),
+    ('audit_queue', _probe_audit_queue)
+]
+
+_probe_cache = {
+    'checked_at': None,
+    'checked_monotonic': None,
+    'ready': False,
+    'checks': {}
+}
+_probe_lock = threading.Lock()
+
+def _run_probes():
+    results = {}
+    for name, probe in PROBES:
+        try:
+            details = probe() or {}
+            results[name] = {'ok': True, **details}
+        except Exception as e:
+            results[name] = {'ok': False, 'error': str(e)}
+    return results
+
+def check_ready(max_age=None):
+    """
+    Whether this worker should receive traffic
+    Not ready until the startup phase has finished (it is started here if
+    nothing else has), then ready while every probe passes. Probe results
+    are reused for max_age seconds (HEALTH_CACHE_TTL).
+    """
+    max_age = Config.HEALTH_CACHE_TTL if max_age is None else max_age
+    startup = get_readiness()
+    if startup['finished_at'] is None:
+        if startup['started_at'] is None:
+            start_readiness()
+        return {'ready': False, 'reason': 'starting', 'checks': {}, 'checked_at': None, 'cached': False}
+
+    def cached(now):
+        checked = _probe_cache['checked_monotonic']
+        return checked is not None and now - checked < max_age
+
+    cached_result = True
+    if not cached(time.monotonic()):
+        # One probe at a time; callers that waited reuse its result
+        with _probe_lock:
+            if not cached(time.monotonic()):
+                checks = _run_probes()
+                ready = all(check['ok'] for check in checks.values())
+                if ready != _probe_cache['ready']:
+                    log = logger.info if ready else logger.error
+                    log("%s Readiness changed: %s", '✓' if ready else '✗',
+                        'ready' if ready else 'not ready', extra={'checks': checks})
+                _probe_cache.update({
+                    'checked_at': time.time(),
+                    'checked_monotonic': time.monotonic(),
+                    'ready': ready,
+                    'checks': checks
+                })
+                cached_result = False
+
+    with _probe_lock:
+        return {
+            'ready': _probe_cache['ready'],
+            'checks': {name: dict(check) for name, check in _probe_cache['checks'].items()},
+            'checked_at': _probe_cache['checked_at'],
+            'cached': cached_result
+        }
@@ -1,16 +1,26 @@
-from .auth import create_token, decode_token, require_auth, require_role
-from .password import hash_password, verify_password, is_strong_password
+from .auth import (
+    create_token, decode_token, authenticate_token, invalidate_user_tokens,
+    restore_user_tokens, require_auth, require_role
+)
+from .password import (
+    hash_password, verify_password, is_strong_password, needs_rehash, PasswordHasherBusy
+)
 from .encryption import encrypt_file_data, decrypt_file_data
 from .audit import log_action, get_user_activity
 
 __all__ = [
     'create_token',
     'decode_token',
+    'authenticate_token',
+    'invalidate_user_tokens',
+    'restore_user_tokens',
     'require_auth',
     'require_role',
     'hash_password',
     'verify_password',
     'is_strong_password',
+    'needs_rehash',
+    'PasswordHasherBusy',
     'encrypt_file_data',
     'decrypt_file_data',
     'log_action',
@@ -1,18 +1,23 @@
+import logging
 from datetime import datetime
+from bson import ObjectId
 from app.models.database import get_audit_logs_collection
 from app.models.schemas import AuditLogSchema
+from app.utils.audit_writer import get_audit_writer
+from app.utils.metrics import AUDIT_INLINE_WRITES
+from config.settings import Config
 from flask import request
 
+logger = logging.getLogger(__name__)
+
 def log_action(user_id, action, resource_type, resource_id=None, details=None):
     """
     Log user action for audit trail
+    
+    The entry is handed to the background audit writer, which batches
+    inserts off the request path. Set AUDIT_ASYNC=False to write inline.
     """
     try:
-        audit_logs_collection = get_audit_logs_collection()
-        if audit_logs_collection is None:
-            print("Warning: Could not log action - database not connected")
-            return None
-        
         # Get IP address from request
         ip_address = request.remote_addr if request else None
         
@@ -26,13 +31,28 @@ def log_action(user_id, action, resource_type, resource_id=None, details=None):
             details=details
         )
         
+        log_entry['_id'] = ObjectId()
+        
+        if Config.AUDIT_ASYNC:
+            get_audit_writer().submit(log_entry)
+            return log_entry['_id']
+        
+        audit_logs_collection = get_audit_logs_collection()
+        if audit_logs_collection is None:
+            logger.warning("Could not log action - database not connected")
+            AUDIT_INLINE_WRITES.inc(outcome='failure')
+            return None
+        
         # Insert into database
         result = audit_logs_collection.insert_one(log_entry)
+        AUDIT_INLINE_WRITES.inc(outcome='success')
         
         return result.inserted_id
     
     except Exception as e:
-        print(f"Audit logging error: {e}")
+        logger.exception("Audit logging error")
+        if not Config.AUDIT_ASYNC:
+            AUDIT_INLINE_WRITES.inc(outcome='failure')
         return None
 
 def get_user_activity(user_id, limit=50):
@@ -49,5 +69,5 @@ def get_user_activity(user_id, limit=50):
         return list(logs)
     
     except Exception as e:
-        print(f"Error fetching user activity: {e}")
+        logger.exception("Error fetching user activity")
         return []
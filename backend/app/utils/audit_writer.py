@@ -0,0 +1,292 @@
+import glob
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from bson import json_util
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+class AuditWriter:
+    """
+    Background writer for audit log entries
+
+    Entries are put on a bounded in-process queue and written with
+    insert_many once batch_size entries are waiting or flush_interval
+    seconds have passed. When the queue is full the backpressure policy
+    decides what happens to new entries:
+
+    block - wait up to block_timeout for room, then drop
+    drop  - drop the entry and count it
+    spill - append the entry to a local JSON-lines file
+
+    Batches that fail to insert are always spilled, and spilled entries
+    are replayed into Mongo once writes succeed again.
+
+    Each process spills to its own file, <spill_path>.<pid>, so workers
+    never append to a file another one is replaying. A replay first
+    renames the file to <spill_path>.<pid>.<n>.replaying, streams it in
+    batches and deletes it only once every entry is written. Files left
+    by processes that have exited are claimed the same way.
+    """
+
+    POLICIES = ('block', 'drop', 'spill')
+    # Seconds between scans for spill files of exited processes
+    ORPHAN_SCAN_INTERVAL = 60
+
+    def __init__(self, collection_getter, batch_size=100, flush_interval=1.0,
+                 max_queue=10000, backpressure='block', block_timeout=0.5,
+                 spill_path='audit_spill.jsonl'):
+        if backpressure not in self.POLICIES:
+            raise ValueError(f"Invalid audit backpressure policy: {backpressure}")
+
+        self.collection_getter = collection_getter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+        self._counters = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'batches': 0,
+            'failed_batches': 0
+        }
+        self._last_flush_at = None
+        self._claimed = []
+        self._claim_seq = itertools.count()
+        self._orphans_scanned_at = 0
+
+    def _ensure_started(self):
+        """Start the writer thread in this process (again after fork)"""
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(
+                        target=self._run, name='audit-writer', daemon=True
+                    )
+                    self._thread.start()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def submit(self, entry):
+        """Queue an entry for writing; returns False if it was dropped"""
+        self._ensure_started()
+        try:
+            if self.backpressure == 'block':
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            if self.backpressure == 'spill':
+                self._spill([entry])
+            else:
+                self._count('dropped')
+                return False
+        else:
+            self._count('enqueued')
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+        # Drain whatever is left on shutdown
+        while True:
+            batch = self._take_batch(wait=False)
+            if not batch:
+                break
+            self._write(batch)
+
+    def _take_batch(self, wait=True):
+        """Collect up to batch_size entries, waiting at most flush_interval"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if wait and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        collection = self.collection_getter()
+        try:
+            if collection is None:
+                raise ConnectionError('database not connected')
+            collection.insert_many(batch, ordered=False)
+        except Exception as e:
+            logger.error("Audit batch write failed, spilling entries: %s", e, extra={'entries': len(batch)})
+            self._count('failed_batches')
+            self._spill(batch)
+            return
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+        self._count('written', len(batch))
+        self._count('batches')
+        self._last_flush_at = time.time()
+        self._replay_spill(collection)
+
+    def _own_spill_path(self):
+        return f'{self.spill_path}.{os.getpid()}'
+
+    def _spill(self, entries):
+        """Append entries to this process's spill file"""
+        try:
+            with self._spill_lock:
+                with open(self._own_spill_path(), 'a', encoding='utf-8') as f:
+                    for entry in entries:
+                        f.write(json_util.dumps(entry) + '\n')
+            self._count('spilled', len(entries))
+        except Exception as e:
+            logger.error("Audit spill failed, dropping entries: %s", e, extra={'entries': len(entries)})
+            self._count('dropped', len(entries))
+
+    def _claim(self, path):
+        """Atomically rename a spill file to a name only this process replays"""
+        claimed = f'{self.spill_path}.{os.getpid()}.{next(self._claim_seq)}.replaying'
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            # Nothing spilled, or another process claimed it first
+            return
+        self._claimed.append(claimed)
+
+    @staticmethod
+    def _pid_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _claim_orphans(self):
+        """Claim spill files left by processes that have exited"""
+        self._orphans_scanned_at = time.monotonic()
+        # The un-suffixed path is where older versions spilled
+        candidates = [self.spill_path]
+        for path in glob.glob(glob.escape(self.spill_path) + '.*'):
+            owner = path[len(self.spill_path) + 1:].split('.', 1)[0]
+            if owner.isdigit() and int(owner) != os.getpid() and not self._pid_alive(int(owner)):
+                candidates.append(path)
+        for path in candidates:
+            if os.path.isfile(path):
+                self._claim(path)
+
+    def _replay_file(self, collection, path):
+        """Insert a claimed spill file in batches; returns the entries written"""
+        replayed = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = (line for line in f if line.strip())
+            while True:
+                entries = [json_util.loads(line) for line in itertools.islice(lines, self.batch_size)]
+                if not entries:
+                    break
+                try:
+                    collection.insert_many(entries, ordered=False)
+                except Exception as e:
+                    # Entries already written before a failure are
+                    # rejected as duplicate _ids on the next replay
+                    if 'duplicate key' not in str(e).lower():
+                        raise
+                replayed += len(entries)
+        os.remove(path)
+        return replayed
+
+    def _replay_spill(self, collection):
+        """Move spilled entries back into Mongo after a successful write"""
+        with self._spill_lock:
+            self._claim(self._own_spill_path())
+        if time.monotonic() - self._orphans_scanned_at >= self.ORPHAN_SCAN_INTERVAL:
+            self._claim_orphans()
+
+        while self._claimed:
+            path = self._claimed[0]
+            try:
+                replayed = self._replay_file(collection, path)
+            except Exception as e:
+                # The file stays claimed and is retried after the next write
+                logger.warning("Audit spill replay failed: %s", e, extra={'path': path})
+                return
+            self._claimed.pop(0)
+            self._count('replayed', replayed)
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been written"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self._queue.unfinished_tasks == 0
+
+    def shutdown(self, timeout=5.0):
+        """Stop the writer thread after draining the queue"""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def metrics(self):
+        """Counters and queue state"""
+        with self._lock:
+            counters = dict(self._counters)
+        counters.update({
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self.max_queue,
+            'backpressure': self.backpressure,
+            'last_flush_at': self._last_flush_at
+        })
+        return counters
+
+_writer = None
+
+def get_audit_writer():
+    """Get the process-wide audit writer"""
+    global _writer
+    if _writer is None:
+        from app.models.database import get_audit_logs_collection
+        _writer = AuditWriter(
+            get_audit_logs_collection,
+            batch_size=Config.AUDIT_BATCH_SIZE,
+            flush_interval=Config.AUDIT_FLUSH_INTERVAL,
+            max_queue=Config.AUDIT_QUEUE_SIZE,
+            backpressure=Config.AUDIT_BACKPRESSURE,
+            block_timeout=Config.AUDIT_BLOCK_TIMEOUT,
+            spill_path=Config.AUDIT_SPILL_PATH
+        )
+    return _writer
+
+def shutdown_audit_writer():
+    """Flush and stop the audit writer (process shutdown hook)"""
+    if _writer is not None:
+        _writer.shutdown()
@@ -1,16 +1,100 @@
 import jwt
-from datetime import datetime, timedelta
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from flask import request, jsonify
-import os
-from dotenv import load_dotenv
+from config.settings import Config
+from .timing import timed
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-here-change-in-production')
+SECRET_KEY = Config.SECRET_KEY or 'your-secret-key-here-change-in-production'
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+class TokenCache:
+    """
+    Bounded LRU cache of verified JWT payloads, keyed by token digest
+
+    An entry lives until the token's exp or max_ttl seconds, whichever is
+    sooner.
+    """
+
+    def __init__(self, max_size=10000, max_ttl=60):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        """Cached payload for a token, or None"""
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    self._remove(digest)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token, payload):
+        """Cache a verified payload"""
+        if self.max_size <= 0:
+            return
+        digest = self._digest(token)
+        expires_at = min(payload.get('exp', 0), time.time() + self.max_ttl)
+        user_id = payload.get('user_id')
+        with self._lock:
+            self._entries[digest] = (payload, expires_at, user_id)
+            self._entries.move_to_end(digest)
+            self._by_user.setdefault(user_id, set()).add(digest)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token belonging to a user"""
+        with self._lock:
+            for digest in list(self._by_user.get(user_id, ())):
+                self._remove(digest)
+
+    def _remove(self, digest):
+        # Caller holds self._lock
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            digests = self._by_user.get(entry[2])
+            if digests is not None:
+                digests.discard(digest)
+                if not digests:
+                    del self._by_user[entry[2]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+token_cache = TokenCache(
+    max_size=Config.TOKEN_CACHE_SIZE,
+    max_ttl=Config.TOKEN_CACHE_TTL
+)
+
 def create_token(user_id, email, role):
     """Create JWT token"""
     try:
@@ -26,7 +110,7 @@ def create_token(user_id, email, role):
         return token
     
     except Exception as e:
-        print(f"Token creation error: {e}")
+        logger.exception("Token creation error")
         return None
 
 def decode_token(token):
@@ -40,6 +124,108 @@ def decode_token(token):
     except jwt.InvalidTokenError:
         return {'error': 'Invalid token'}
 
+class RevocationList:
+    """
+    Users whose tokens issued up to a point in time are no longer valid
+
+    Markers are kept in the token_revocations collection so every worker
+    sees them. Each process reloads the list at most once per
+    refresh_interval seconds, from the request that finds it stale, so
+    a deactivation takes effect in other workers within that interval
+    without adding a database read per token.
+    """
+
+    def __init__(self, refresh_interval=60):
+        self.refresh_interval = refresh_interval
+        self._revoked = {}
+        self._loaded_at = 0
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def _collection():
+        from app.models.database import Database
+        return Database.get_collection('token_revocations')
+
+    @staticmethod
+    def _cutoff():
+        # Tokens older than this have expired anyway
+        return datetime.utcnow() - timedelta(hours=JWT_EXPIRATION_HOURS)
+
+    @staticmethod
+    def _epoch(value):
+        return value.replace(tzinfo=timezone.utc).timestamp()
+
+    def _refresh(self):
+        if time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        # One request reloads; the others keep using the current list
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            collection = self._collection()
+            if collection is None:
+                return
+            self._revoked = {
+                marker['_id']: self._epoch(marker['revoked_at'])
+                for marker in collection.find({'revoked_at': {'$gte': self._cutoff()}})
+            }
+            self._loaded_at = time.monotonic()
+        except Exception as e:
+            # Keep the list already loaded and retry on the next request
+            logger.warning("Token revocation refresh error: %s", e)
+        finally:
+            self._refresh_lock.release()
+
+    def is_revoked(self, payload):
+        """True if the token was issued before its user's revocation"""
+        self._refresh()
+        revoked_at = self._revoked.get(payload.get('user_id'))
+        return revoked_at is not None and payload.get('iat', 0) <= revoked_at
+
+    def revoke(self, user_id):
+        """Reject every token issued to a user until now"""
+        now = datetime.utcnow()
+        self._revoked[user_id] = self._epoch(now)
+        collection = self._collection()
+        if collection is None:
+            raise ConnectionError('Database not connected')
+        collection.update_one({'_id': user_id}, {'$set': {'revoked_at': now}}, upsert=True)
+        collection.delete_many({'revoked_at': {'$lt': self._cutoff()}})
+
+    def restore(self, user_id):
+        """Lift a revocation (e.g. when the user is reactivated)"""
+        self._revoked.pop(user_id, None)
+        collection = self._collection()
+        if collection is not None:
+            collection.delete_one({'_id': user_id})
+
+revocations = RevocationList(refresh_interval=Config.TOKEN_CACHE_TTL)
+
+def authenticate_token(token):
+    """
+    Verify a token, consulting the verified-token cache first
+    Returns the payload, or a dict with an 'error' key
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = decode_token(token)
+        if 'error' in payload:
+            return payload
+        token_cache.put(token, payload)
+    
+    if revocations.is_revoked(payload):
+        return {'error': 'Account is deactivated'}
+    return payload
+
+def invalidate_user_tokens(user_id):
+    """Revoke a user's current tokens in every worker (e.g. after deactivation)"""
+    token_cache.invalidate_user(user_id)
+    revocations.revoke(user_id)
+
+def restore_user_tokens(user_id):
+    """Allow tokens issued from now on again (e.g. after reactivation)"""
+    revocations.restore(user_id)
+
 def require_auth(f):
     """Decorator to require authentication"""
     @wraps(f)
@@ -54,7 +240,8 @@ def require_auth(f):
         except IndexError:
             return jsonify({'error': 'Invalid authorization header format'}), 401
         
-        payload = decode_token(token)
+        with timed('auth'):
+            payload = authenticate_token(token)
         
         if 'error' in payload:
             return jsonify({'error': payload['error']}), 401
@@ -0,0 +1,96 @@
+import gzip
+from flask import request
+from config.settings import Config
+
+# brotli and zstandard are optional; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def _gzip(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def _brotli(data, level):
+    # Brotli quality runs 0-11; map the 1-9 gzip-style level onto it
+    return brotli.compress(data, quality=min(11, level + 2))
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+COMPRESSORS = {
+    'gzip': _gzip,
+    'br': _brotli if brotli is not None else None,
+    'zstd': _zstd if zstandard is not None else None
+}
+
+def available_encodings():
+    """Encodings this process can produce, in server preference order"""
+    return [
+        name for name in Config.COMPRESSION_ENCODINGS
+        if COMPRESSORS.get(name) is not None
+    ]
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the preferred encoding the client accepts (q > 0)
+
+    Args:
+        accept_encodings: werkzeug Accept object from request.accept_encodings
+    """
+    for name in available_encodings():
+        if accept_encodings[name] > 0:
+            return name
+    return None
+
+def _is_compressible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    # Streamed bodies (record downloads) go out chunk by chunk untouched
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    mimetype = response.mimetype or ''
+    if not any(mimetype.startswith(prefix) for prefix in Config.COMPRESSION_MIMETYPES):
+        return False
+    return response.content_length is None or response.content_length >= Config.COMPRESSION_MIN_SIZE
+
+def compress_response(response):
+    """after_request hook: compress eligible responses per Accept-Encoding"""
+    if not _is_compressible(response):
+        return response
+
+    # Whether or not this response is compressed, another client's may be
+    response.vary.add('Accept-Encoding')
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < Config.COMPRESSION_MIN_SIZE:
+        return response
+
+    compressed = COMPRESSORS[encoding](data, Config.COMPRESSION_LEVEL)
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+    # The bytes differ per encoding, so a strong validator must not be shared
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_compression(app):
+    """Register response compression on the app"""
+    if Config.COMPRESSION_ENABLED:
+        app.after_request(compress_response)
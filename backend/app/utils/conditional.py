@@ -0,0 +1,104 @@
+import hashlib
+import logging
+from functools import wraps
+from bson import ObjectId
+from flask import request, make_response
+from app.models.database import get_users_collection
+
+logger = logging.getLogger(__name__)
+
+# Per-user data: browsers may keep it but must revalidate before reuse
+PRIVATE_REVALIDATE = 'private, no-cache'
+
+def make_etag(*parts):
+    """Build an ETag value from the parts that determine a response"""
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+def _not_modified(etag, cache_control):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Authorization')
+    return response
+
+def conditional(version=None, cache_control=PRIVATE_REVALIDATE):
+    """
+    Decorator adding ETag / If-None-Match handling to a GET endpoint
+    Must be applied after require_auth, since the ETag is per user
+
+    Args:
+        version: callable(*view_args) returning a cheap token that changes
+                 whenever the response would (e.g. updated_at). When given,
+                 a matching If-None-Match is answered with 304 before the
+                 view runs. Without it the ETag is a hash of the response body.
+        cache_control: Cache-Control header for 200 and 304 responses
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            etag = None
+            if version is not None:
+                try:
+                    token = version(*args, **kwargs)
+                except Exception as e:
+                    # Fall back to hashing the body
+                    logger.warning("ETag version error: %s", e)
+                    token = None
+                if token is not None:
+                    etag = make_etag(request.user['user_id'], request.full_path, token)
+                    if request.if_none_match.contains_weak(etag):
+                        return _not_modified(etag, cache_control)
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+
+            if etag is None:
+                etag = make_etag(response.get_data())
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            response.vary.add('Authorization')
+            return response.make_conditional(request)
+
+        return decorated
+    return decorator
+
+def _user_fields(user_id, fields):
+    users_collection = get_users_collection()
+    if users_collection is None:
+        return None
+    return users_collection.find_one({'_id': ObjectId(user_id)}, {field: 1 for field in fields})
+
+def user_version(user_id):
+    """Version of a user document: its updated_at timestamp"""
+    user = _user_fields(user_id, ['updated_at'])
+    if not user:
+        return None
+    return user.get('updated_at')
+
+def records_version(patient_id):
+    """
+    Version of a patient's active record set: the records_revision
+    counter on the user document, bumped by bump_records_revision()
+    whenever a record is added or soft-deleted
+    """
+    user = _user_fields(patient_id, ['records_revision'])
+    if not user:
+        return None
+    return user.get('records_revision', 0)
+
+def patient_version(patient_id):
+    """Version of a patient's profile plus record set, from one read"""
+    user = _user_fields(patient_id, ['updated_at', 'records_revision'])
+    if not user:
+        return None
+    return (user.get('updated_at'), user.get('records_revision', 0))
+
+def bump_records_revision(patient_id):
+    """Invalidate the records_version of a patient after a record change"""
+    users_collection = get_users_collection()
+    if users_collection is not None:
+        users_collection.update_one(
+            {'_id': ObjectId(patient_id)},
+            {'$inc': {'records_revision': 1}}
+        )
@@ -0,0 +1,175 @@
+"""
+Worker pool for record stream encryption
+
+Streamed records are sealed chunk by chunk with AES-GCM and every chunk
+has its own nonce, so the chunks of one record can be encrypted or
+decrypted in parallel and reassembled in order. CRYPTO_POOL_MODE picks
+where that work runs:
+
+inline  - in the request thread, one chunk after another
+thread  - a per-process thread pool; gains only where the cipher calls
+          run outside the GIL and there are idle cores
+process - a per-process pool of worker processes, each with its own key
+          ring; chunks are pickled across, so it only pays off for
+          large records on hosts with spare cores
+
+Each stream keeps at most CRYPTO_POOL_WINDOW chunks in flight, and the
+pool as a whole at most CRYPTO_POOL_QUEUE_LIMIT. When the pool is full a
+chunk is processed inline instead, so a burst of large uploads degrades
+to inline speed rather than queueing without bound.
+
+Compare the modes on a host with: python -m benchmarks.bench_crypto_pool
+"""
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from config.settings import Config
+from .metrics import registry
+from .timing import timed
+
+MODES = ('inline', 'thread', 'process')
+
+CRYPTO_POOL_CHUNKS = registry.counter(
+    'crypto_pool_chunks_total', 'Record stream chunks by where they were processed',
+    ('mode', 'placement')
+)
+
+def seal_chunk(key_id, nonce, data, header):
+    """Encrypt one stream chunk (runs in a pool worker)"""
+    from .encryption import get_key_ring
+    _, aesgcm = get_key_ring().stream_ciphers(key_id)[0]
+    return aesgcm.encrypt(nonce, data, header)
+
+def open_chunk(key_id, nonce, data, header):
+    """Decrypt one stream chunk (runs in a pool worker)"""
+    from .encryption import get_key_ring
+    _, aesgcm = get_key_ring().stream_ciphers(key_id)[0]
+    return aesgcm.decrypt(nonce, data, header)
+
+def _init_process_worker(keys):
+    # Worker processes are spawned, not forked; give them the parent's keys
+    from .encryption import KeyRing, use_key_ring
+    use_key_ring(KeyRing(keys))
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+class CryptoPool:
+    """
+    Bounded executor that maps chunk work over a stream in order
+
+    map() submits up to `window` tasks ahead of the consumer. Once
+    `workers + queue_limit` tasks are in flight across all streams,
+    further tasks run inline in the caller.
+    """
+
+    def __init__(self, mode, workers, queue_limit, window):
+        if mode not in MODES:
+            raise ValueError(f"Invalid crypto pool mode: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_limit = queue_limit
+        self.window = max(1, window)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Pools do not survive fork(); build one per process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    if self.mode == 'thread':
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers,
+                            thread_name_prefix='crypto'
+                        )
+                    else:
+                        from .encryption import get_key_ring
+                        key_ring = get_key_ring()
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context('spawn'),
+                            initializer=_init_process_worker,
+                            initargs=([(k, key_ring.key(k)) for k in key_ring.key_ids],)
+                        )
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_limit)
+                    self._pid = os.getpid()
+
+    def _submit(self, fn, args):
+        if not self._slots.acquire(blocking=False):
+            CRYPTO_POOL_CHUNKS.inc(mode=self.mode, placement='inline')
+            with timed('crypto'):
+                return _completed(fn(*args))
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        CRYPTO_POOL_CHUNKS.inc(mode=self.mode, placement='pool')
+        return future
+
+    def map(self, fn, tasks):
+        """Yield fn(*args) for each args tuple in tasks, in order"""
+        if self.mode == 'inline':
+            for args in tasks:
+                with timed('crypto'):
+                    result = fn(*args)
+                CRYPTO_POOL_CHUNKS.inc(mode=self.mode, placement='inline')
+                yield result
+            return
+
+        self._ensure_started()
+        pending = deque()
+        try:
+            for args in tasks:
+                pending.append(self._submit(fn, args))
+                while len(pending) >= self.window:
+                    with timed('crypto'):
+                        result = pending.popleft().result()
+                    yield result
+            while pending:
+                with timed('crypto'):
+                    result = pending.popleft().result()
+                yield result
+        finally:
+            # Abandoned streams (errors, client disconnects) drop their
+            # queued chunks; running ones finish and free their slots
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._pid = None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_crypto_pool():
+    """The process-wide crypto pool, configured from Config"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = CryptoPool(
+                    mode=Config.CRYPTO_POOL_MODE,
+                    workers=Config.CRYPTO_POOL_WORKERS,
+                    queue_limit=Config.CRYPTO_POOL_QUEUE_LIMIT,
+                    window=Config.CRYPTO_POOL_WINDOW
+                )
+    return _pool
+
+def set_crypto_pool(pool):
+    """Replace the process-wide pool (e.g. to compare modes); returns the old one"""
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    return previous
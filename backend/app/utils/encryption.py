@@ -1,16 +1,147 @@
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import os
 import base64
-from dotenv import load_dotenv
+import logging
+import struct
+import threading
+from itertools import chain
+from config.settings import Config
+from .crypto_pool import get_crypto_pool, seal_chunk, open_chunk
+from .metrics import CRYPTO_OPERATIONS, CRYPTO_BYTES
+from .timing import timed
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Streaming record format (AES-256-GCM per chunk):
+#   header  = magic (4) | chunk size (4, big-endian) | nonce prefix (7)
+#   chunk i = AES-GCM(plaintext chunk) + 16-byte tag
+#   nonce i = nonce prefix | i (4, big-endian) | 1 if last chunk else 0
+# The header is authenticated with every chunk, and binding the chunk
+# index and last-chunk flag into the nonce rejects reordered, dropped or
+# truncated chunks.
+STREAM_METHOD = 'AES-256-GCM-STREAM'
+STREAM_MAGIC = b'BMS1'
+STREAM_HEADER_SIZE = 15
+STREAM_TAG_SIZE = 16
+DEFAULT_STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_KEY_INFO = b'bharathmedicare-record-stream-v1'
+
+# Key id of the single ENCRYPTION_KEY. Records written before key ids
+# were stored have no key_id and are tried against every key.
+DEFAULT_KEY_ID = 'default'
+
+def parse_encryption_keys(value):
+    """Parse ENCRYPTION_KEYS ('key_id:key,...', primary first) into [(key_id, key)]"""
+    keys = []
+    for entry in value.split(','):
+        if not entry.strip():
+            continue
+        key_id, sep, key = entry.strip().partition(':')
+        if not sep or not key_id.strip() or not key.strip():
+            raise ValueError("ENCRYPTION_KEYS entries must look like key_id:key")
+        keys.append((key_id.strip(), key.strip()))
+    return keys
+
+def _derive_stream_key(key):
+    """Derive the AES-256 key for streamed records from a Fernet key"""
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=STREAM_KEY_INFO
+    )
+    return hkdf.derive(base64.urlsafe_b64decode(key))
+
+class KeyRing:
+    """
+    The record encryption keys, with their ciphers built once
+
+    The first key is primary: new records are encrypted with it. The
+    rest only decrypt, until re-encryption (python -m app.models.rotation)
+    has moved every record off them and they can be removed.
+    """
+
+    def __init__(self, keys):
+        if not keys:
+            raise ValueError("ENCRYPTION_KEY not found in environment variables")
+        self.key_ids = [key_id for key_id, _ in keys]
+        if len(set(self.key_ids)) != len(self.key_ids):
+            raise ValueError("Duplicate key id in ENCRYPTION_KEYS")
+        self.primary_id = self.key_ids[0]
+        self._keys = dict(keys)
+        self._fernets = {key_id: Fernet(key) for key_id, key in keys}
+        self._stream_ciphers = {key_id: AESGCM(_derive_stream_key(key)) for key_id, key in keys}
+        # Ids may alias the same key; try each distinct key only once
+        self._distinct_ids = []
+        for key_id, key in keys:
+            if key not in [self._keys[k] for k in self._distinct_ids]:
+                self._distinct_ids.append(key_id)
+        self._multi_fernet = MultiFernet([self._fernets[key_id] for key_id in self._distinct_ids])
+
+    def _check(self, key_id):
+        if key_id not in self._keys:
+            raise KeyError(f"Unknown encryption key '{key_id}'")
+        return key_id
+
+    def key(self, key_id=None):
+        """A key's Fernet key string (the primary key by default)"""
+        return self._keys[self._check(key_id or self.primary_id)]
+
+    def fernet(self, key_id=None):
+        """Fernet for a key id; without one, a MultiFernet over every key"""
+        if key_id is None:
+            return self._multi_fernet
+        return self._fernets[self._check(key_id)]
+
+    def stream_ciphers(self, key_id=None):
+        """[(key_id, AESGCM)] to try on a stream: the given key, or every key"""
+        if key_id is None:
+            return [(k, self._stream_ciphers[k]) for k in self._distinct_ids]
+        return [(key_id, self._stream_ciphers[self._check(key_id)])]
+
+_key_ring = None
+_key_ring_lock = threading.Lock()
+
+def _configured_keys():
+    keys = parse_encryption_keys(Config.ENCRYPTION_KEYS)
+    legacy = Config.ENCRYPTION_KEY
+    if legacy and DEFAULT_KEY_ID not in [key_id for key_id, _ in keys]:
+        # Records written before ENCRYPTION_KEYS was set are stamped
+        # 'default'; keep that id even if the same key is listed under
+        # another one (e.g. k1:<old key>)
+        keys.append((DEFAULT_KEY_ID, legacy))
+    return keys
+
+def get_key_ring():
+    """The process-wide key ring, built on first use"""
+    global _key_ring
+    if _key_ring is None:
+        with _key_ring_lock:
+            if _key_ring is None:
+                _key_ring = KeyRing(_configured_keys())
+    return _key_ring
+
+def reset_key_ring():
+    """Forget the cached key ring; the next use rebuilds it from Config"""
+    use_key_ring(None)
+
+def use_key_ring(key_ring):
+    """Install a key ring for this process (None rebuilds from Config on next use)"""
+    global _key_ring
+    with _key_ring_lock:
+        _key_ring = key_ring
 
 def get_encryption_key():
-    """Get encryption key from environment variables"""
-    key = os.getenv('ENCRYPTION_KEY')
-    if not key:
-        raise ValueError("ENCRYPTION_KEY not found in environment variables")
-    return key.encode()
+    """Get the primary encryption key from the configuration"""
+    return get_key_ring().key().encode()
+
+def primary_key_id():
+    """Id of the key new records are encrypted with"""
+    return get_key_ring().primary_id
 
 def encrypt_file_data(file_data):
     """
@@ -20,55 +151,189 @@ def encrypt_file_data(file_data):
         file_data: bytes - The file data to encrypt
     
     Returns:
-        dict: Contains encrypted data and metadata
+        dict: Contains encrypted data (the raw Fernet token) and metadata
     """
     try:
-        key = get_encryption_key()
-        fernet = Fernet(key)
-        
-        # Encrypt the file data
-        encrypted_data = fernet.encrypt(file_data)
+        key_ring = get_key_ring()
+        fernet = key_ring.fernet(key_ring.primary_id)
         
-        # Convert to base64 for safe storage
-        encrypted_base64 = base64.b64encode(encrypted_data).decode('utf-8')
+        # Encrypt the file data (the token is already URL-safe base64)
+        with timed('crypto'):
+            encrypted_data = fernet.encrypt(file_data)
+        CRYPTO_OPERATIONS.inc(operation='encrypt', method='Fernet', outcome='success')
+        CRYPTO_BYTES.inc(len(file_data), operation='encrypt', method='Fernet')
         
         return {
-            'encrypted_data': encrypted_base64,
+            'encrypted_data': encrypted_data,
             'encryption_method': 'Fernet',
+            'key_id': key_ring.primary_id,
             'success': True
         }
     
     except Exception as e:
+        CRYPTO_OPERATIONS.inc(operation='encrypt', method='Fernet', outcome='failure')
         return {
             'error': str(e),
             'success': False
         }
 
-def decrypt_file_data(encrypted_base64):
+def decrypt_file_data(encrypted_data, key_id=None):
     """
     Decrypt file data
     
     Args:
-        encrypted_base64: str - Base64 encoded encrypted data
+        encrypted_data: bytes - Raw Fernet token, or
+                        str - Base64 encoded token (legacy inline records)
+        key_id: str - Key it was encrypted with (None tries every key)
     
     Returns:
         bytes: The decrypted file data
     """
     try:
-        key = get_encryption_key()
-        fernet = Fernet(key)
+        fernet = get_key_ring().fernet(key_id)
         
-        # Decode from base64
-        encrypted_data = base64.b64decode(encrypted_base64.encode('utf-8'))
+        # Legacy records stored the token base64-encoded a second time
+        if isinstance(encrypted_data, str):
+            encrypted_data = base64.b64decode(encrypted_data.encode('utf-8'))
         
         # Decrypt the data
-        decrypted_data = fernet.decrypt(encrypted_data)
+        with timed('crypto'):
+            decrypted_data = fernet.decrypt(encrypted_data)
+        CRYPTO_OPERATIONS.inc(operation='decrypt', method='Fernet', outcome='success')
+        CRYPTO_BYTES.inc(len(decrypted_data), operation='decrypt', method='Fernet')
         
         return decrypted_data
     
     except Exception as e:
+        CRYPTO_OPERATIONS.inc(operation='decrypt', method='Fernet', outcome='failure')
         raise Exception(f"Decryption failed: {str(e)}")
 
+def _rechunk(chunks, size):
+    """Regroup an iterable of byte strings into blocks of exactly size bytes"""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+def _split_head(chunks, size):
+    """Split the first size bytes off an iterable of byte strings: (head, rest)"""
+    chunks = iter(chunks)
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+    return bytes(head[:size]), chain([bytes(head[size:])], chunks)
+
+def _stream_nonce(prefix, index, last):
+    return prefix + struct.pack('>IB', index, 1 if last else 0)
+
+def _decrypt_first_chunk(candidates, nonce, chunk, header):
+    """Find the key that opens a stream's first chunk: (key_id, plaintext)"""
+    error = None
+    for key_id, aesgcm in candidates:
+        try:
+            return key_id, aesgcm.decrypt(nonce, chunk, header)
+        except InvalidTag as e:
+            error = e
+    raise error
+
+def encrypt_stream(chunks, chunk_size=DEFAULT_STREAM_CHUNK_SIZE, key_id=None):
+    """
+    Encrypt a stream of file data chunk by chunk
+    
+    Args:
+        chunks: iterable of bytes - The file data, in pieces of any size
+        chunk_size: int - Plaintext bytes per encrypted chunk
+        key_id: str - Key to encrypt with (the primary key by default);
+                store it in the record's encryption_metadata
+    
+    Yields:
+        bytes: The stream header, then one encrypted chunk at a time
+    """
+    key_ring = get_key_ring()
+    key_id = key_id or key_ring.primary_id
+    key_ring.stream_ciphers(key_id)  # fail now on an unknown key id
+    prefix = os.urandom(7)
+    header = STREAM_MAGIC + struct.pack('>I', chunk_size) + prefix
+    yield header
+    
+    counter = {'size': 0}
+    def tasks():
+        # Hold one chunk back so the last one can be flagged as final
+        index = 0
+        pending = b''
+        for block in _rechunk(chunks, chunk_size):
+            if index or pending:
+                yield (key_id, _stream_nonce(prefix, index, False), pending, header)
+                index += 1
+            pending = block
+            counter['size'] += len(block)
+        yield (key_id, _stream_nonce(prefix, index, True), pending, header)
+    
+    # Chunks are sealed on the crypto pool (app.utils.crypto_pool), in order
+    yield from get_crypto_pool().map(seal_chunk, tasks())
+    CRYPTO_OPERATIONS.inc(operation='encrypt', method=STREAM_METHOD, outcome='success')
+    CRYPTO_BYTES.inc(counter['size'], operation='encrypt', method=STREAM_METHOD)
+
+def decrypt_stream(chunks, key_id=None):
+    """
+    Decrypt a stream produced by encrypt_stream
+    
+    Args:
+        chunks: iterable of bytes - The encrypted stream, in pieces of any size
+        key_id: str - Key it was encrypted with (None tries every key)
+    
+    Yields:
+        bytes: Decrypted file data, one chunk at a time
+    """
+    try:
+        candidates = get_key_ring().stream_ciphers(key_id)
+        header, rest = _split_head(chunks, STREAM_HEADER_SIZE)
+        if len(header) != STREAM_HEADER_SIZE or header[:4] != STREAM_MAGIC:
+            raise ValueError("Not an encrypted record stream")
+        
+        chunk_size = struct.unpack('>I', header[4:8])[0]
+        prefix = header[8:]
+        
+        # Carry on from the rest of the stream in ciphertext-chunk sized blocks
+        remainder = _rechunk(rest, chunk_size + STREAM_TAG_SIZE)
+        current = next(remainder, None)
+        if current is None:
+            raise ValueError("Encrypted record stream is truncated")
+        
+        # The first chunk picks the key (records without a key id try each)
+        following = next(remainder, None)
+        with timed('crypto'):
+            key_id, plaintext = _decrypt_first_chunk(
+                candidates, _stream_nonce(prefix, 0, following is None), current, header
+            )
+        size = len(plaintext)
+        yield plaintext
+        
+        def tasks(current):
+            index = 1
+            while current is not None:
+                following = next(remainder, None)
+                yield (key_id, _stream_nonce(prefix, index, following is None), current, header)
+                index += 1
+                current = following
+        
+        # The rest are opened on the crypto pool, in order
+        for plaintext in get_crypto_pool().map(open_chunk, tasks(following)):
+            size += len(plaintext)
+            yield plaintext
+        CRYPTO_OPERATIONS.inc(operation='decrypt', method=STREAM_METHOD, outcome='success')
+        CRYPTO_BYTES.inc(size, operation='decrypt', method=STREAM_METHOD)
+    
+    except Exception as e:
+        CRYPTO_OPERATIONS.inc(operation='decrypt', method=STREAM_METHOD, outcome='failure')
+        raise Exception(f"Decryption failed: {str(e) or type(e).__name__}")
+
 def generate_encryption_key():
     """
     Generate a new Fernet encryption key
@@ -80,17 +345,24 @@ def generate_encryption_key():
 # Utility function to test encryption/decryption
 def test_encryption():
     """Test encryption and decryption"""
+    from .log import configure_logging
+    configure_logging()
     test_data = b"This is sensitive medical data"
     
     # Encrypt
     encrypted = encrypt_file_data(test_data)
-    print(f"Encryption successful: {encrypted['success']}")
-    print(f"Encrypted data (first 50 chars): {encrypted['encrypted_data'][:50]}...")
+    logger.info("Encryption successful: %s", encrypted['success'])
+    logger.info("Encrypted data (first 50 chars): %s...", encrypted['encrypted_data'][:50].decode())
     
     # Decrypt
     decrypted = decrypt_file_data(encrypted['encrypted_data'])
-    print(f"Decrypted data: {decrypted.decode()}")
-    print(f"Match: {test_data == decrypted}")
+    logger.info("Decrypted data: %s", decrypted.decode())
+    logger.info("Match: %s", test_data == decrypted)
+    
+    # Streamed encryption, with a chunk size smaller than the data
+    stream = b''.join(encrypt_stream([test_data[:10], test_data[10:]], chunk_size=8))
+    streamed = b''.join(decrypt_stream([stream]))
+    logger.info("Stream match: %s", test_data == streamed)
 
 if __name__ == "__main__":
     # Generate a new key (run this once and put in .env)
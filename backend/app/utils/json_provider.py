@@ -0,0 +1,71 @@
+import base64
+import json
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+from .timing import timed
+
+# orjson is optional; the stdlib encoder produces the same output, slower
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    """Encode the types MongoDB documents carry that JSON has no type for"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode('ascii')
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _stdlib_default(obj):
+    # Match orjson: ISO 8601, naive datetimes (pymongo's default) as UTC
+    if isinstance(obj, datetime):
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=timezone.utc)
+        return obj.isoformat()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    return _default(obj)
+
+class FastJSONProvider(JSONProvider):
+    """
+    JSON provider that encodes ObjectId, datetime and bytes natively,
+    so views can return MongoDB documents as they come from the driver.
+    Uses orjson when installed.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(
+                obj, default=_default, option=orjson.OPT_NAIVE_UTC
+            ).decode('utf-8')
+        kwargs.setdefault('default', _stdlib_default)
+        kwargs.setdefault('ensure_ascii', False)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        with timed('json'):
+            if orjson is not None:
+                data = orjson.dumps(obj, default=_default, option=orjson.OPT_NAIVE_UTC)
+            else:
+                data = self.dumps(obj)
+        return self._app.response_class(data, mimetype=self.mimetype)
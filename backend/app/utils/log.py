@@ -0,0 +1,213 @@
+"""
+Application logging
+
+Loggers under 'app' (every module uses logging.getLogger(__name__))
+hand their records to a QueueHandler; a QueueListener thread formats
+them and writes to stdout, so request threads never block on I/O.
+
+On the way into the queue each record is:
+- sampled, if it is a DEBUG record and LOG_DEBUG_SAMPLE_RATE < 1
+- tagged with the current request id
+- redacted: values of LOG_REDACT_FIELDS keys in extra= data are
+  replaced and email addresses are masked in the message
+
+When the queue is full new records are dropped and counted rather than
+waiting for the writer.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from config.settings import Config
+from .metrics import registry
+
+LOG_RECORDS_DROPPED = registry.counter(
+    'log_records_dropped_total', 'Log records dropped because the log queue was full'
+)
+
+REDACTED = '[REDACTED]'
+_EMAIL = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'taskName', 'request_id'
+}
+
+_state = {
+    'pid': None,
+    'handler': None,
+    'listener': None
+}
+
+def parse_levels(value):
+    """Parse 'logger=LEVEL,...' pairs (LOG_LEVELS) into {logger: level}"""
+    levels = {}
+    for pair in value.split(','):
+        name, _, level = pair.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def redact(value, fields):
+    """Copy of value with the given keys' values replaced, at any depth"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in fields else redact(item, fields)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, fields) for item in value]
+    if isinstance(value, str):
+        return _EMAIL.sub(REDACTED, value)
+    return value
+
+def _extra(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+def _current_request_id():
+    try:
+        from flask import g, has_request_context
+        return g.get('request_id') if has_request_context() else None
+    except Exception:
+        return None
+
+class DebugSampler(logging.Filter):
+    """Let through every record above DEBUG and a fraction of DEBUG ones"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and extras"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(_extra(record))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for the dev server and CLIs"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extra = _extra(record)
+        if extra:
+            line += ' ' + json.dumps(extra, default=str, ensure_ascii=False)
+        if getattr(record, 'request_id', None):
+            line += f' [{record.request_id}]'
+        return line
+
+class AppQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that redacts and tags records in the calling thread,
+    drops on a full queue and restarts its listener after a fork
+    """
+
+    def __init__(self, log_queue, redact_fields):
+        super().__init__(log_queue)
+        self.redact_fields = redact_fields
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text and self.redact_fields is not None:
+            record.exc_text = _EMAIL.sub(REDACTED, record.exc_text)
+        record.exc_info = None
+        record.args = None
+        if record.__dict__.get('request_id') is None:
+            record.request_id = _current_request_id()
+        if self.redact_fields is None:
+            record.msg = message
+            return record
+        record.msg = _EMAIL.sub(REDACTED, message)
+        for key, value in _extra(record).items():
+            setattr(record, key, REDACTED if key.lower() in self.redact_fields
+                    else redact(value, self.redact_fields))
+        return record
+
+    def enqueue(self, record):
+        if _state['pid'] != os.getpid():
+            _restart_after_fork()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+def _make_output_handler(config):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JSONFormatter() if config.LOG_FORMAT == 'json' else TextFormatter())
+    return handler
+
+def _start_listener(handler, config):
+    handler.queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(handler.queue, _make_output_handler(config))
+    listener.start()
+    _state['pid'] = os.getpid()
+    _state['listener'] = listener
+
+def _restart_after_fork():
+    # The listener thread does not survive fork(); give this process its own
+    _start_listener(_state['handler'], Config)
+
+def configure_logging(config=Config):
+    """
+    Route the 'app' logger hierarchy through the log queue
+    Safe to call more than once; later calls reapply levels only
+    """
+    logger = logging.getLogger('app')
+    logger.setLevel(config.LOG_LEVEL.upper())
+    for name, level in parse_levels(config.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    if _state['handler'] is not None and _state['pid'] == os.getpid():
+        return logger
+
+    redact_fields = {field.lower() for field in config.LOG_REDACT_FIELDS} if config.LOG_REDACT else None
+    handler = AppQueueHandler(None, redact_fields)
+    handler.addFilter(DebugSampler(config.LOG_DEBUG_SAMPLE_RATE))
+    if _state['handler'] is not None:
+        logger.removeHandler(_state['handler'])
+    _state['handler'] = handler
+    _start_listener(handler, config)
+
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+def stop_logging():
+    """Write out queued records and stop the listener thread"""
+    listener = _state['listener']
+    if listener is not None and _state['pid'] == os.getpid():
+        _state['listener'] = None
+        listener.stop()
+
+atexit.register(stop_logging)
@@ -0,0 +1,192 @@
+import logging
+import os
+import threading
+import tracemalloc
+from flask import g, request
+from config.settings import Config
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+HTTP_REQUEST_MEMORY_PEAK = registry.histogram(
+    'http_request_memory_peak_bytes', 'Peak traced allocation growth during a request',
+    ('endpoint',),
+    buckets=(256 * 1024, MB, 4 * MB, 16 * MB, 32 * MB, 64 * MB, 128 * MB, 256 * MB)
+)
+MEMORY_BUDGET_EXCEEDED = registry.counter(
+    'http_request_memory_budget_exceeded_total', 'Requests that went over their memory budget',
+    ('endpoint',)
+)
+
+# tracemalloc has one process-wide peak, so it is only reset when no
+# other request is running; overlapping requests are flagged instead
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+_baseline = None
+_baseline_lock = threading.Lock()
+
+def parse_budgets(value):
+    """Parse 'endpoint=MB,endpoint=MB' into {endpoint: bytes}"""
+    budgets = {}
+    for item in (value or '').split(','):
+        endpoint, _, megabytes = item.partition('=')
+        if endpoint.strip() and megabytes.strip():
+            budgets[endpoint.strip()] = int(float(megabytes) * MB)
+    return budgets
+
+_budgets = parse_budgets(Config.MEMORY_BUDGETS)
+
+def get_budget(endpoint):
+    """Memory budget in bytes for an endpoint (0 means none)"""
+    return _budgets.get(endpoint, int(Config.MEMORY_DEFAULT_BUDGET_MB * MB))
+
+def is_tracking():
+    return tracemalloc.is_tracing()
+
+def _before_request():
+    global _in_flight
+    with _in_flight_lock:
+        if _in_flight == 0:
+            tracemalloc.reset_peak()
+            g.memory_overlapped = False
+        else:
+            g.memory_overlapped = True
+        _in_flight += 1
+    g.memory_start = tracemalloc.get_traced_memory()[0]
+
+def _measure(start, overlapped):
+    """Peak growth since start, and whether another request overlapped"""
+    with _in_flight_lock:
+        peak = tracemalloc.get_traced_memory()[1] - start
+        overlapped = overlapped or _in_flight > 1
+    return max(0, peak), overlapped
+
+def _account(endpoint, peak, overlapped):
+    HTTP_REQUEST_MEMORY_PEAK.observe(peak, endpoint=endpoint)
+
+    budget = get_budget(endpoint)
+    if budget and peak > budget:
+        MEMORY_BUDGET_EXCEEDED.inc(endpoint=endpoint)
+        logger.warning(
+            "✗ Memory budget exceeded: %s peaked at %.1fMB (budget %.1fMB)",
+            endpoint, peak / MB, budget / MB,
+            extra={'overlapped': overlapped}
+        )
+
+class _MeasuredBody:
+    """
+    Streamed response body that runs finish() once the server closes it
+    (call_on_close is skipped for direct_passthrough responses)
+    """
+
+    def __init__(self, body, finish):
+        self.body = body
+        self.finish = finish
+        self._finished = False
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            if not self._finished:
+                self._finished = True
+                self.finish()
+
+def _after_request(response):
+    start = g.get('memory_start')
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+
+    if response.is_streamed:
+        # The body (e.g. a record download) is generated after this hook
+        # and after teardown, so measure once the server has sent it
+        g.memory_streamed = True
+        overlapped = g.memory_overlapped
+
+        def finish():
+            global _in_flight
+            peak, was_overlapped = _measure(start, overlapped)
+            with _in_flight_lock:
+                _in_flight -= 1
+            _account(endpoint, peak, was_overlapped)
+
+        response.response = _MeasuredBody(response.response, finish)
+        return response
+
+    g.memory_peak_bytes, g.memory_overlapped = _measure(start, g.memory_overlapped)
+    _account(endpoint, g.memory_peak_bytes, g.memory_overlapped)
+    return response
+
+def _teardown_request(exc):
+    global _in_flight
+    if g.pop('memory_start', None) is not None and not g.pop('memory_streamed', False):
+        with _in_flight_lock:
+            _in_flight -= 1
+
+def take_baseline():
+    """
+    Remember a snapshot of current allocations to diff against later
+    The baseline lives in this process only: snapshot_diff() in another
+    gunicorn worker has none (tracemalloc data can't be compared across
+    processes), so use a single worker or address one worker directly.
+    """
+    global _baseline
+    snapshot = tracemalloc.take_snapshot()
+    with _baseline_lock:
+        _baseline = snapshot
+    return {
+        'pid': os.getpid(),
+        'traced_bytes': tracemalloc.get_traced_memory()[0]
+    }
+
+def snapshot_diff(limit=25, key_type='lineno'):
+    """
+    Top allocation growth since the baseline snapshot
+
+    Returns:
+        dict: pid, traced_bytes and the `limit` biggest differences,
+              or None if no baseline has been taken
+    """
+    with _baseline_lock:
+        baseline = _baseline
+    if baseline is None:
+        return None
+
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+    ]
+    current = tracemalloc.take_snapshot().filter_traces(filters)
+    stats = current.compare_to(baseline.filter_traces(filters), key_type)
+
+    return {
+        'pid': os.getpid(),
+        'traced_bytes': tracemalloc.get_traced_memory()[0],
+        'top': [
+            {
+                'location': str(stat.traceback[0]) if stat.traceback else '',
+                'size_bytes': stat.size,
+                'size_diff_bytes': stat.size_diff,
+                'count': stat.count,
+                'count_diff': stat.count_diff
+            }
+            for stat in stats[:limit]
+        ]
+    }
+
+def init_memory_tracking(app):
+    """Start tracemalloc and account peak memory per request"""
+    if not Config.MEMORY_TRACKING:
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(Config.MEMORY_TRACE_FRAMES)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
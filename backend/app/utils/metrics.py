@@ -0,0 +1,470 @@
+"""
+Prometheus-style metrics
+
+Each process keeps its metrics in memory. Under gunicorn every worker
+also writes a snapshot of them to METRICS_DIR (at most
+METRICS_FLUSH_INTERVAL seconds old, and on exit), and /api/metrics
+merges every snapshot, so a scrape through the service sees totals for
+the whole server whichever worker answers. When a worker exits its
+counters and histograms are folded into one dead.json aggregate and its
+own file is removed, so they never go backwards while the server runs
+and the number of files does not grow with restarts; gauges only count
+live workers.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from flask import g, request, Response, jsonify
+from pymongo import monitoring
+from config.settings import Config
+from .timing import record_timing
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """A metric family: one value (or histogram) per label combination"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    # Whether values of exited processes stay in the merged totals
+    keep_dead = True
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def snapshot(self):
+        """[[label values, value]] for writing to METRICS_DIR"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def render(self, values=None):
+        """Exposition lines for this process's values, or for merged ones"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}"
+        ]
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """Mirror a monotonic total kept elsewhere (for collectors)"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Gauge(_Metric):
+    type = 'gauge'
+    keep_dead = False
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), [list(counts), total, count]]
+                    for key, (counts, total, count) in self._values.items()]
+
+    @staticmethod
+    def merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+METRIC_TYPES = {metric_class.type: metric_class for metric_class in (Counter, Gauge, Histogram)}
+
+class Registry:
+    """
+    Process-wide set of metrics, rendered in the Prometheus text format
+
+    collectors are callables run before each scrape or snapshot that set
+    metrics from state kept elsewhere (e.g. the audit writer's counters),
+    so that state costs nothing on the request path.
+
+    With a directory set, render() merges the snapshots every process
+    wrote there (see the module docstring).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self.directory = None
+        self.flush_interval = 5.0
+        self._flusher_pid = None
+        self._flusher_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning("Metrics collector error: %s", e)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def write(self, live=True):
+        """Write this process's snapshot to the directory"""
+        if not self.directory:
+            return
+        self.collect()
+        snapshot = {
+            'pid': os.getpid(),
+            'live': live,
+            'types': {metric.name: metric.type for metric in self._metrics},
+            'metrics': {metric.name: metric.snapshot() for metric in self._metrics}
+        }
+        self._write_snapshot(self._path(os.getpid()), snapshot)
+
+    def _write_snapshot(self, path, snapshot):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_snapshot(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _merge_samples(merge, values, samples):
+        for key, value in samples:
+            key = tuple(key)
+            values[key] = merge(values[key], value) if key in values else value
+
+    def mark_process_dead(self, pid):
+        """
+        Fold an exited process's counters and histograms into dead.json
+        and remove its snapshot (e.g. gunicorn child_exit, in the master)
+        """
+        if not self.directory:
+            return
+        path = self._path(pid)
+        snapshot = self._read_snapshot(path)
+        if snapshot is not None:
+            dead_path = self._path('dead')
+            dead = self._read_snapshot(dead_path) or {'types': {}, 'metrics': {}}
+            # Types come from the snapshots: the master may not have
+            # imported every module that registers a metric
+            types = {**dead['types'], **snapshot.get('types', {})}
+            for name, kind in types.items():
+                metric_class = METRIC_TYPES.get(kind)
+                if metric_class is None or not metric_class.keep_dead:
+                    continue
+                values = {}
+                self._merge_samples(metric_class.merge, values, dead['metrics'].get(name, []))
+                self._merge_samples(metric_class.merge, values, snapshot['metrics'].get(name, []))
+                dead['types'][name] = kind
+                dead['metrics'][name] = [[list(key), value] for key, value in values.items()]
+            dead.update(pid='dead', live=False)
+            self._write_snapshot(dead_path, dead)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write()
+            except Exception as e:
+                logger.warning("Metrics snapshot error: %s", e)
+
+    def ensure_flusher(self):
+        """Start this process's snapshot thread (threads do not survive fork)"""
+        if self.directory and self._flusher_pid != os.getpid():
+            with self._flusher_lock:
+                if self._flusher_pid != os.getpid():
+                    threading.Thread(
+                        target=self._flush_loop, name='metrics-flush', daemon=True
+                    ).start()
+                    self._flusher_pid = os.getpid()
+
+    def _merged(self):
+        kinds = {metric.name: metric for metric in self._metrics}
+        merged = {name: {} for name in kinds}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            snapshot = self._read_snapshot(path)
+            if snapshot is None:
+                continue
+            for name, samples in snapshot.get('metrics', {}).items():
+                metric = kinds.get(name)
+                if metric is None or (not snapshot.get('live') and not metric.keep_dead):
+                    continue
+                self._merge_samples(metric.merge, merged[name], samples)
+        return merged
+
+    def render(self):
+        if not self.directory:
+            self.collect()
+            lines = []
+            for metric in self._metrics:
+                lines.extend(metric.render())
+            return '\n'.join(lines) + '\n'
+
+        self.write()
+        merged = self._merged()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(merged[metric.name]))
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+# HTTP
+HTTP_REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint',
+    ('endpoint', 'method', 'status')
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    'http_requests_in_flight', 'Requests currently being handled'
+)
+
+# MongoDB
+MONGO_COMMAND_DURATION = registry.histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency',
+    ('collection', 'command', 'outcome'), buckets=MONGO_BUCKETS
+)
+MONGO_DOCUMENTS = registry.counter(
+    'mongodb_documents_total', 'Documents returned or written by MongoDB commands',
+    ('collection', 'command')
+)
+
+# Audit log writer
+AUDIT_EVENTS = registry.counter(
+    'audit_log_entries_total', 'Audit writer events (enqueued, written, dropped, ...)', ('event',)
+)
+AUDIT_QUEUE_DEPTH = registry.gauge(
+    'audit_log_queue_depth', 'Audit entries waiting to be written'
+)
+AUDIT_INLINE_WRITES = registry.counter(
+    'audit_log_inline_writes_total', 'Audit entries written inline (AUDIT_ASYNC off)', ('outcome',)
+)
+
+# Crypto
+CRYPTO_OPERATIONS = registry.counter(
+    'crypto_operations_total', 'Record encryption and decryption operations',
+    ('operation', 'method', 'outcome')
+)
+CRYPTO_BYTES = registry.counter(
+    'crypto_bytes_total', 'Plaintext bytes encrypted or decrypted', ('operation', 'method')
+)
+
+# bcrypt
+BCRYPT_OPERATIONS = registry.counter(
+    'bcrypt_operations_total', 'Password hash and verify operations', ('operation', 'outcome')
+)
+BCRYPT_DURATION = registry.histogram(
+    'bcrypt_duration_seconds', 'Time in bcrypt, excluding queueing', ('operation',),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+)
+
+def _collect_audit():
+    from app.utils.audit_writer import get_audit_writer
+    stats = get_audit_writer().metrics()
+    for event in ('enqueued', 'written', 'batches', 'failed_batches', 'spilled', 'replayed', 'dropped'):
+        AUDIT_EVENTS.set(stats.get(event, 0), event=event)
+    AUDIT_QUEUE_DEPTH.set(stats.get('queue_depth', 0))
+
+registry.add_collector(_collect_audit)
+
+def _reply_documents(command_name, reply):
+    """Number of documents a command returned or wrote"""
+    cursor = reply.get('cursor')
+    if cursor is not None:
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+    n = reply.get('n')
+    return n if isinstance(n, int) else 0
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Time every MongoDB command by collection and command name, and add
+    it to the current request's db timing
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        # getMore names the cursor id; its collection is a separate field
+        if event.command_name == 'getMore':
+            target = event.command.get('collection')
+        collection = target if isinstance(target, str) else ''
+        self._pending[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), '')
+        record_timing('db', event.duration_micros / 1e6)
+        MONGO_COMMAND_DURATION.observe(
+            event.duration_micros / 1e6,
+            collection=collection, command=event.command_name, outcome='success'
+        )
+        documents = _reply_documents(event.command_name, event.reply)
+        if documents:
+            MONGO_DOCUMENTS.inc(documents, collection=collection, command=event.command_name)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), '')
+        record_timing('db', event.duration_micros / 1e6)
+        MONGO_COMMAND_DURATION.observe(
+            event.duration_micros / 1e6,
+            collection=collection, command=event.command_name, outcome='failure'
+        )
+
+def _before_request():
+    registry.ensure_flusher()
+    g.metrics_start = time.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+
+def _after_request(response):
+    start = g.get('metrics_start')
+    if start is not None:
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            endpoint=request.endpoint or 'unmatched',
+            method=request.method,
+            status=str(response.status_code)
+        )
+    return response
+
+def _teardown_request(exc):
+    if g.pop('metrics_start', None) is not None:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+def metrics_endpoint():
+    """
+    Prometheus text exposition, merged across workers when METRICS_DIR is set
+    Requires METRICS_TOKEN as a bearer token; without one only loopback
+    clients are served
+    """
+    if Config.METRICS_TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {Config.METRICS_TOKEN}':
+            return jsonify({'error': 'Unauthorized access'}), 401
+    elif request.remote_addr not in LOOPBACK_ADDRESSES:
+        return jsonify({'error': 'Unauthorized access'}), 401
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def init_metrics(app):
+    """Instrument requests and expose /api/metrics"""
+    if not Config.METRICS_ENABLED:
+        return
+    if Config.METRICS_DIR:
+        os.makedirs(Config.METRICS_DIR, exist_ok=True)
+        registry.directory = Config.METRICS_DIR
+        registry.flush_interval = Config.METRICS_FLUSH_INTERVAL
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/api/metrics', 'metrics', metrics_endpoint, methods=['GET'])
+    if not Config.METRICS_TOKEN:
+        logger.warning("✗ METRICS_TOKEN not set - /api/metrics only answers loopback clients")
@@ -0,0 +1,116 @@
+import base64
+from datetime import datetime
+from bson import ObjectId, json_util
+from flask import request
+from config.settings import Config
+
+class InvalidPageRequest(ValueError):
+    """Raised for a malformed cursor or limit"""
+    pass
+
+# Types a sort field can hold; anything else in a cursor (e.g. a
+# {"$ne": null} operator document) would be injected into the filter
+CURSOR_VALUE_TYPES = (ObjectId, datetime, str, int, float, type(None))
+
+def _encode_cursor(sort, values):
+    payload = json_util.dumps({'s': [field for field, _ in sort], 'v': values})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(token, sort):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise InvalidPageRequest('Invalid cursor')
+    # A cursor is only valid for the listing (sort order) that issued it
+    if not isinstance(payload, dict) or not isinstance(payload.get('v'), list):
+        raise InvalidPageRequest('Invalid cursor')
+    if payload.get('s') != [field for field, _ in sort] or len(payload['v']) != len(sort):
+        raise InvalidPageRequest('Invalid cursor')
+    if not all(isinstance(value, CURSOR_VALUE_TYPES) for value in payload['v']):
+        raise InvalidPageRequest('Invalid cursor')
+    return payload['v']
+
+def _keyset_filter(sort, values):
+    """
+    Match documents strictly after the cursor position, e.g. for
+    [(uploaded_at, -1), (_id, -1)]:
+        uploaded_at < v0  OR  (uploaded_at == v0 AND _id < v1)
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: values[j] for j in range(i)}
+        clause[field] = {'$lt' if direction < 0 else '$gt': values[i]}
+        clauses.append(clause)
+    return {'$or': clauses}
+
+def get_page_params(default_limit=None):
+    """Read limit, cursor and include_total from the query string"""
+    default_limit = default_limit or Config.PAGE_DEFAULT_LIMIT
+    try:
+        limit = int(request.args.get('limit', default_limit))
+    except ValueError:
+        raise InvalidPageRequest('limit must be an integer')
+    if limit < 1:
+        raise InvalidPageRequest('limit must be positive')
+
+    return {
+        'limit': min(limit, Config.PAGE_MAX_LIMIT),
+        'cursor': request.args.get('cursor') or None,
+        'include_total': request.args.get('include_total', 'false').lower() == 'true'
+    }
+
+def paginate(collection, query, sort, projection=None, limit=None, cursor=None,
+             include_total=False):
+    """
+    Keyset (cursor) pagination over a collection
+
+    Args:
+        collection: The collection to query
+        query: dict - Filter for the listing
+        sort: list of (field, direction) - Must end with ('_id', direction)
+              so the order is total
+        projection: dict - Fields to return
+        limit: int - Page size
+        cursor: str - next_cursor from the previous page, if any
+        include_total: bool - Also count every match (a separate query)
+
+    Returns:
+        dict: items, next_cursor (None on the last page), has_more, and
+              total when include_total is set
+    """
+    limit = limit or Config.PAGE_DEFAULT_LIMIT
+    page_query = query
+    if cursor:
+        page_query = {'$and': [query, _keyset_filter(sort, _decode_cursor(cursor, sort))]}
+
+    # Fetch one extra document to learn whether another page exists
+    items = list(collection.find(page_query, projection).sort(sort).limit(limit + 1))
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = _encode_cursor(sort, [last.get(field) for field, _ in sort])
+
+    page = {
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+    if include_total:
+        page['total'] = collection.count_documents(query)
+    return page
+
+def page_response(page, key):
+    """Shape a page for a JSON response under the endpoint's usual key"""
+    response = {
+        key: page['items'],
+        'count': len(page['items']),
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more']
+    }
+    if 'total' in page:
+        response['total'] = page['total']
+    return response
@@ -1,21 +1,149 @@
 import bcrypt
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from config.settings import Config
+from .metrics import BCRYPT_OPERATIONS, BCRYPT_DURATION
+from .timing import timed
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasherBusy(Exception):
+    """Raised when the bcrypt pool and its queue are full"""
+    pass
+
+class _BcryptPool:
+    """
+    Size-limited executor for bcrypt work
+
+    At most `workers` hashes run at once and at most `queue_limit` more
+    wait; anything beyond that is refused immediately with
+    PasswordHasherBusy so request threads are never pinned by a login burst.
+    """
+
+    def __init__(self, workers, queue_limit, timeout):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Executor threads do not survive fork(); build one per process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix='bcrypt'
+                    )
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_limit)
+                    self._pid = os.getpid()
+
+    def run(self, fn, *args):
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy()
+
+_pool = _BcryptPool(
+    workers=Config.BCRYPT_WORKERS,
+    queue_limit=Config.BCRYPT_QUEUE_LIMIT,
+    timeout=Config.BCRYPT_TIMEOUT
+)
+
+_rounds = None
+_rounds_lock = threading.Lock()
+
+def calibrate_bcrypt_rounds(target_ms=None, min_rounds=None, max_rounds=16):
+    """
+    Pick the highest bcrypt cost whose hash time stays within target_ms
+    Each extra round doubles the time, so one timed hash is enough.
+    """
+    target_ms = target_ms or Config.BCRYPT_TARGET_MS
+    min_rounds = min_rounds or Config.BCRYPT_MIN_ROUNDS
+
+    start = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(rounds=min_rounds))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+
+    logger.info("✓ bcrypt cost set to %d (~%.0fms per hash)", rounds, elapsed_ms)
+    return rounds
+
+def get_bcrypt_rounds():
+    """
+    bcrypt cost for new hashes: BCRYPT_ROUNDS, or calibrated on first use
+    Under gunicorn this runs in the master (on_starting), so every worker
+    inherits the same cost instead of calibrating its own.
+    """
+    global _rounds
+    if _rounds is None:
+        with _rounds_lock:
+            if _rounds is None:
+                _rounds = Config.BCRYPT_ROUNDS or calibrate_bcrypt_rounds()
+    return _rounds
+
+def _hash(password, rounds):
+    start = time.perf_counter()
+    salt = bcrypt.gensalt(rounds=rounds)
+    hashed = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    BCRYPT_DURATION.observe(time.perf_counter() - start, operation='hash')
+    return hashed
+
+def _check(password, hashed_password):
+    start = time.perf_counter()
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    finally:
+        BCRYPT_DURATION.observe(time.perf_counter() - start, operation='verify')
 
 def hash_password(password):
-    """Hash a password using bcrypt"""
-    # Generate salt and hash the password
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash a password using bcrypt (raises PasswordHasherBusy when saturated)"""
+    try:
+        with timed('bcrypt'):
+            hashed = _pool.run(_hash, password, get_bcrypt_rounds())
+    except PasswordHasherBusy:
+        BCRYPT_OPERATIONS.inc(operation='hash', outcome='busy')
+        raise
+    BCRYPT_OPERATIONS.inc(operation='hash', outcome='success')
+    return hashed
 
 def verify_password(password, hashed_password):
-    """Verify a password against its hash"""
+    """Verify a password against its hash (raises PasswordHasherBusy when saturated)"""
     try:
-        return bcrypt.checkpw(
-            password.encode('utf-8'), 
-            hashed_password.encode('utf-8')
-        )
+        with timed('bcrypt'):
+            matched = _pool.run(_check, password, hashed_password)
+    except PasswordHasherBusy:
+        BCRYPT_OPERATIONS.inc(operation='verify', outcome='busy')
+        raise
     except Exception as e:
-        print(f"Password verification error: {e}")
+        logger.warning("Password verification error: %s", e)
+        BCRYPT_OPERATIONS.inc(operation='verify', outcome='error')
+        return False
+    BCRYPT_OPERATIONS.inc(operation='verify', outcome='match' if matched else 'mismatch')
+    return matched
+
+def needs_rehash(hashed_password):
+    """True if a hash was made with a lower cost than the current one"""
+    try:
+        return int(hashed_password.split('$')[2]) < get_bcrypt_rounds()
+    except (IndexError, ValueError):
         return False
 
 def is_strong_password(password):
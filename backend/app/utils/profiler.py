@@ -0,0 +1,176 @@
+import hashlib
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+
+class StackSampler:
+    """
+    Statistical profiler for one thread
+
+    A daemon thread wakes every `interval` seconds and records the
+    target thread's current stack. Cost is paid only while sampling,
+    and only by requests that are being profiled.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_fold(frame)] += 1
+
+def _frame_name(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(BACKEND_ROOT):
+        filename = os.path.relpath(filename, BACKEND_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+def _fold(frame):
+    """Root-first, semicolon-separated stack (flamegraph folded format)"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame).replace(';', ':'))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def sign_profile_request(secret=None, timestamp=None):
+    """Value for the X-Profile header: <unix time>.<HMAC-SHA256 of it>"""
+    secret = secret or Config.PROFILER_SECRET
+    timestamp = str(int(timestamp or time.time()))
+    signature = hmac.new(secret.encode(), timestamp.encode(), hashlib.sha256).hexdigest()
+    return f"{timestamp}.{signature}"
+
+def _valid_profile_header(value):
+    if not value or not Config.PROFILER_SECRET:
+        return False
+    timestamp, _, signature = value.partition('.')
+    try:
+        age = abs(time.time() - int(timestamp))
+    except ValueError:
+        return False
+    if age > Config.PROFILER_HEADER_MAX_AGE:
+        return False
+    expected = sign_profile_request(timestamp=timestamp).partition('.')[2]
+    return hmac.compare_digest(expected, signature)
+
+def _should_profile():
+    if _valid_profile_header(request.headers.get(PROFILE_HEADER)):
+        return True
+    return Config.PROFILER_SAMPLE_RATE > 0 and random.random() < Config.PROFILER_SAMPLE_RATE
+
+def _write_profile(endpoint, stacks, request_id):
+    """Write one request's folded stacks and prune the oldest profiles"""
+    directory = os.path.join(Config.PROFILER_DIR, _SAFE_NAME.sub('_', endpoint))
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{_SAFE_NAME.sub('_', request_id or str(os.getpid()))}.folded"
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        for stack, count in stacks.items():
+            f.write(f"{stack} {count}\n")
+    _rotate(Config.PROFILER_DIR, Config.PROFILER_MAX_FILES)
+
+def _profile_files(root):
+    for endpoint in os.listdir(root):
+        directory = os.path.join(root, endpoint)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith('.folded'):
+                    yield os.path.join(directory, name)
+
+def _rotate(root, max_files):
+    try:
+        files = sorted(_profile_files(root), key=os.path.getmtime)
+        for path in files[:max(0, len(files) - max_files)]:
+            os.remove(path)
+    except OSError:
+        # Another worker may be rotating at the same time
+        pass
+
+def aggregate_profiles(root=None):
+    """
+    Merge every request profile into one <endpoint>.folded per endpoint
+    (in the profile directory), ready for flamegraph.pl or speedscope
+    """
+    root = root or Config.PROFILER_DIR
+    totals = {}
+    for path in _profile_files(root):
+        endpoint = os.path.basename(os.path.dirname(path))
+        stacks = totals.setdefault(endpoint, Counter())
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+
+    for endpoint, stacks in totals.items():
+        path = os.path.join(root, f"{endpoint}.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info("✓ %s: %d samples", path, sum(stacks.values()))
+    return totals
+
+def _before_request():
+    if _should_profile():
+        g.profiler = StackSampler(threading.get_ident(), Config.PROFILER_INTERVAL).start()
+
+def _teardown_request(exc):
+    sampler = g.pop('profiler', None)
+    if sampler is None:
+        return
+    stacks = sampler.stop()
+    if not stacks:
+        return
+    try:
+        _write_profile(request.endpoint or 'unmatched', stacks, g.get('request_id'))
+    except Exception as e:
+        logger.warning("Profile write error: %s", e)
+
+def init_profiler(app):
+    """Profile a sample of requests, or those with a signed X-Profile header"""
+    if not Config.PROFILER_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'sign':
+        print(sign_profile_request())
+    elif command == 'aggregate':
+        from app.utils.log import configure_logging
+        configure_logging()
+        aggregate_profiles(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        print("Usage: python -m app.utils.profiler [sign|aggregate [dir]]")
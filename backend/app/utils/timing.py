@@ -0,0 +1,99 @@
+import contextvars
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from flask import g, request
+
+# Phases reported in Server-Timing, in header order
+PHASES = ('auth', 'db', 'crypto', 'bcrypt', 'json')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# The current request's {phase: [seconds, calls]}; a context variable
+# rather than flask.g so code outside an app context can record safely
+_timings = contextvars.ContextVar('request_timings', default=None)
+
+access_logger = logging.getLogger('app.access')
+
+def record_timing(phase, seconds):
+    """Add time spent in a phase to the current request, if any"""
+    timings = _timings.get()
+    if timings is not None:
+        entry = timings.setdefault(phase, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+@contextmanager
+def timed(phase):
+    """Time a block of code as part of the current request's phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - start)
+
+def get_request_id():
+    """The current request's id (propagated X-Request-ID or generated)"""
+    return g.get('request_id')
+
+def _server_timing(timings, total):
+    parts = []
+    for phase in PHASES:
+        if phase in timings:
+            seconds, calls = timings[phase]
+            parts.append(f'{phase};dur={seconds * 1000:.2f};desc="{calls} calls"')
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+def _before_request():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+    g.timing_start = time.perf_counter()
+    g.timing_token = _timings.set({})
+
+def _after_request(response):
+    start = g.get('timing_start')
+    if start is None:
+        return response
+    total = time.perf_counter() - start
+    timings = _timings.get() or {}
+
+    response.headers[REQUEST_ID_HEADER] = g.request_id
+    response.headers['Server-Timing'] = _server_timing(timings, total)
+
+    user = getattr(request, 'user', None) or {}
+    access_logger.info('request', extra={
+        'request_id': g.request_id,
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(total * 1000, 2),
+        'timings_ms': {phase: round(seconds * 1000, 2) for phase, (seconds, _) in timings.items()},
+        'user_id': user.get('user_id'),
+        'remote_addr': request.remote_addr,
+        'bytes': response.content_length,
+        'memory_peak_bytes': g.get('memory_peak_bytes')
+    })
+    return response
+
+def _teardown_request(exc):
+    token = g.pop('timing_token', None)
+    if token is not None:
+        try:
+            _timings.reset(token)
+        except ValueError:
+            # Torn down from a different context than the one that set it
+            _timings.set(None)
+
+def init_request_timing(app):
+    """
+    Tag requests with an id and report per-phase timings
+    The access log goes through the app logger's queue (app.utils.log)
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,33 @@
+"""
+Benchmark: compressing listing responses
+
+Encodes records listings the size of one page and of a full admin
+export, then reports the compressed size and compression time for each
+encoding this process can produce.
+
+Usage (from backend/): python -m benchmarks.bench_compression [level]
+"""
+import sys
+import time
+from flask import Flask
+from app.utils.compression import COMPRESSORS, available_encodings
+from app.utils.json_provider import FastJSONProvider
+from benchmarks.bench_json import make_records
+
+def run(level=6, sizes=(50, 200, 2000)):
+    provider = FastJSONProvider(Flask(__name__))
+    encodings = available_encodings()
+    print(f"Level {level}; encodings available: {', '.join(encodings)}")
+    print(f"{'records':>8} {'encoding':>9} {'bytes':>10} {'ratio':>7} {'ms':>7}")
+
+    for size in sizes:
+        data = provider.dumps({'records': make_records(size)}).encode('utf-8')
+        print(f"{size:>8} {'identity':>9} {len(data):>10} {1:>7.2f} {0:>7.2f}")
+        for name in encodings:
+            start = time.perf_counter()
+            compressed = COMPRESSORS[name](data, level)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{size:>8} {name:>9} {len(compressed):>10} {len(data) / len(compressed):>7.2f} {elapsed:>7.2f}")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
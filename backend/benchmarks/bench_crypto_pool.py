@@ -0,0 +1,68 @@
+"""
+Benchmark: crypto pool modes for streamed records
+
+Encrypts and decrypts 100KB, 1MB and 10MB records with the crypto pool
+in inline, thread and process mode. It reports the median time per
+record for one stream on its own, and the wall time for `concurrent`
+streams at once (like several uploads hitting one worker).
+
+Usage (from backend/): python -m benchmarks.bench_crypto_pool [workers] [concurrent]
+"""
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.fernet import Fernet
+from config.settings import Config
+from app.utils.crypto_pool import CryptoPool, MODES, set_crypto_pool
+from app.utils.encryption import KeyRing, use_key_ring, encrypt_stream, decrypt_stream
+
+SIZES = (('100KB', 100 * 1024), ('1MB', 1024 * 1024), ('10MB', 10 * 1024 * 1024))
+
+def _pieces(data, size=Config.ENCRYPTION_CHUNK_SIZE):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+def round_trip(data):
+    sealed = b''.join(encrypt_stream(_pieces(data), chunk_size=Config.ENCRYPTION_CHUNK_SIZE))
+    opened = b''.join(decrypt_stream(_pieces(sealed)))
+    assert opened == data
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def run(workers=0, concurrent=4):
+    use_key_ring(KeyRing([('bench', Fernet.generate_key().decode())]))
+    payloads = {label: os.urandom(size) for label, size in SIZES}
+    print(f"{os.cpu_count()} CPUs; {workers or os.cpu_count()} pool workers; "
+          f"chunk {Config.ENCRYPTION_CHUNK_SIZE // 1024}KB; window {Config.CRYPTO_POOL_WINDOW}")
+    print(f"{'mode':>8} {'size':>6} {'1 stream ms':>12} {'MB/s':>8} {f'{concurrent} streams ms':>14}")
+
+    for mode in MODES:
+        pool = CryptoPool(mode, workers, Config.CRYPTO_POOL_QUEUE_LIMIT, Config.CRYPTO_POOL_WINDOW)
+        set_crypto_pool(pool)
+        round_trip(payloads['100KB'])  # start the pool outside the timings
+        for label, size in SIZES:
+            data = payloads[label]
+            repeat = 3 if size >= 10 * 1024 * 1024 else 10
+            single = _median_ms(lambda: round_trip(data), repeat)
+
+            def many():
+                with ThreadPoolExecutor(max_workers=concurrent) as executor:
+                    list(executor.map(round_trip, [data] * concurrent))
+            parallel = _median_ms(many, 3)
+
+            throughput = size * 2 / (single / 1000) / (1024 * 1024)
+            print(f"{mode:>8} {label:>6} {single:>12.1f} {throughput:>8.0f} {parallel:>14.1f}")
+        pool.shutdown()
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 0,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    )
@@ -0,0 +1,79 @@
+"""
+Benchmark: encoding a records listing to JSON
+
+Compares the old path (stringify ids per document, then Flask's default
+provider) with FastJSONProvider, using orjson and the stdlib fallback.
+
+Usage (from backend/): python -m benchmarks.bench_json [records] [repeats]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from app.utils import json_provider
+from app.utils.json_provider import FastJSONProvider
+
+def make_records(count):
+    patient_id = ObjectId()
+    now = datetime.utcnow()
+    return [
+        {
+            '_id': ObjectId(),
+            'patient_id': patient_id,
+            'uploaded_by': patient_id,
+            'file_name': f'report-{i}.pdf',
+            'file_type': 'pdf',
+            'file_size': 120000 + i,
+            'description': 'Blood test results',
+            'uploaded_at': now - timedelta(minutes=i)
+        }
+        for i in range(count)
+    ]
+
+def default_provider(app, records):
+    """What the listing endpoints did before: convert ids, then encode"""
+    for record in records:
+        record['_id'] = str(record['_id'])
+        record['patient_id'] = str(record['patient_id'])
+        record['uploaded_by'] = str(record['uploaded_by'])
+    return DefaultJSONProvider(app).response({'records': records}).get_data()
+
+def fast_provider(app, records):
+    return FastJSONProvider(app).response({'records': records}).get_data()
+
+def _time(func, app, records, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        docs = [dict(record) for record in records]
+        start = time.perf_counter()
+        func(app, docs)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def run(count=10000, repeats=5):
+    app = Flask(__name__)
+    records = make_records(count)
+    orjson = json_provider.orjson
+
+    print(f"{count} records, best of {repeats}")
+    print(f"{'encoder':>24} {'ms':>8}")
+    print(f"{'default + str() loop':>24} {_time(default_provider, app, records, repeats):>8.1f}")
+
+    json_provider.orjson = None
+    try:
+        print(f"{'fast (stdlib fallback)':>24} {_time(fast_provider, app, records, repeats):>8.1f}")
+    finally:
+        json_provider.orjson = orjson
+
+    if orjson is not None:
+        print(f"{'fast (orjson)':>24} {_time(fast_provider, app, records, repeats):>8.1f}")
+    else:
+        print("orjson not installed - skipped")
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    )
@@ -0,0 +1,82 @@
+"""
+Benchmark: attaching user summaries to access permissions
+
+Compares the old per-permission find_one loop with the batched $in lookup
+used by /api/access/my-permissions. Round-trip latency is simulated so the
+benchmark runs without a MongoDB server.
+
+Usage (from backend/): python -m benchmarks.bench_permissions [rtt_ms]
+"""
+import sys
+import time
+from bson import ObjectId
+from app.models.lookups import attach_user_summaries
+from app.models.projections import get_projection
+
+class SimulatedUsersCollection:
+    """In-memory users collection that sleeps one round trip per query"""
+
+    def __init__(self, users, rtt):
+        self.users = {user['_id']: user for user in users}
+        self.rtt = rtt
+        self.round_trips = 0
+
+    def find_one(self, query, projection=None):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+        return self.users.get(query['_id'])
+
+    def find(self, query, projection=None):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+        return [self.users[_id] for _id in query['_id']['$in'] if _id in self.users]
+
+def make_permissions(count):
+    doctors = [
+        {'_id': ObjectId(), 'full_name': f'Doctor {i}', 'email': f'doctor{i}@example.com'}
+        for i in range(count)
+    ]
+    patient_id = ObjectId()
+    permissions = [
+        {'_id': ObjectId(), 'patient_id': patient_id, 'doctor_id': doctor['_id']}
+        for doctor in doctors
+    ]
+    return doctors, permissions
+
+def per_document_lookup(permissions, users_collection):
+    """The lookup loop /my-permissions used before batching"""
+    for perm in permissions:
+        doctor = users_collection.find_one(
+            {'_id': ObjectId(perm['doctor_id'])},
+            get_projection('user-card')
+        )
+        if doctor:
+            perm['doctor'] = {
+                'id': str(doctor['_id']),
+                'full_name': doctor['full_name'],
+                'email': doctor['email']
+            }
+
+def run(rtt_ms=0.5, sizes=(10, 100, 500, 2000)):
+    rtt = rtt_ms / 1000
+    print(f"Simulated round trip: {rtt_ms}ms")
+    print(f"{'permissions':>12} {'N+1 (ms)':>10} {'trips':>6} {'batched (ms)':>13} {'trips':>6}")
+
+    for size in sizes:
+        doctors, permissions = make_permissions(size)
+
+        collection = SimulatedUsersCollection(doctors, rtt)
+        start = time.perf_counter()
+        per_document_lookup([dict(p) for p in permissions], collection)
+        n_plus_one = (time.perf_counter() - start) * 1000
+        n_plus_one_trips = collection.round_trips
+
+        collection = SimulatedUsersCollection(doctors, rtt)
+        start = time.perf_counter()
+        attach_user_summaries([dict(p) for p in permissions], 'doctor_id', 'doctor', collection)
+        batched = (time.perf_counter() - start) * 1000
+
+        print(f"{size:>12} {n_plus_one:>10.1f} {n_plus_one_trips:>6} {batched:>13.1f} {collection.round_trips:>6}")
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 0.5)
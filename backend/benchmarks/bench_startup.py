@@ -0,0 +1,72 @@
+"""
+Benchmark: cold start
+
+Runs `import app` and `create_app()` in fresh interpreters and reports
+the time for each, the part of create_app() spent importing and
+registering the blueprint modules, plus the number of outgoing socket
+connections made on the way (there should be none: MongoDB is first
+contacted in the readiness phase, app.readiness).
+
+Usage (from backend/): python -m benchmarks.bench_startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, socket, time
+connects = []
+_connect = socket.socket.connect
+def counting_connect(self, address):
+    connects.append(str(address))
+    return _connect(self, address)
+socket.socket.connect = counting_connect
+
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+
+blueprints = []
+_register_blueprints = app.register_blueprints
+def timed_register_blueprints(flask_app):
+    begin = time.perf_counter()
+    _register_blueprints(flask_app)
+    blueprints.append(time.perf_counter() - begin)
+app.register_blueprints = timed_register_blueprints
+
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'blueprints_ms': sum(blueprints) * 1000,
+    'connects': connects
+}))
+"""
+
+def run_once():
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD],
+        cwd=backend, capture_output=True, text=True, check=True
+    )
+    # create_app logs status lines (from the log listener thread, so in
+    # any order); the measurements are the line with import_ms
+    line = next(l for l in result.stdout.splitlines() if '"import_ms"' in l)
+    return json.loads(line)
+
+def run(runs=5):
+    samples = [run_once() for _ in range(runs)]
+    print(f"{runs} fresh interpreters")
+    print(f"{'phase':>12} {'median ms':>10} {'min ms':>8}")
+    for key, label in (('import_ms', 'import app'), ('create_app_ms', 'create_app'),
+                       ('blueprints_ms', 'blueprints')):
+        values = [sample[key] for sample in samples]
+        print(f"{label:>12} {statistics.median(values):>10.1f} {min(values):>8.1f}")
+    connects = sorted({address for sample in samples for address in sample['connects']})
+    print(f"socket connections during startup: {connects or 'none'}")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -13,9 +13,146 @@ class Config:
     
     # MongoDB Settings
     MONGO_URI = os.getenv('MONGO_URI')
-    
+    MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'bharathmedicare')
+
+    # MongoDB Connection Pool Settings (per worker process)
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 5))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 10000))
+
+    # MongoDB Circuit Breaker Settings
+    DB_BREAKER_FAILURE_THRESHOLD = int(os.getenv('DB_BREAKER_FAILURE_THRESHOLD', 3))
+    DB_BREAKER_RESET_TIMEOUT = float(os.getenv('DB_BREAKER_RESET_TIMEOUT', 5))
+    DB_BREAKER_PROBE_TIMEOUT_MS = int(os.getenv('DB_BREAKER_PROBE_TIMEOUT_MS', 2000))
+
+    # Audit Log Writer Settings
+    AUDIT_ASYNC = os.getenv('AUDIT_ASYNC', 'True').lower() == 'true'
+    AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 100))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 1.0))
+    AUDIT_BACKPRESSURE = os.getenv('AUDIT_BACKPRESSURE', 'block')  # block, drop or spill
+    AUDIT_BLOCK_TIMEOUT = float(os.getenv('AUDIT_BLOCK_TIMEOUT', 0.5))
+    # Each process spills to <AUDIT_SPILL_PATH>.<pid>
+    AUDIT_SPILL_PATH = os.getenv('AUDIT_SPILL_PATH', 'audit_spill.jsonl')
+
+    # Record Blob Storage Settings
+    BLOB_STORE_BACKEND = os.getenv('BLOB_STORE_BACKEND', 'gridfs')  # gridfs or local
+    BLOB_STORE_PATH = os.getenv('BLOB_STORE_PATH', 'blob_storage')
+    GRIDFS_CHUNK_SIZE = int(os.getenv('GRIDFS_CHUNK_SIZE', 255 * 1024))
+    # Seconds a replaced blob is kept so downloads already streaming it finish
+    BLOB_DELETE_GRACE = int(os.getenv('BLOB_DELETE_GRACE', 3600))
+
+    # Admin Statistics Settings
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 30))
+    STATS_COUNTERS_ENABLED = os.getenv('STATS_COUNTERS_ENABLED', 'False').lower() == 'true'
+
+    # Health Checks (/api/health/ready caches its probes for HEALTH_CACHE_TTL
+    # seconds and fails once the audit queue is HEALTH_AUDIT_QUEUE_MAX full)
+    HEALTH_CACHE_TTL = float(os.getenv('HEALTH_CACHE_TTL', 2))
+    HEALTH_PROBE_TIMEOUT_MS = int(os.getenv('HEALTH_PROBE_TIMEOUT_MS', 1000))
+    HEALTH_AUDIT_QUEUE_MAX = float(os.getenv('HEALTH_AUDIT_QUEUE_MAX', 0.9))
+
+    # Pagination Settings
+    PAGE_DEFAULT_LIMIT = int(os.getenv('PAGE_DEFAULT_LIMIT', 50))
+    PAGE_MAX_LIMIT = int(os.getenv('PAGE_MAX_LIMIT', 200))
+
+    # Verified-token cache (entries live until exp or TOKEN_CACHE_TTL seconds);
+    # each worker also reloads token revocations every TOKEN_CACHE_TTL seconds
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', 60))
+
+    # Password Hashing Settings (BCRYPT_ROUNDS=0 calibrates to BCRYPT_TARGET_MS)
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', 2))
+    BCRYPT_QUEUE_LIMIT = int(os.getenv('BCRYPT_QUEUE_LIMIT', 8))
+    BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', 5))
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 0))
+    BCRYPT_TARGET_MS = float(os.getenv('BCRYPT_TARGET_MS', 250))
+    BCRYPT_MIN_ROUNDS = int(os.getenv('BCRYPT_MIN_ROUNDS', 12))
+
+    # Response Compression (br and zstd need the brotli / zstandard packages)
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+    COMPRESSION_ENCODINGS = [
+        e.strip() for e in os.getenv('COMPRESSION_ENCODINGS', 'br,zstd,gzip').split(',') if e.strip()
+    ]
+    COMPRESSION_MIMETYPES = [
+        m.strip() for m in os.getenv(
+            'COMPRESSION_MIMETYPES', 'application/json,text/,application/javascript'
+        ).split(',') if m.strip()
+    ]
+
+    # Metrics (/api/metrics; set METRICS_TOKEN to require it as a bearer token,
+    # without one only loopback clients are served)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    # Directory where each worker writes its metrics so a scrape merges all
+    # of them (gunicorn.conf.py uses a fresh temporary one when unset)
+    METRICS_DIR = os.getenv('METRICS_DIR', '')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))  # seconds
+
+    # Sampling Profiler (folded stacks under PROFILER_DIR; requests are picked
+    # at PROFILER_SAMPLE_RATE or by an X-Profile header signed with PROFILER_SECRET)
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'False').lower() == 'true'
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0.0))
+    PROFILER_SECRET = os.getenv('PROFILER_SECRET', '')
+    PROFILER_HEADER_MAX_AGE = int(os.getenv('PROFILER_HEADER_MAX_AGE', 300))
+    PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))
+    PROFILER_DIR = os.getenv('PROFILER_DIR', 'profiles')
+    PROFILER_MAX_FILES = int(os.getenv('PROFILER_MAX_FILES', 500))
+
+    # Per-request Memory Accounting (tracemalloc; MEMORY_BUDGETS is
+    # endpoint=MB pairs, e.g. records.upload_record=64)
+    MEMORY_TRACKING = os.getenv('MEMORY_TRACKING', 'False').lower() == 'true'
+    MEMORY_TRACE_FRAMES = int(os.getenv('MEMORY_TRACE_FRAMES', 1))
+    MEMORY_DEFAULT_BUDGET_MB = float(os.getenv('MEMORY_DEFAULT_BUDGET_MB', 0))
+    MEMORY_BUDGETS = os.getenv(
+        'MEMORY_BUDGETS',
+        'records.upload_record=48,records.download_record=32,users.upload_profile_photo=16'
+    )
+
+    # Logging (JSON lines via a background queue; LOG_LEVELS overrides per
+    # logger, e.g. app.models.database=DEBUG,app.access=WARNING)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json or text
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 1.0))
+    LOG_REDACT = os.getenv('LOG_REDACT', 'True').lower() == 'true'
+    LOG_REDACT_FIELDS = [
+        f.strip() for f in os.getenv(
+            'LOG_REDACT_FIELDS',
+            'password,password_hash,token,authorization,email,phone,full_name,'
+            'date_of_birth,address,blood_group,height,weight,allergies,'
+            'chronic_conditions,current_medications,emergency_contact,'
+            'emergency_contact_name,emergency_contact_relation,description,file_name'
+        ).split(',') if f.strip()
+    ]
+
     # Security Settings
     ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
+    # Key ring: key_id:key pairs, primary (used for new records) first.
+    # ENCRYPTION_KEY is added last with key id 'default' unless that id is
+    # listed, even if the same key also appears under another id.
+    ENCRYPTION_KEYS = os.getenv('ENCRYPTION_KEYS', '')
+    # Re-encryption onto the primary key (python -m app.models.rotation run)
+    KEY_ROTATION_RATE = float(os.getenv('KEY_ROTATION_RATE', 5))  # records per second
+    KEY_ROTATION_BATCH_SIZE = int(os.getenv('KEY_ROTATION_BATCH_SIZE', 100))
+    ENCRYPTION_CHUNK_SIZE = int(os.getenv('ENCRYPTION_CHUNK_SIZE', 64 * 1024))
+    
+    # Crypto Worker Pool for streamed records: inline, thread or process
+    # (CRYPTO_POOL_WORKERS=0 uses one worker per CPU; compare the modes on
+    # the target host with python -m benchmarks.bench_crypto_pool)
+    CRYPTO_POOL_MODE = os.getenv('CRYPTO_POOL_MODE', 'inline')
+    CRYPTO_POOL_WORKERS = int(os.getenv('CRYPTO_POOL_WORKERS', 0))
+    CRYPTO_POOL_QUEUE_LIMIT = int(os.getenv('CRYPTO_POOL_QUEUE_LIMIT', 64))
+    CRYPTO_POOL_WINDOW = int(os.getenv('CRYPTO_POOL_WINDOW', 8))
+    
+    # Upload Settings
+    MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
     
     # Server Settings
     HOST = os.getenv('HOST', '0.0.0.0')
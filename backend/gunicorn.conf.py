@@ -0,0 +1,65 @@
+import glob
+import os
+import tempfile
+
+# Gunicorn configuration
+# Usage: gunicorn -c gunicorn.conf.py run:app
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+
+# Workers write their metrics here so /api/metrics reports server totals;
+# set before the app (and its Config) is imported by any worker
+if not os.getenv('METRICS_DIR'):
+    os.environ['METRICS_DIR'] = os.path.join(tempfile.gettempdir(), f'bharathmedicare-metrics-{os.getpid()}')
+
+def _clear_metrics():
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
+
+def on_starting(server):
+    """
+    Start from empty metrics, and calibrate the bcrypt cost once in the
+    master so every worker inherits the same value (per-worker
+    calibration can land on different costs)
+    """
+    os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
+    _clear_metrics()
+    from app.utils.password import get_bcrypt_rounds
+    get_bcrypt_rounds()
+
+def post_fork(server, worker):
+    """
+    Start the worker's readiness phase: its own MongoClient and pool
+    warm-up, the bcrypt check and the encryption key check
+    """
+    from app.readiness import start_readiness
+    start_readiness()
+
+def worker_exit(server, worker):
+    """
+    Flush pending audit entries, stop crypto workers, close the MongoClient
+    and write the worker's final metrics
+    """
+    from app.models.database import Database
+    from app.utils.audit_writer import shutdown_audit_writer
+    from app.utils.crypto_pool import get_crypto_pool
+    from app.utils.metrics import registry
+    shutdown_audit_writer()
+    get_crypto_pool().shutdown()
+    Database.close_connection()
+    registry.write(live=False)
+
+def child_exit(server, worker):
+    """
+    Fold a worker's counters into the dead-worker totals and drop its
+    gauges, also when it was killed (in the master)
+    """
+    from app.utils.metrics import registry
+    registry.directory = os.environ['METRICS_DIR']
+    registry.mark_process_dead(worker.pid)
+
+def on_exit(server):
+    _clear_metrics()
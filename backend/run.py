@@ -1,18 +1,15 @@
-import os
 from app import create_app
-from dotenv import load_dotenv
+from app.readiness import start_readiness
+from config.settings import Config
 
-# Load environment variables
-load_dotenv()
-
-# Create Flask application
+# Create Flask application (no network I/O until the readiness phase)
 app = create_app()
 
 if __name__ == '__main__':
-    # Get configuration from environment
-    host = os.getenv('HOST', '0.0.0.0')
-    port = int(os.getenv('PORT', 5000))
-    debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    # Server settings come from the single Config load (.env included)
+    host = Config.HOST
+    port = Config.PORT
+    debug = Config.DEBUG
     
     print("=" * 60)
     print("🏥 BharathMedicare Backend Server")
@@ -21,6 +18,9 @@ if __name__ == '__main__':
     print(f"Debug mode: {debug}")
     print("=" * 60)
     
+    # Connect to MongoDB and calibrate bcrypt while the server starts
+    start_readiness()
+    
     # Run the application
     app.run(
         host=host,
@@ -0,0 +1,208 @@
+"""
+Every endpoint queries through a named projection (app.models.projections)
+and should fetch only fields it returns or uses itself.
+
+The collections are replaced with in-memory fakes that apply projections
+the way MongoDB does and record the projection of every find()/find_one().
+For each endpoint the test compares the fields its projection fetched with
+the keys of the document it returned; a fetched field that is neither
+returned nor listed as used internally fails the test.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+import bcrypt
+import pytest
+from bson import ObjectId
+from app import create_app
+from app.models.database import Database
+from app.models.projections import PROFILE_COMPLETION_FIELDS, get_projection
+from app.utils import password
+from app.utils.auth import create_token
+from config.settings import Config
+
+PASSWORD = 'Secret123'
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    if any(projection.values()):
+        fields = {field for field, keep in projection.items() if keep}
+        if projection.get('_id', 1):
+            fields.add('_id')
+        return {field: value for field, value in doc.items() if field in fields}
+    return {field: value for field, value in doc.items() if field not in projection}
+
+class FakeCursor:
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+class RecordingCollection:
+    """Returns every stored document for any filter; records projections"""
+
+    def __init__(self, name, docs, calls):
+        self.name = name
+        self.docs = docs
+        self.calls = calls
+
+    def find(self, filter=None, projection=None, **kwargs):
+        projection = projection or kwargs.get('projection')
+        self.calls.append((self.name, projection))
+        return FakeCursor([_project(doc, projection) for doc in self.docs])
+
+    def find_one(self, filter=None, projection=None, **kwargs):
+        docs = list(self.find(filter, projection, **kwargs))
+        return docs[0] if docs else None
+
+    def count_documents(self, filter=None, **kwargs):
+        return len(self.docs)
+
+    def __getattr__(self, name):
+        # Writes (update_one, insert_one, insert_many, ...) succeed and do nothing
+        return lambda *args, **kwargs: SimpleNamespace(
+            inserted_id=ObjectId(), inserted_ids=[], matched_count=1,
+            modified_count=1, upserted_id=None, deleted_count=1
+        )
+
+def _user(role):
+    return {
+        '_id': ObjectId(),
+        'email': 'user@example.com',
+        'password_hash': bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=4)).decode(),
+        'role': role,
+        'full_name': 'Test User',
+        'phone': '9999999999',
+        'nmc_uid': 'NMC123',
+        'gender': 'female',
+        'date_of_birth': '1990-01-01',
+        'address': 'Chennai',
+        'blood_group': 'O+',
+        'emergency_contact_name': 'Contact',
+        'emergency_contact': '8888888888',
+        'emergency_contact_relation': 'sibling',
+        'allergies': [],
+        'chronic_conditions': [],
+        'photo_version': 'abc123',
+        'is_active': True,
+        'is_verified': True,
+        'is_profile_complete': True,
+        'created_at': datetime(2024, 1, 1),
+        'updated_at': datetime(2024, 1, 2)
+    }
+
+def _record(patient_id):
+    return {
+        '_id': ObjectId(),
+        'patient_id': patient_id,
+        'uploaded_by': patient_id,
+        'file_name': 'scan.pdf',
+        'file_type': 'application/pdf',
+        'file_size': 1024,
+        'description': 'Scan',
+        'uploaded_at': datetime(2024, 1, 3),
+        'is_deleted': False,
+        'blob_ref': {'backend': 'local', 'key': 'abc'},
+        'encryption_metadata': {'method': 'AES-256-GCM-STREAM', 'key_id': 'default'},
+        'encrypted_data': 'x' * 64
+    }
+
+def _permission(user_id):
+    return {
+        '_id': ObjectId(),
+        'patient_id': user_id,
+        'doctor_id': user_id,
+        'permission_level': 'read',
+        'granted_at': datetime(2024, 1, 4),
+        'is_active': True
+    }
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+def _client(app, monkeypatch, role):
+    user = _user(role)
+    calls = []
+    collections = {
+        'users': [user],
+        'records': [_record(user['_id'])],
+        'access_permissions': [_permission(user['_id'])]
+    }
+    monkeypatch.setattr(Database, 'is_available', classmethod(lambda cls: True))
+    monkeypatch.setattr(Database, 'get_collection', classmethod(
+        lambda cls, name: RecordingCollection(name, collections.get(name, []), calls)
+    ))
+    monkeypatch.setattr(password, '_rounds', 4)
+    # Audit entries go to the fake collection inline, not to a writer thread
+    monkeypatch.setattr(Config, 'AUDIT_ASYNC', False)
+    token = create_token(str(user['_id']), user['email'], role)
+    return app.test_client(), {'Authorization': f'Bearer {token}'}, user, calls
+
+# (method, path, role, projection, document in the response, fields used but not returned)
+CASES = [
+    ('GET', '/api/users/me', 'patient', 'user-full',
+     lambda body: body['user'], {'photo_version'}),
+    ('GET', '/api/users/{user_id}', 'admin', 'user-full',
+     lambda body: body['user'], {'photo_version'}),
+    ('GET', '/api/users/all', 'admin', 'user-list',
+     lambda body: body['users'][0], set()),
+    ('GET', '/api/patients/profile', 'patient', 'user-full',
+     lambda body: body['patient'], {'photo_version'}),
+    ('GET', '/api/patients/list', 'doctor', 'user-list',
+     lambda body: body['patients'][0], set()),
+    ('GET', '/api/patients/health-card', 'patient', 'user-health-card',
+     lambda body: body['health_card'], {'_id', 'role', 'created_at'}),
+    ('GET', '/api/admin/pending-doctors', 'admin', 'user-list',
+     lambda body: body['pending_doctors'][0], set()),
+    ('GET', '/api/records/my-records', 'patient', 'record-summary',
+     lambda body: body['records'][0], set()),
+    ('GET', '/api/records/{record_id}', 'patient', 'record-summary',
+     lambda body: body['record'], set()),
+    ('GET', '/api/access/my-permissions', 'patient', 'user-card',
+     lambda body: body['permissions'][0]['doctor'], {'_id'}),
+    ('GET', '/api/access/my-permissions', 'patient', 'access-list',
+     lambda body: body['permissions'][0], set()),
+    ('POST', '/api/auth/login', 'patient', 'user-auth',
+     lambda body: body['user'],
+     {'_id', 'password_hash', 'is_active', 'is_verified', *PROFILE_COMPLETION_FIELDS}),
+]
+
+@pytest.mark.parametrize('method, path, role, projection_name, returned, used', CASES,
+                         ids=[f'{case[0]} {case[1]}' for case in CASES])
+def test_endpoint_returns_every_field_it_fetches(app, monkeypatch, method, path, role,
+                                                 projection_name, returned, used):
+    client, headers, user, calls = _client(app, monkeypatch, role)
+    url = path.format(user_id=user['_id'], record_id=ObjectId())
+    if method == 'POST':
+        response = client.post(url, json={'email': user['email'], 'password': PASSWORD})
+    else:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+
+    projection = get_projection(projection_name)
+    assert projection in [called for _, called in calls], \
+        f"{path} did not query with the '{projection_name}' projection"
+
+    documents = {'user': user, 'record': _record(user['_id']), 'access': _permission(user['_id'])}
+    fetched = set(_project(documents[projection_name.split('-')[0]], projection))
+    unused = fetched - set(returned(response.get_json())) - used
+    assert not unused, f"{path} fetches {sorted(unused)} but never returns or uses them"
+
+def test_no_projection_fetches_password_hash_except_login():
+    from app.models.projections import PROJECTIONS
+    for name, projection in PROJECTIONS.items():
+        if name == 'user-auth':
+            continue
+        assert projection.get('password_hash', 0) == 0, name
@@ -1,6 +1,7 @@
 // Admin Dashboard JavaScript
 
 let allUsers = [];
+const usersPager = new CursorPager(API_ENDPOINTS.ALL_USERS, 'users');
 let pendingDoctors = [];
 let auditLogs = [];
 let stats = {};
@@ -138,18 +139,24 @@ async function verifyDoctor(doctorId, action) {
     }
 }
 
-// Load all users
+// Load (or reload) the current page of users
 async function loadUsers() {
     try {
-        const response = await apiCall(API_ENDPOINTS.ALL_USERS);
-        allUsers = response.users || [];
-        displayUsers(allUsers);
+        allUsers = await usersPager.load();
+        showUsersPage();
     } catch (error) {
         console.error('Failed to load users:', error);
         allUsers = [];
     }
 }
 
+// Show the pager's current page of users
+function showUsersPage() {
+    allUsers = usersPager.items;
+    displayUsers(allUsers);
+    renderPagerControls('usersPager', usersPager, showUsersPage);
+}
+
 // Display users in table
 function displayUsers(users) {
     const tbody = document.getElementById('usersTableBody');
@@ -232,17 +239,14 @@ async function loadAuditLogs() {
     }
 }
 
-// Filter users by role
-function filterUsers(role) {
-    let filteredUsers;
-    
-    if (role === 'all') {
-        filteredUsers = allUsers;
-    } else {
-        filteredUsers = allUsers.filter(user => user.role === role);
+// Filter users by role (on the server, starting again from the first page)
+async function filterUsers(role) {
+    try {
+        await usersPager.first(role === 'all' ? {} : { role });
+        showUsersPage();
+    } catch (error) {
+        console.error('Failed to filter users:', error);
     }
-    
-    displayUsers(filteredUsers);
 }
 
 // Toggle user status
@@ -1,11 +1,23 @@
 // API Helper Functions
 
+// Calls slower than this are logged with their request id and server timings
+const SLOW_API_CALL_MS = 1000;
+
+// Id sent as X-Request-ID so a call can be found in the backend access log
+function newRequestId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}`;
+}
+
 // Make API call
 async function apiCall(endpoint, options = {}) {
     const url = `${API_BASE_URL}${endpoint}`;
     
     const defaultHeaders = {
-        'Content-Type': 'application/json'
+        'Content-Type': 'application/json',
+        'X-Request-ID': newRequestId()
     };
     
     // Add auth token if available
@@ -23,9 +35,18 @@ async function apiCall(endpoint, options = {}) {
     };
     
     try {
+        const started = performance.now();
         const response = await fetch(url, config);
         const data = await response.json();
         
+        const elapsed = performance.now() - started;
+        if (elapsed > SLOW_API_CALL_MS) {
+            console.warn(`Slow API call ${endpoint}: ${Math.round(elapsed)}ms`, {
+                requestId: response.headers.get('X-Request-ID'),
+                serverTiming: response.headers.get('Server-Timing')
+            });
+        }
+        
         if (!response.ok) {
             throw new Error(data.error || `HTTP error! status: ${response.status}`);
         }
@@ -37,6 +58,108 @@ async function apiCall(endpoint, options = {}) {
     }
 }
 
+// Walk a cursor-paginated listing one page at a time. The cursor of
+// every page visited is kept so previous() can go back.
+class CursorPager {
+    constructor(endpoint, key, params = {}) {
+        this.endpoint = endpoint;
+        this.key = key;
+        this.params = params;
+        this.cursors = [null];
+        this.index = 0;
+        this.nextCursor = null;
+        this.total = null;
+        this.items = [];
+    }
+    
+    get hasPrevious() {
+        return this.index > 0;
+    }
+    
+    get hasNext() {
+        return Boolean(this.nextCursor);
+    }
+    
+    get pageNumber() {
+        return this.index + 1;
+    }
+    
+    async load() {
+        const query = new URLSearchParams({ ...this.params, include_total: 'true' });
+        const cursor = this.cursors[this.index];
+        if (cursor) {
+            query.set('cursor', cursor);
+        }
+        const separator = this.endpoint.includes('?') ? '&' : '?';
+        const data = await apiCall(`${this.endpoint}${separator}${query}`);
+        this.items = data[this.key] || [];
+        this.nextCursor = data.next_cursor;
+        this.total = data.total ?? null;
+        return this.items;
+    }
+    
+    // Back to the first page, e.g. after a change or with new filters
+    first(params = this.params) {
+        this.params = params;
+        this.cursors = [null];
+        this.index = 0;
+        return this.load();
+    }
+    
+    next() {
+        if (!this.hasNext) {
+            return Promise.resolve(this.items);
+        }
+        this.cursors = this.cursors.slice(0, this.index + 1);
+        this.cursors.push(this.nextCursor);
+        this.index += 1;
+        return this.load();
+    }
+    
+    previous() {
+        if (!this.hasPrevious) {
+            return Promise.resolve(this.items);
+        }
+        this.index -= 1;
+        return this.load();
+    }
+}
+
+// Previous / Next controls for a CursorPager; onChange runs after a page loads
+function renderPagerControls(containerId, pager, onChange) {
+    const container = document.getElementById(containerId);
+    if (!container) {
+        return;
+    }
+    
+    if (!pager.hasPrevious && !pager.hasNext) {
+        container.innerHTML = '';
+        return;
+    }
+    
+    const total = pager.total !== null ? ` &middot; ${pager.total} total` : '';
+    container.innerHTML = `
+        <button class="btn btn-secondary" data-page="previous" ${pager.hasPrevious ? '' : 'disabled'}>
+            <i class="fas fa-chevron-left"></i> Previous
+        </button>
+        <span class="pager-status">Page ${pager.pageNumber}${total}</span>
+        <button class="btn btn-secondary" data-page="next" ${pager.hasNext ? '' : 'disabled'}>
+            Next <i class="fas fa-chevron-right"></i>
+        </button>
+    `;
+    
+    container.querySelectorAll('button[data-page]').forEach(button => {
+        button.addEventListener('click', async () => {
+            try {
+                await (button.dataset.page === 'next' ? pager.next() : pager.previous());
+                onChange();
+            } catch (error) {
+                console.error('Failed to load page:', error);
+            }
+        });
+    });
+}
+
 // Upload file with FormData
 async function apiCallUpload(endpoint, formData) {
     const url = `${API_BASE_URL}${endpoint}`;
@@ -99,6 +222,12 @@ async function apiCallPhoto(endpoint, file) {
     }
 }
 
+// Resolve a path returned by the API (e.g. a profile photo) against the
+// API base; data: and absolute URLs are returned unchanged
+function apiUrl(path) {
+    return path && path.startsWith('/') ? `${API_BASE_URL}${path}` : path;
+}
+
 // Auth token management
 function setAuthToken(token) {
     localStorage.setItem(STORAGE_KEYS.AUTH_TOKEN, token);
@@ -270,8 +399,11 @@ function arrayToCommaSeparated(arr) {
 if (typeof module !== 'undefined' && module.exports) {
     module.exports = {
         apiCall,
+        CursorPager,
+        renderPagerControls,
         apiCallUpload,
         apiCallPhoto,
+        apiUrl,
         setAuthToken,
         getAuthToken,
         removeAuthToken,
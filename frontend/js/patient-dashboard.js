@@ -1,6 +1,7 @@
 // Patient Dashboard JavaScript
 
 let myRecords = [];
+const recordsPager = new CursorPager(API_ENDPOINTS.MY_RECORDS, 'records');
 let myPermissions = [];
 let healthCardData = null;
 let currentPhotoFile = null;
@@ -77,7 +78,7 @@ function setupEventListeners() {
     }
     
     const profilePhoto = user.profile_photo ? 
-        `<img src="${user.profile_photo}" style="width: 100%; height: 100%; object-fit: cover;">` :
+        `<img src="${apiUrl(user.profile_photo)}" style="width: 100%; height: 100%; object-fit: cover;">` :
         '<i class="fas fa-user" style="font-size: 2rem; color: white;"></i>';
 
     const printWindow = window.open('', '_blank');
@@ -563,12 +564,11 @@ async function loadDashboardData() {
     }
 }
 
-// Load patient records
+// Load the first (newest) page of patient records
 async function loadRecords() {
     try {
-        const response = await apiCall(API_ENDPOINTS.MY_RECORDS);
-        myRecords = response.records || [];
-        displayRecords();
+        myRecords = await recordsPager.first();
+        showRecordsPage();
         displayRecentRecords();
     } catch (error) {
         console.error('Failed to load records:', error);
@@ -576,6 +576,13 @@ async function loadRecords() {
     }
 }
 
+// Show the pager's current page of records
+function showRecordsPage() {
+    myRecords = recordsPager.items;
+    displayRecords();
+    renderPagerControls('recordsPager', recordsPager, showRecordsPage);
+}
+
 // Load access permissions
 async function loadPermissions() {
     try {
@@ -638,7 +645,7 @@ function displayProfilePhoto(photoUrl) {
     const deleteBtn = document.getElementById('deletePhotoBtn');
     
     if (photoUrl) {
-        preview.innerHTML = `<img src="${photoUrl}" style="width: 100%; height: 100%; object-fit: cover;" alt="Profile Photo">`;
+        preview.innerHTML = `<img src="${apiUrl(photoUrl)}" style="width: 100%; height: 100%; object-fit: cover;" alt="Profile Photo">`;
         deleteBtn.style.display = 'inline-flex';
     } else {
         preview.innerHTML = '<i class="fas fa-user" style="font-size: 4rem; color: white;"></i>';
@@ -774,7 +781,7 @@ function displayHealthCard() {
     const photoContainer = document.getElementById('cardPhotoContainer');
     if (photoContainer) {
         if (user.profile_photo) {
-            photoContainer.innerHTML = `<img src="${user.profile_photo}" style="width: 100%; height: 100%; object-fit: cover;" alt="Profile Photo">`;
+            photoContainer.innerHTML = `<img src="${apiUrl(user.profile_photo)}" style="width: 100%; height: 100%; object-fit: cover;" alt="Profile Photo">`;
         } else {
             photoContainer.innerHTML = '<i class="fas fa-user" style="font-size: 2rem; color: white;"></i>';
         }
@@ -835,7 +842,7 @@ function generateQRCode(user, healthCardData) {
 
 // Update statistics
 function updateStats() {
-    document.getElementById('totalRecords').textContent = myRecords.length;
+    document.getElementById('totalRecords').textContent = recordsPager.total ?? myRecords.length;
     document.getElementById('authorizedDoctors').textContent = myPermissions.length;
 }
 
@@ -880,6 +887,7 @@ function displayRecords() {
 // Display recent records
 function displayRecentRecords() {
     const container = document.getElementById('recentRecordsContainer');
+    // Loaded with the first page, which holds the newest records
     const recentRecords = myRecords.slice(0, 5);
     
     if (recentRecords.length === 0) {
@@ -1278,7 +1286,7 @@ function printHealthCardSideBySide() {
     const qrImageUrl = `https://api.qrserver.com/v1/create-qr-code/?size=150x150&data=${qrData}&color=2ecc71&bgcolor=ffffff&qzone=1`;
     
     const profilePhoto = user.profile_photo ? 
-        `<img src="${user.profile_photo}" style="width: 100%; height: 100%; object-fit: cover;">` :
+        `<img src="${apiUrl(user.profile_photo)}" style="width: 100%; height: 100%; object-fit: cover;">` :
         '<i class="fas fa-user" style="font-size: 2rem; color: white;"></i>';
 
     const printWindow = window.open('', '_blank');
@@ -12,7 +12,8 @@ db.users.createIndex({ "email": 1 }, { unique: true });
 db.users.createIndex({ "role": 1 });
 db.records.createIndex({ "patient_id": 1 });
 db.records.createIndex({ "uploaded_by": 1 });
-db.access_permissions.createIndex({ "patient_id": 1, "doctor_id": 1 });
+db.access_permissions.createIndex({ "patient_id": 1, "doctor_id": 1 }, { unique: true });
+// Query-shaped indexes are managed by: python -m app.models.indexes migrate
 
 print('✓ MongoDB initialized successfully');
 print('✓ Collections created: users, records, audit_logs, access_permissions');